@@ -4,728 +4,1252 @@
 # A Retirement Planner (optimize withdrawals for most efficient use of the nest egg)
 #
 
+import io
+import os
+import sys
 import time
+import json
 import argparse
-import scipy.optimize
+import contextlib
+import toml
+import numpy as np
 import taxinfo as tif
 import tomldata
 import vector_var_index as vvar
 import app_output as app_out
 import lp_constraint_model as lp
 import modelio
+import lp_solvers
+import solution_cache
 
 __version__ = '0.3-rc2'
 
+# linprog() options used for every plan solve (see lp_solvers)
+solver_options = {#"bland": True,
+                  "tol": 1.0e-7,
+                  "maxiter": 4000}
 
-def precheck_consistancy():
-    print("\nDoing Pre-check:")
-    # check that there is income for all contibutions
-    #tcontribs = 0
-    for year in range(S.numyr):
-        t = 0
-        for j in range(len(S.accounttable)):
-            if S.accounttable[j]['acctype'] != 'aftertax':
-                v = S.accounttable[j]
-                c = v.get('contributions', None)
-                if c is not None:
-                    t += c[year]
-        if t > S.income[year]:
-            print("year: %d, total contributions of (%.0f) to all Retirement accounts exceeds other earned income (%.0f)" % (
-                year, t, S.income[year]))
-            print(
-                "Please change the contributions in the toml file to be less than non-SS income.")
-            exit(1)
-    return True
-
-
-def consistancy_check(res, years, taxbins, cgbins, accounts, accmap, vindx):
-    # check to see if the ordinary tax brackets are filled in properly
-    print()
-    print()
-    print("Consistancy Checking:")
-    print()
-
-    result = vvar.my_check_index_sequence(
-        years, taxbins, cgbins, accounts, accmap, vindx)
-
-    for year in range(S.numyr):
-        s = 0
-        fz = False
-        fnf = False
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        for k in range(len(taxinfo.taxtable)):
-            cut, size, rate, base = taxinfo.taxtable[k]
-            size *= i_mul
-            s += res.x[vindx.x(year, k)]
-            if fnf and res.x[vindx.x(year, k)] > 0:
-                print("Inproper packed brackets in year %d, bracket %d not empty while previous bracket not full." % (
-                    year, k))
-            if res.x[vindx.x(year, k)] + 1 < size:
-                fnf = True
-            if fz and res.x[vindx.x(year, k)] > 0:
-                print("Inproperly packed tax brackets in year %d bracket %d" % (year, k))
-            if res.x[vindx.x(year, k)] == 0.0:
-                fz = True
+def deposit_amount(S, rv, year, index):
+    amount = rv.D[year, index]
+    if S.accounttable[index]['acctype'] == 'aftertax':
+        amount += S.asset_sale[year]
+    return amount
+
+
+def deposit_amounts(S, rv):
+    # deposit_amount() for every year and account as a (years, accounts) array
+    amounts = rv.D.copy()
+    for j in range(len(S.accounttable)):
+        if S.accounttable[j]['acctype'] == 'aftertax':
+            amounts[:, j] += S.asset_sale
+    return amounts
+
+
+class income_summary:
+    """ IncomeSummary() values for every year computed once per solve
+
+        Each member is an array indexed by year: T (ordinary taxable
+        income), spendable, tax, rate (marginal rate), cg_tax, earlytax
+        (early withdrawal penalty) and rothearly (early roth withdrawal).
+    """
+
+    def __init__(self, S, rv, taxinfo):
+        years = range(S.numyr)
+        accounts = range(len(S.accounttable))
+        i_mul = S.i_mul[:S.numyr]
+        deposits = deposit_amounts(S, rv)
+        # at most the first two accounts are type IRA
+        ira = np.array([j < 2 and S.accounttable[j]['acctype'] == 'IRA'
+                        for j in accounts], dtype=bool)
+        roth = np.array([S.accounttable[j]['acctype'] == 'roth'
+                         for j in accounts], dtype=bool)
+        early = np.array([[S.accounttable[j]['acctype'] != 'aftertax' and
+                           S.apply_early_penalty(year, S.accounttable[j]['mykey'])
+                           for j in accounts] for year in years], dtype=bool)
+        taxed = np.array(S.taxed, dtype=float)
+        SS = np.array(S.SS, dtype=float)
+
+        T = rv.w[:, ira].sum(axis=1) - deposits[:, ira].sum(axis=1) + taxed + \
+            taxinfo.SS_taxable * SS - taxinfo.stded * i_mul
+        self.T = np.maximum(T, 0)
+        self.earlytax = (rv.w * early).sum(axis=1) * taxinfo.penalty
+        self.rothearly = ((rv.w > 0) & early & roth).any(axis=1)
+        rates = np.array([t[2] for t in taxinfo.taxtable])
+        self.tax = rv.x @ rates
+        # marginal rate is the rate of the highest bracket in use
+        used = rv.x > 0
+        highest = len(rates) - 1 - np.argmax(used[:, ::-1], axis=1)
+        self.rate = np.where(used.any(axis=1), rates[highest], 0)
+        self.cg_tax = np.zeros(S.numyr)
         if S.accmap['aftertax'] > 0:
-            scg = 0
+            self.cg_tax = rv.y @ [t[2] for t in taxinfo.capgainstable]
+        self.spendable = rv.w.sum(axis=1) - deposits.sum(axis=1) + \
+            np.array(S.income) + SS - np.array(S.expenses) - \
+            self.tax - self.cg_tax - self.earlytax + np.array(S.asset_sale)
+
+    def year(self, year):
+        return self.T[year], self.spendable[year], self.tax[year], \
+            self.rate[year], self.cg_tax[year], self.earlytax[year], \
+            bool(self.rothearly[year])
+
+
+class PlanSession:
+    """ One retirement plan: its data, LP model, solution and output sink
+
+        Everything a plan needs lives in the session rather than in module
+        globals so a long running process can work through many plans:
+
+            with PlanSession('plan.toml') as plan:
+                if plan.precheck():
+                    plan.build()
+                    if plan.solve().success:
+                        plan.check()
+                        plan.report()
+
+        conffile is a toml file name or the toml input already parsed
+        into a dict. Pass ao to send the report to an existing
+        app_output, otherwise a buffered one is created for csv_file_name. With a cache (a
+        solution_cache) solve() reuses the solution of an identical model.
+        solver names the lp_solvers backend solve() uses; with warm (an
+        lp_solvers.warm_start shared by a sequence of plans) solve()
+        starts from the basis of the previous plan's solve instead.
+        inflation and returns are optional per year sequences replacing
+        the toml file's rates (see Data.process_toml_info()). With
+        modelfile the plan is replayed from a dump_model() file instead
+        and conffile is not read (see load_model()).
+    """
+
+    def __init__(self, conffile, csv_file_name=None, verbose=False,
+                 verbosewga=False, noroundingoutput=False,
+                 notdrarothradeposits=False, ao=None, cache=None,
+                 inflation=None, returns=None, solver='highs', warm=None,
+                 modelfile=None):
+        self.verbose = verbose
+        self.solver = solver
+        self.warm = warm
+        self.cache = cache
+        self.verbosewga = verbosewga
+        self.notdrarothradeposits = notdrarothradeposits
+        self.OneK = 1000.0
+        if noroundingoutput:
+            self.OneK = 1
+        self.ao = ao
+        if ao is None:
+            self.ao = app_out.app_output(csv_file_name, buffered=True)
+
+        self.inflation = inflation
+        self.returns = returns
+        self.taxinfo = tif.taxinfo()
+
+        self.model = None
+        self.c = None
+        self.A = None
+        self.b = None
+        self.A_eq = None
+        self.b_eq = None
+        self.bounds = None
+        self.notes = None
+        self.res = None
+        self.rv = None
+        self.isum = None
+        self.changes = {}
+
+        if modelfile is not None:
+            self.load_model(modelfile)
+            return
+
+        self.S = tomldata.Data(self.taxinfo)
+        if isinstance(conffile, dict):
+            self.S.toml_dict = conffile
+        else:
+            self.S.load_toml_file(conffile)
+        self.S.process_toml_info(inflation, returns)
+        S = self.S
+
+        #print("\naccounttable: ", S.accounttable)
+
+        if S.accmap['IRA'] + S.accmap['roth'] + S.accmap['aftertax'] == 0:
+            print('Error: This app optimizes the withdrawals from your retirement account(s); you must have at least one specified in the input toml file.')
+            exit(0)
+
+        if verbosewga:
+            print("accounttable: ", S.accounttable)
+
+        self.index_vars()
+
+    def index_vars(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        years = S.numyr
+        taxbins = len(taxinfo.taxtable)
+        cgbins = len(taxinfo.capgainstable)
+        accounts = len(S.accounttable)
+
+        self.vindx = vvar.vector_var_index(
+            years, taxbins, cgbins, accounts, S.accmap)
+
+        self.vid = [years, taxbins, cgbins, S.accmap["IRA"],
+                    S.accmap["roth"], S.accmap["aftertax"]]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.ao.close()
+
+    def constraint_model(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        return lp.lp_constraint_model(S, self.vindx, taxinfo.taxtable, taxinfo.capgainstable, taxinfo.penalty,
+                                      taxinfo.stded, taxinfo.SS_taxable, self.verbose, self.notdrarothradeposits)
+
+    def build(self):
+        self.model = self.constraint_model()
+        self.c, self.A, self.b, self.A_eq, self.b_eq, self.bounds, self.notes = \
+            self.model.build_model(sparse=True)
+
+    def update(self, toml_dict):
+        #
+        # Switch the built plan to the toml input toml_dict (an edited
+        # copy of self.S.toml_dict). When the edits leave the model's
+        # matrices alone (amounts of expenses, income, social security,
+        # asset sales, IRA and roth balances, contributions, but not the
+        # filing status, which changes the tax brackets) A and A_eq
+        # are kept and only the entries of c, b, b_eq and bounds that
+        # differ from the current model are written, in place (see
+        # lp_constraint_model.build_rhs()); otherwise the whole model is
+        # rebuilt. Returns True when A and A_eq were kept.
+        #
+        # self.changes records what the edit touched: the toml sections
+        # that differ and, when A was kept, the number of changed entries
+        # by constraint family ("c" and "bounds" for the objective and
+        # the variable bounds).
+        #
+        old_dict = self.S.toml_dict
+        toml_dict = json.loads(json.dumps(toml_dict))  # thread safe deep copy
+        sections = [k for k in sorted(set(old_dict) | set(toml_dict))
+                    if old_dict.get(k) != toml_dict.get(k)]
+        self.changes = {'toml': sections}
+        S = tomldata.Data(self.taxinfo)
+        S.toml_dict = toml_dict
+        S.process_toml_info(self.inflation, self.returns)
+        self.res = None
+        self.rv = None
+        self.isum = None
+        vid = self.vid
+        self.S = S
+        self.index_vars()
+        # patching needs the same variables and every coefficient of A
+        # and A_eq unchanged, including those from the tax tables that
+        # process_toml_info() set for S's filing status
+        taxinfo = self.taxinfo
+        if self.model is None or self.vid != vid or \
+                self.model.matrix_inputs(S) != self.model.matrix_inputs() or \
+                self.model.tax_inputs() != (taxinfo.taxtable, taxinfo.capgainstable,
+                                            taxinfo.stded):
+            self.build()
+            return False
+        self.model.S = S
+        b, b_eq, bounds = self.model.build_rhs()
+        changes = {}
+        changes.update(lp.row_families(self.notes,
+                                       lp.patch_entries(self.b, b)))
+        changes.update(lp.row_families(self.notes,
+                                       lp.patch_entries(self.b_eq, b_eq), eq=True))
+        for name, old, new in (("c", self.c, self.model.build_objective()),
+                               ("bounds", self.bounds, bounds)):
+            n = len(lp.patch_entries(old, new))
+            if n > 0:
+                changes[name] = n
+        self.changes.update(changes)
+        return True
+
+    def load_model(self, filename):
+        #
+        # Replay a plan dumped by dump_model(): the model, its notes and
+        # the Data fields the checks and reports use come from filename,
+        # the variable index is rebuilt and checked against the dumped
+        # vid and the toml input is neither read nor processed. solve()
+        # is the next step.
+        #
+        print("Loadfile: ", filename)
+        try:
+            m = modelio.readSections(filename)
+        except IOError as e:
+            print("Error: %s - %s." % (e.filename, e.strerror))
+            exit(1)
+        if m is None or 'plan' not in m:
+            print("Error: %s is not a plan dumped with -mdp by this version of the planner" % filename)
+            exit(1)
+        plan = modelio.json_of(m['plan'])
+        self.S = tomldata.Data(self.taxinfo)
+        self.S.__dict__.update(plan['S'])
+        self.taxinfo.set_retirement_status(self.S.retirement_type)
+        self.notdrarothradeposits = plan['notdrarothradeposits']
+        self.notes = plan['notes']
+        self.index_vars()
+        if self.vid != m['vid'].tolist():
+            print("Error: %s was dumped with variables %s but its data gives %s" %
+                  (filename, m['vid'].tolist(), self.vid))
+            exit(1)
+        self.model = self.constraint_model()
+        self.model.row_names, self.model.eq_row_names = plan.get('rows', [None, None])
+        self.c = m['c']
+        self.A = modelio.csr_of(m, 'A')
+        self.b = m['b']
+        if 'Eshape' in m:
+            self.A_eq = modelio.csr_of(m, 'E')
+            self.b_eq = m['beq']
+        if 'lo' in m:
+            self.bounds = [(None if np.isneginf(lo) else float(lo),
+                            None if np.isposinf(hi) else float(hi))
+                           for lo, hi in zip(m['lo'], m['hi'])]
+
+    def solve(self, timesimplex=False):
+        #self.verifyInputs( self.c , self.A , self.b )
+        options = solver_options
+        self.res = None
+        if self.cache is not None:
+            key = self.cache.key(self.c, self.A, self.b, self.A_eq,
+                                 self.b_eq, self.bounds,
+                                 dict(options, solver=self.solver))
+            self.res = self.cache.get(key)
+        if self.res is None:
+            if self.warm is not None:
+                self.res = self.warm.solve(self.c, self.A, self.b,
+                                           self.A_eq, self.b_eq, self.bounds)
+            else:
+                self.res = lp_solvers.solve(self.solver, self.c, self.A, self.b,
+                                            self.A_eq, self.b_eq, self.bounds,
+                                            dict(options, disp=self.verbose))
+            if timesimplex:
+                print("\nElapsed %s time: %s seconds, %d iterations" %
+                      (self.res.solver, self.res.time, self.res.nit))
+            if self.cache is not None:
+                self.cache.put(key, self.res)
+        if timesimplex and self.cache is not None:
+            print("\nSolution cache: %d hits, %d misses" %
+                  (self.cache.hits, self.cache.misses))
+        self.rv = None
+        self.isum = None
+        if self.res.success:
+            self.rv = self.vindx.views(self.res.x)
+            self.isum = income_summary(self.S, self.rv, self.taxinfo)
+        return self.res
+
+    def dump_model(self, filename, check=False):
+        #
+        # Dump the model as linprog() takes it (A and b in the model
+        # sections of the file, A_eq, b_eq and the bounds in extra ones),
+        # the solution and vid, and for load_model() the notes and the
+        # Data fields. check reloads the file and compares every value.
+        #
+        extra = []
+        if self.A_eq is not None:
+            extra += modelio.csr_sections('E', self.A_eq)
+            extra.append(('beq', np.asarray(self.b_eq, dtype='<f8')))
+        if self.bounds is not None:
+            bounds = modelio.bound_pairs(self.bounds, len(self.c))
+            extra.append(('lo', np.array([-np.inf if lo is None else lo
+                                          for lo, hi in bounds], dtype='<f8')))
+            extra.append(('hi', np.array([np.inf if hi is None else hi
+                                          for lo, hi in bounds], dtype='<f8')))
+        S = {k: v for k, v in self.S.__dict__.items() if k != 'tinfo'}
+        extra.append(('plan', modelio.json_section(
+            {'S': S, 'notes': self.notes,
+             'rows': [self.model.row_names, self.model.eq_row_names],
+             'notdrarothradeposits': self.notdrarothradeposits})))
+        X = None if self.res is None else self.res.x
+        modelio.binDumpModel(self.c, self.A, self.b, X, self.vid,
+                             filename, check, extra)
+
+    def export_model(self, filename):
+        # the model as a CPLEX LP or (filename *.mps) MPS file, see
+        # lp_constraint_model.export_model()
+        self.model.export_model(filename, self.c, self.A, self.b, self.A_eq,
+                                self.b_eq, self.bounds, self.notes)
+
+    def print_model(self, non_binding_only=True):
+        if self.res.success == False:
+            self.model.print_model_matrix(
+                self.c, self.A, self.b, self.notes, None, False,
+                self.A_eq, self.b_eq, self.bounds)
+        else:
+            self.model.print_model_matrix(
+                self.c, self.A, self.b, self.notes, self.res.slack,
+                non_binding_only, self.A_eq, self.b_eq, self.bounds)
+
+    def check(self):
+        self.consistancy_check()
+
+    def tables(self, income=False, accounttrans=False, tax=False,
+               taxbrackets=False):
+        # the (name, print method) of each table report() prints, in order
+        tables = [("Activity Summary", self.print_model_results)]
+        if income:
+            tables += [("Income and Expense Summary",
+                        self.print_income_expense_details)]
+        if accounttrans:
+            tables += [("Account Transactions Summary", self.print_account_trans)]
+        if tax:
+            tables += [("Tax Summary", self.print_tax)]
+        if taxbrackets:
+            tables += [("Tax Bracket Summary", self.print_tax_brackets),
+                       ("Capital Gains Bracket Summary",
+                        self.print_cap_gains_brackets)]
+        tables += [("Plan Summary", self.print_base_config)]
+        return tables
+
+    def report(self, income=False, accounttrans=False, tax=False,
+               taxbrackets=False):
+        for name, table in self.tables(income, accounttrans, tax, taxbrackets):
+            table()
+
+    def render(self, tables):
+        #
+        # Returns {name: text} of the tables as they would print on
+        # stdout; nothing is printed or written to the csv file.
+        #
+        ao = self.ao
+        self.ao = app_out.app_output(None, buffered=True)
+        text = {}
+        try:
+            for name, table in tables:
+                with contextlib.redirect_stdout(io.StringIO()) as f:
+                    table()
+                    self.ao.flush()
+                text[name] = f.getvalue()
+        finally:
+            self.ao = ao
+        return text
+
+    def precheck_consistancy(self):
+        S = self.S
+        print("\nDoing Pre-check:")
+        # check that there is income for all contibutions
+        #tcontribs = 0
+        for year in range(S.numyr):
+            t = 0
+            for j in range(len(S.accounttable)):
+                if S.accounttable[j]['acctype'] != 'aftertax':
+                    v = S.accounttable[j]
+                    c = v.get('contributions', None)
+                    if c is not None:
+                        t += c[year]
+            if t > S.income[year]:
+                print("year: %d, total contributions of (%.0f) to all Retirement accounts exceeds other earned income (%.0f)" % (
+                    year, t, S.income[year]))
+                print(
+                    "Please change the contributions in the toml file to be less than non-SS income.")
+                exit(1)
+        return True
+
+    def consistancy_check(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        vindx = self.vindx
+        rv = self.rv
+        # check to see if the ordinary tax brackets are filled in properly
+        print()
+        print()
+        print("Consistancy Checking:")
+        print()
+
+        result = vvar.my_check_index_sequence(
+            S.numyr, len(taxinfo.taxtable), len(taxinfo.capgainstable),
+            len(S.accounttable), S.accmap, vindx)
+
+        for year in range(S.numyr):
+            s = 0
             fz = False
             fnf = False
-            for l in range(len(taxinfo.capgainstable)):
-                cut, size, rate = taxinfo.capgainstable[l]
+            i_mul = S.i_mul[year]
+            for k in range(len(taxinfo.taxtable)):
+                cut, size, rate, base = taxinfo.taxtable[k]
                 size *= i_mul
-                bamount = res.x[vindx.y(year, l)]
-                scg += bamount
-                for k in range(len(taxinfo.taxtable) - 1):
-                    if taxinfo.taxtable[k][0] >= taxinfo.capgainstable[l][0] and taxinfo.taxtable[k][0] < taxinfo.capgainstable[l + 1][0]:
-                        bamount += res.x[vindx.x(year, k)]
-                if fnf and bamount > 0:
-                    print("Inproper packed CG brackets in year %d, bracket %d not empty while previous bracket not full." % (
-                        year, l))
-                if bamount + 1 < size:
+                s += rv.x[year, k]
+                if fnf and rv.x[year, k] > 0:
+                    print("Inproper packed brackets in year %d, bracket %d not empty while previous bracket not full." % (
+                        year, k))
+                if rv.x[year, k] + 1 < size:
                     fnf = True
-                if fz and bamount > 0:
-                    print(
-                        "Inproperly packed GC tax brackets in year %d bracket %d" % (year, l))
-                if bamount == 0.0:
+                if fz and rv.x[year, k] > 0:
+                    print("Inproperly packed tax brackets in year %d bracket %d" % (year, k))
+                if rv.x[year, k] == 0.0:
                     fz = True
-        TaxableOrdinary = OrdinaryTaxable(year)
-        if (TaxableOrdinary + 0.1 < s) or (TaxableOrdinary - 0.1 > s):
-            print("Error: Expected (age:%d) Taxable Ordinary income %6.2f doesn't match bracket sum %6.2f" %
-                  (year + S.startage, TaxableOrdinary, s))
-
-        for j in range(len(S.accounttable)):
-            a = res.x[vindx.b(year + 1, j)] - (res.x[vindx.b(year, j)] - res.x[vindx.w(
-                year, j)] + deposit_amount(S, res, year, j)) * S.accounttable[j]['rate']
-            if a > 1:
-                v = S.accounttable[j]
-                print("account[%d], type %s, index %d, mykey %s" %
-                      (j, v['acctype'], v['index'], v['mykey']))
-                print("account[%d] year to year balance NOT OK years %d to %d" % (
-                    j, year, year + 1))
-                print("difference is", a)
-
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        if spendable + 0.1 < res.x[vindx.s(year)] or spendable - 0.1 > res.x[vindx.s(year)]:
-            print("Calc Spendable %6.2f should equal s(year:%d) %6.2f" %
-                  (spendable, year, res.x[vindx.s(year)]))
+            if S.accmap['aftertax'] > 0:
+                scg = 0
+                fz = False
+                fnf = False
+                for l in range(len(taxinfo.capgainstable)):
+                    cut, size, rate = taxinfo.capgainstable[l]
+                    size *= i_mul
+                    bamount = rv.y[year, l]
+                    scg += bamount
+                    for k in range(len(taxinfo.taxtable) - 1):
+                        if taxinfo.taxtable[k][0] >= taxinfo.capgainstable[l][0] and taxinfo.taxtable[k][0] < taxinfo.capgainstable[l + 1][0]:
+                            bamount += rv.x[year, k]
+                    if fnf and bamount > 0:
+                        print("Inproper packed CG brackets in year %d, bracket %d not empty while previous bracket not full." % (
+                            year, l))
+                    if bamount + 1 < size:
+                        fnf = True
+                    if fz and bamount > 0:
+                        print(
+                            "Inproperly packed GC tax brackets in year %d bracket %d" % (year, l))
+                    if bamount == 0.0:
+                        fz = True
+            TaxableOrdinary = self.OrdinaryTaxable(year)
+            if (TaxableOrdinary + 0.1 < s) or (TaxableOrdinary - 0.1 > s):
+                print("Error: Expected (age:%d) Taxable Ordinary income %6.2f doesn't match bracket sum %6.2f" %
+                      (year + S.startage, TaxableOrdinary, s))
+
             for j in range(len(S.accounttable)):
-                print("+w[%d,%d]: %6.0f" % (year, j, res.x[vindx.w(year, j)]))
-                print("-D[%d,%d]: %6.0f" %
-                      (year, j, deposit_amount(S, res, year, j)))
-            print("+o[%d]: %6.0f +SS[%d]: %6.0f -tax: %6.0f -cg_tax: %6.0f" %
-                  (year, S.income[year], year, S.SS[year], tax, cg_tax))
-
-        bt = 0
-        for k in range(len(taxinfo.taxtable)):
-            bt += res.x[vindx.x(year, k)] * taxinfo.taxtable[k][2]
-        if tax + 0.1 < bt or tax - 0.1 > bt:
-            print("Calc tax %6.2f should equal brackettax(bt)[]: %6.2f" % (tax, bt))
-    print()
-
-
-def print_model_results(res):
-    def printheader1(fieldwidth):
-        names = None
-        if S.secondary != "":
-            names = "{}/{}\n".format(S.primary, S.secondary)
-            age_width = 8
-        else:
-            if S.primary != 'nokey':
-                names = "{}\n".format(S.primary)
-            age_width = 5
-        if names is not None:
-            ao.output('{:<s}'.format(names, width=2 *
-                                     age_width, use=2 * age_width))
-        ao.output("{:>{width}.{width}s}".format('age ', width=age_width))
-        headers = ["fIRA", "tIRA", "RMDref", "fRoth", "tRoth", "fAftaTx",
-                   "tAftaTx", "o_inc", "SS", "Expense", "TFedTax", "Spndble"]
-        for s in headers:
-            ao.output("&@{:>{width}.{width}s}".format(s, width=fieldwidth))
+                a = rv.b[year + 1, j] - (rv.b[year, j] - rv.w[year, j] +
+                                         deposit_amount(S, rv, year, j)) * S.accounttable[j]['rates'][year]
+                if a > 1:
+                    v = S.accounttable[j]
+                    print("account[%d], type %s, index %d, mykey %s" %
+                          (j, v['acctype'], v['index'], v['mykey']))
+                    print("account[%d] year to year balance NOT OK years %d to %d" % (
+                        j, year, year + 1))
+                    print("difference is", a)
+
+            T, spendable, tax, rate, cg_tax, earlytax, rothearly = self.IncomeSummary(
+                year)
+            if spendable + 0.1 < rv.s[year] or spendable - 0.1 > rv.s[year]:
+                print("Calc Spendable %6.2f should equal s(year:%d) %6.2f" %
+                      (spendable, year, rv.s[year]))
+                for j in range(len(S.accounttable)):
+                    print("+w[%d,%d]: %6.0f" % (year, j, rv.w[year, j]))
+                    print("-D[%d,%d]: %6.0f" %
+                          (year, j, deposit_amount(S, rv, year, j)))
+                print("+o[%d]: %6.0f +SS[%d]: %6.0f -tax: %6.0f -cg_tax: %6.0f" %
+                      (year, S.income[year], year, S.SS[year], tax, cg_tax))
+
+            bt = rv.x[year] @ [t[2] for t in taxinfo.taxtable]
+            if tax + 0.1 < bt or tax - 0.1 > bt:
+                print("Calc tax %6.2f should equal brackettax(bt)[]: %6.2f" % (tax, bt))
+        print()
+
+    def print_model_results(self):
+        S = self.S
+        rv = self.rv
+        ao = self.ao
+        OneK = self.OneK
+        def printheader1(fieldwidth):
+            names = None
+            if S.secondary != "":
+                names = "{}/{}\n".format(S.primary, S.secondary)
+                age_width = 8
+            else:
+                if S.primary != 'nokey':
+                    names = "{}\n".format(S.primary)
+                age_width = 5
+            if names is not None:
+                ao.output('{:<s}'.format(names, width=2 *
+                                         age_width, use=2 * age_width))
+            ao.output("{:>{width}.{width}s}".format('age ', width=age_width))
+            headers = ["fIRA", "tIRA", "RMDref", "fRoth", "tRoth", "fAftaTx",
+                       "tAftaTx", "o_inc", "SS", "Expense", "TFedTax", "Spndble"]
+            for s in headers:
+                ao.output("&@{:>{width}.{width}s}".format(s, width=fieldwidth))
+            ao.output('\n')
+
+        ao.output("\nActivity Summary:\n")
         ao.output('\n')
+        fieldwidth = 7
+        printheader1(fieldwidth)
+        for year in range(S.numyr):
+            i_mul = S.i_mul[year]
+            age = year + S.startage
+            T, spendable, tax, rate, cg_tax, earlytax, rothearly = self.IncomeSummary(
+                year)
+
+            rmdref = 0
+            # at most the first two accounts are type IRA w/ RMD requirement
+            for j in range(min(2, len(S.accounttable))):
+                if S.accounttable[j]['acctype'] == 'IRA':
+                    rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
+                    if rmd > 0:
+                        rmdref += rv.b[year, j] / rmd
+
+            withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            for j in range(len(S.accounttable)):
+                withdrawal[S.accounttable[j]['acctype']] += rv.w[year, j]
+                deposit[S.accounttable[j]['acctype']
+                        ] += deposit_amount(S, rv, year, j)
 
-    ao.output("\nActivity Summary:\n")
-    ao.output('\n')
-    fieldwidth = 7
-    printheader1(fieldwidth)
-    for year in range(S.numyr):
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        age = year + S.startage
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-
-        rmdref = 0
-        # at most the first two accounts are type IRA w/ RMD requirement
-        for j in range(min(2, len(S.accounttable))):
-            if S.accounttable[j]['acctype'] == 'IRA':
-                rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
-                if rmd > 0:
-                    rmdref += res.x[vindx.b(year, j)] / rmd
-
-        withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        for j in range(len(S.accounttable)):
-            withdrawal[S.accounttable[j]['acctype']] += res.x[vindx.w(year, j)]
-            deposit[S.accounttable[j]['acctype']
-                    ] += deposit_amount(S, res, year, j)
-
-        if S.secondary != "":
-            ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
-        else:
-            ao.output(" %3d:" % (year + S.startage))
-        items = [withdrawal['IRA'] / OneK, deposit['IRA'] / OneK, rmdref / OneK,  # IRA
-                 withdrawal['roth'] / OneK, deposit['roth'] / OneK,  # Roth
-                 withdrawal['aftertax'] / \
-                 OneK, deposit['aftertax'] / OneK,  # D, # AftaTax
-                 S.income[year] / OneK, S.SS[year] / \
-                 OneK, S.expenses[year] / OneK,
-                 (tax + cg_tax + earlytax) / OneK]
-        for i in items:
-            ao.output("&@{:>{width}.0f}".format(i, width=fieldwidth))
-        s = res.x[vindx.s(year)] / OneK
-        star = ' '
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        if spendable + 0.1 < res.x[vindx.s(year)] or \
-                spendable - 0.1 > res.x[vindx.s(year)]:
-            s = spendable / OneK
-            star = '*'
-        ao.output("&@%7.0f%c" % (s, star))
-        ao.output("\n")
-    printheader1(fieldwidth)
-
-
-def print_income_expense_details():
-    def print_income_header(headerlist, map, income_cat, fieldwidth):
-        names = ''
-        if S.secondary != "":
-            names = "{}/{}".format(S.primary, S.secondary)
-            age_width = 8
-        else:
-            if S.primary != 'nokey':
-                names = "{}".format(S.primary)
-            age_width = 5
-        ao.output('{:<{width}.{use}s}'.format(
-            names, width=age_width, use=age_width))
-        for i in range(len(map)):
-            if map[i] > 0:
-                ats = 1
-                if i > 0:
-                    ats = map[i - 1]
-                totalspace = fieldwidth * \
-                    map[i] + map[i] - 1  # -1 is for the &
-                ao.output("&{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
-                    str=income_cat[i], width=totalspace, at='@', at_width=ats))
-        ao.output("\n")
-        ao.output("{str:>{width}s}".format(width=age_width, str='age '))
-        for str in headerlist:
-            if str == 'nokey':  # HAACCKKK
-                str = 'SS'
-            ao.output('&@{:>{width}.{width}s}'.format(str, width=fieldwidth))
-        ao.output("\n")
-
-    ao.output("\nIncome and Expense Summary:\n\n")
-    headerlist, map, datamatrix = S.get_SS_income_asset_expense_list()
-    income_cat = ['SSincome:', 'Income:', 'AssetSale:', 'Expense:']
-    fieldwidth = 8
-    print_income_header(headerlist, map, income_cat, fieldwidth)
-
-    for year in range(S.numyr):
-        if S.secondary != "":
-            ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
-        else:
-            ao.output(" %3d:" % (year + S.startage))
-        for i in range(len(datamatrix)):
-            ao.output("&@{:{width}.0f}".format(
-                datamatrix[i][year] / OneK, width=fieldwidth))
-        ao.output("\n")
-    print_income_header(headerlist, map, income_cat, fieldwidth)
-
-
-def deposit_amount(S, res, year, index):
-    amount = res.x[vindx.D(year, index)]
-    if S.accounttable[index]['acctype'] == 'aftertax':
-        amount += S.asset_sale[year]
-    return amount
-
-
-def print_account_trans(res):
-    def print_acc_header1():
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            items = [withdrawal['IRA'] / OneK, deposit['IRA'] / OneK, rmdref / OneK,  # IRA
+                     withdrawal['roth'] / OneK, deposit['roth'] / OneK,  # Roth
+                     withdrawal['aftertax'] / \
+                     OneK, deposit['aftertax'] / OneK,  # D, # AftaTax
+                     S.income[year] / OneK, S.SS[year] / \
+                     OneK, S.expenses[year] / OneK,
+                     (tax + cg_tax + earlytax) / OneK]
+            for i in items:
+                ao.output("&@{:>{width}.0f}".format(i, width=fieldwidth))
+            s = rv.s[year] / OneK
+            star = ' '
+            if spendable + 0.1 < rv.s[year] or \
+                    spendable - 0.1 > rv.s[year]:
+                s = spendable / OneK
+                star = '*'
+            ao.output("&@%7.0f%c" % (s, star))
+            ao.output("\n")
+        printheader1(fieldwidth)
+        ao.flush()
+
+    def print_income_expense_details(self):
+        S = self.S
+        ao = self.ao
+        OneK = self.OneK
+        def print_income_header(headerlist, map, income_cat, fieldwidth):
+            names = ''
+            if S.secondary != "":
+                names = "{}/{}".format(S.primary, S.secondary)
+                age_width = 8
+            else:
+                if S.primary != 'nokey':
+                    names = "{}".format(S.primary)
+                age_width = 5
+            ao.output('{:<{width}.{use}s}'.format(
+                names, width=age_width, use=age_width))
+            for i in range(len(map)):
+                if map[i] > 0:
+                    ats = 1
+                    if i > 0:
+                        ats = map[i - 1]
+                    totalspace = fieldwidth * \
+                        map[i] + map[i] - 1  # -1 is for the &
+                    ao.output("&{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
+                        str=income_cat[i], width=totalspace, at='@', at_width=ats))
+            ao.output("\n")
+            ao.output("{str:>{width}s}".format(width=age_width, str='age '))
+            for str in headerlist:
+                if str == 'nokey':  # HAACCKKK
+                    str = 'SS'
+                ao.output('&@{:>{width}.{width}s}'.format(str, width=fieldwidth))
+            ao.output("\n")
+
+        ao.output("\nIncome and Expense Summary:\n\n")
+        headerlist, map, datamatrix = S.get_SS_income_asset_expense_list()
+        income_cat = ['SSincome:', 'Income:', 'AssetSale:', 'Expense:']
+        fieldwidth = 8
+        print_income_header(headerlist, map, income_cat, fieldwidth)
+
+        for year in range(S.numyr):
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            for i in range(len(datamatrix)):
+                ao.output("&@{:{width}.0f}".format(
+                    datamatrix[i][year] / OneK, width=fieldwidth))
+            ao.output("\n")
+        print_income_header(headerlist, map, income_cat, fieldwidth)
+        ao.flush()
+
+    def print_account_trans(self):
+        S = self.S
+        rv = self.rv
+        ao = self.ao
+        OneK = self.OneK
+        def print_acc_header1():
+            if S.secondary != "":
+                ao.output("%s/%s\n" % (S.primary, S.secondary))
+                ao.output("    age ")
+            else:
+                if S.primary != 'nokey':
+                    ao.output("%s\n" % (S.primary))
+                ao.output(" age ")
+            if S.accmap['IRA'] > 1:
+                ao.output(("&@%7s" * 8) % ("IRA1", "fIRA1", "tIRA1",
+                                           "RMDref1", "IRA2", "fIRA2", "tIRA2", "RMDref2"))
+            elif S.accmap['IRA'] == 1:
+                ao.output(("&@%7s" * 4) % ("IRA", "fIRA", "tIRA", "RMDref"))
+            if S.accmap['roth'] > 1:
+                ao.output(("&@%7s" * 6) % ("Roth1", "fRoth1",
+                                           "tRoth1", "Roth2", "fRoth2", "tRoth2"))
+            elif S.accmap['roth'] == 1:
+                ao.output(("&@%7s" * 3) % ("Roth", "fRoth", "tRoth"))
+            if S.accmap['IRA'] + S.accmap['roth'] == len(S.accounttable) - 1:
+                ao.output(("&@%7s" * 3) % ("AftaTx", "fAftaTx", "tAftaTx"))
+            ao.output("\n")
+
+        ao.output("\nAccount Transactions Summary:\n\n")
+        print_acc_header1()
+        #
+        # Print pre-plan info
+        #
         if S.secondary != "":
-            ao.output("%s/%s\n" % (S.primary, S.secondary))
-            ao.output("    age ")
+            ao.output("%3d/%3d:" % (S.primAge, S.primAge - S.delta))
         else:
-            if S.primary != 'nokey':
-                ao.output("%s\n" % (S.primary))
-            ao.output(" age ")
-        if S.accmap['IRA'] > 1:
-            ao.output(("&@%7s" * 8) % ("IRA1", "fIRA1", "tIRA1",
-                                       "RMDref1", "IRA2", "fIRA2", "tIRA2", "RMDref2"))
-        elif S.accmap['IRA'] == 1:
-            ao.output(("&@%7s" * 4) % ("IRA", "fIRA", "tIRA", "RMDref"))
-        if S.accmap['roth'] > 1:
-            ao.output(("&@%7s" * 6) % ("Roth1", "fRoth1",
-                                       "tRoth1", "Roth2", "fRoth2", "tRoth2"))
-        elif S.accmap['roth'] == 1:
-            ao.output(("&@%7s" * 3) % ("Roth", "fRoth", "tRoth"))
-        if S.accmap['IRA'] + S.accmap['roth'] == len(S.accounttable) - 1:
-            ao.output(("&@%7s" * 3) % ("AftaTx", "fAftaTx", "tAftaTx"))
+            ao.output(" %3d:" % (S.primAge))
+        for i in range(S.accmap['IRA']):
+            ao.output(("&@%7.0f" * 4) % (
+                S.accounttable[i]['origbal'] / OneK, 0, S.accounttable[i]['contrib'] / OneK, 0))  # IRAn
+        for i in range(S.accmap['roth']):
+            index = S.accmap['IRA'] + i
+            ao.output(("&@%7.0f" * 3) % (
+                S.accounttable[index]['origbal'] / OneK, 0, S.accounttable[index]['contrib'] / OneK))  # rothn
+        index = S.accmap['IRA'] + S.accmap['roth']
+        if index == len(S.accounttable) - 1:
+            ao.output(("&@%7.0f" * 3) % (
+                S.accounttable[index]['origbal'] / OneK, 0, S.accounttable[index]['contrib'] / OneK))  # aftertax
         ao.output("\n")
-
-    ao.output("\nAccount Transactions Summary:\n\n")
-    print_acc_header1()
-    #
-    # Print pre-plan info
-    #
-    if S.secondary != "":
-        ao.output("%3d/%3d:" % (S.primAge, S.primAge - S.delta))
-    else:
-        ao.output(" %3d:" % (S.primAge))
-    for i in range(S.accmap['IRA']):
-        ao.output(("&@%7.0f" * 4) % (
-            S.accounttable[i]['origbal'] / OneK, 0, S.accounttable[i]['contrib'] / OneK, 0))  # IRAn
-    for i in range(S.accmap['roth']):
-        index = S.accmap['IRA'] + i
-        ao.output(("&@%7.0f" * 3) % (
-            S.accounttable[index]['origbal'] / OneK, 0, S.accounttable[index]['contrib'] / OneK))  # rothn
-    index = S.accmap['IRA'] + S.accmap['roth']
-    if index == len(S.accounttable) - 1:
-        ao.output(("&@%7.0f" * 3) % (
-            S.accounttable[index]['origbal'] / OneK, 0, S.accounttable[index]['contrib'] / OneK))  # aftertax
-    ao.output("\n")
-    ao.output("Plan Start: ---------\n")
-    #
-    # Print plan info for each year
-    # TODO clean up the if/else below to follow the above forloop pattern
-    #
-    for year in range(S.numyr):
-        rmdref = [0, 0]
-        # only first two accounts are type IRA w/ RMD
-        for j in range(min(2, len(S.accounttable))):
-            if S.accounttable[j]['acctype'] == 'IRA':
-                rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
-                if rmd > 0:
-                    rmdref[j] = res.x[vindx.b(year, j)] / rmd
-
+        ao.output("Plan Start: ---------\n")
+        #
+        # Print plan info for each year
+        # TODO clean up the if/else below to follow the above forloop pattern
+        #
+        for year in range(S.numyr):
+            rmdref = [0, 0]
+            # only first two accounts are type IRA w/ RMD
+            for j in range(min(2, len(S.accounttable))):
+                if S.accounttable[j]['acctype'] == 'IRA':
+                    rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
+                    if rmd > 0:
+                        rmdref[j] = rv.b[year, j] / rmd
+
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            if S.accmap['IRA'] > 1:
+                ao.output(("&@%7.0f" * 8) % (
+                    rv.b[year, 0] / OneK, rv.w[year, 0] /
+                    OneK, deposit_amount(S, rv, year, 0) /
+                    OneK, rmdref[0] / OneK,  # IRA1
+                    rv.b[year, 1] / OneK, rv.w[year, 1] / OneK, deposit_amount(S, rv, year, 1) / OneK, rmdref[1] / OneK))  # IRA2
+            elif S.accmap['IRA'] == 1:
+                ao.output(("&@%7.0f" * 4) % (
+                    rv.b[year, 0] / OneK, rv.w[year, 0] / OneK, deposit_amount(S, rv, year, 0) / OneK, rmdref[0] / OneK))  # IRA1
+            index = S.accmap['IRA']
+            if S.accmap['roth'] > 1:
+                ao.output(("&@%7.0f" * 6) % (
+                    rv.b[year, index] / OneK, rv.w[year, index] /
+                    OneK, deposit_amount(S, rv, year, index) / OneK,  # roth1
+                    rv.b[year, index + 1] / OneK, rv.w[year, index + 1] / OneK, deposit_amount(S, rv, year, index + 1) / OneK))  # roth2
+            elif S.accmap['roth'] == 1:
+                ao.output(("&@%7.0f" * 3) % (
+                    rv.b[year, index] / OneK, rv.w[year, index] / OneK, deposit_amount(S, rv, year, index) / OneK))  # roth1
+            index = S.accmap['IRA'] + S.accmap['roth']
+            #assert index == len(S.accounttable)-1
+            if index == len(S.accounttable) - 1:
+                ao.output(("&@%7.0f" * 3) % (
+                    rv.b[year, index] / OneK,
+                    rv.w[year, index] / OneK,
+                    deposit_amount(S, rv, year, index) / OneK))  # aftertax account
+            ao.output("\n")
+        ao.output("Plan End: -----------\n")
+        #
+        # Post plan info
+        #
+        year = S.numyr
         if S.secondary != "":
             ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
+                      (year + S.startage, S.numyr + S.startage - S.delta))
         else:
             ao.output(" %3d:" % (year + S.startage))
-        if S.accmap['IRA'] > 1:
-            ao.output(("&@%7.0f" * 8) % (
-                res.x[vindx.b(year, 0)] / OneK, res.x[vindx.w(year, 0)] /
-                OneK, deposit_amount(S, res, year, 0) /
-                OneK, rmdref[0] / OneK,  # IRA1
-                res.x[vindx.b(year, 1)] / OneK, res.x[vindx.w(year, 1)] / OneK, deposit_amount(S, res, year, 1) / OneK, rmdref[1] / OneK))  # IRA2
-        elif S.accmap['IRA'] == 1:
+        for i in range(S.accmap['IRA']):
             ao.output(("&@%7.0f" * 4) % (
-                res.x[vindx.b(year, 0)] / OneK, res.x[vindx.w(year, 0)] / OneK, deposit_amount(S, res, year, 0) / OneK, rmdref[0] / OneK))  # IRA1
-        index = S.accmap['IRA']
-        if S.accmap['roth'] > 1:
-            ao.output(("&@%7.0f" * 6) % (
-                res.x[vindx.b(year, index)] / OneK, res.x[vindx.w(year, index)] /
-                OneK, deposit_amount(S, res, year, index) / OneK,  # roth1
-                res.x[vindx.b(year, index + 1)] / OneK, res.x[vindx.w(year, index + 1)] / OneK, deposit_amount(S, res, year, index + 1) / OneK))  # roth2
-        elif S.accmap['roth'] == 1:
+                rv.b[year, i] / OneK, 0, 0, 0))  # IRAn
+        for i in range(S.accmap['roth']):
+            index = S.accmap['IRA'] + i
             ao.output(("&@%7.0f" * 3) % (
-                res.x[vindx.b(year, index)] / OneK, res.x[vindx.w(year, index)] / OneK, deposit_amount(S, res, year, index) / OneK))  # roth1
+                rv.b[year, index] / OneK, 0, 0))  # rothn
         index = S.accmap['IRA'] + S.accmap['roth']
-        #assert index == len(S.accounttable)-1
         if index == len(S.accounttable) - 1:
             ao.output(("&@%7.0f" * 3) % (
-                res.x[vindx.b(year, index)] / OneK,
-                res.x[vindx.w(year, index)] / OneK,
-                deposit_amount(S, res, year, index) / OneK))  # aftertax account
-        ao.output("\n")
-    ao.output("Plan End: -----------\n")
-    #
-    # Post plan info
-    #
-    year = S.numyr
-    if S.secondary != "":
-        ao.output("%3d/%3d:" %
-                  (year + S.startage, S.numyr + S.startage - S.delta))
-    else:
-        ao.output(" %3d:" % (year + S.startage))
-    for i in range(S.accmap['IRA']):
-        ao.output(("&@%7.0f" * 4) % (
-            res.x[vindx.b(year, i)] / OneK, 0, 0, 0))  # IRAn
-    for i in range(S.accmap['roth']):
-        index = S.accmap['IRA'] + i
-        ao.output(("&@%7.0f" * 3) % (
-            res.x[vindx.b(year, index)] / OneK, 0, 0))  # rothn
-    index = S.accmap['IRA'] + S.accmap['roth']
-    if index == len(S.accounttable) - 1:
-        ao.output(("&@%7.0f" * 3) % (
-            res.x[vindx.b(year, index)] / OneK, 0, 0))  # aftertax
-    ao.output("\n")
-    print_acc_header1()
-
-
-def print_tax(res):
-    def printheader_tax():
-        if S.secondary != "":
-            ao.output("%s/%s\n" % (S.primary, S.secondary))
-            ao.output("    age ")
-        else:
-            if S.primary != 'nokey':
-                ao.output("%s\n" % (S.primary))
-            ao.output(" age ")
-        ao.output(("&@%7s" * 15) %
-                  ("fIRA", "tIRA", "TxbleO", "TxbleSS", "deduct", "T_inc", "earlyP", "fedtax", "mTaxB%", "fAftaTx", "tAftaTx", "cgTax%", "cgTax", "TFedTax", "spndble"))
+                rv.b[year, index] / OneK, 0, 0))  # aftertax
         ao.output("\n")
+        print_acc_header1()
+        ao.flush()
+
+    def print_tax(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        model = self.model
+        rv = self.rv
+        ao = self.ao
+        OneK = self.OneK
+        def printheader_tax():
+            if S.secondary != "":
+                ao.output("%s/%s\n" % (S.primary, S.secondary))
+                ao.output("    age ")
+            else:
+                if S.primary != 'nokey':
+                    ao.output("%s\n" % (S.primary))
+                ao.output(" age ")
+            ao.output(("&@%7s" * 15) %
+                      ("fIRA", "tIRA", "TxbleO", "TxbleSS", "deduct", "T_inc", "earlyP", "fedtax", "mTaxB%", "fAftaTx", "tAftaTx", "cgTax%", "cgTax", "TFedTax", "spndble"))
+            ao.output("\n")
+
+        ao.output("\nTax Summary:\n\n")
+        printheader_tax()
+        for year in range(S.numyr):
+            age = year + S.startage
+            i_mul = S.i_mul[year]
+            T, spendable, tax, rate, cg_tax, earlytax, rothearly = self.IncomeSummary(
+                year)
+            f = model.cg_taxable_fraction(year)
+            ttax = tax + cg_tax + earlytax
+            withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            for j in range(len(S.accounttable)):
+                withdrawal[S.accounttable[j]['acctype']] += rv.w[year, j]
+                deposit[S.accounttable[j]['acctype']
+                        ] += deposit_amount(S, rv, year, j)
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            star = ' '
+            if rothearly:
+                star = '*'
+            ao.output(("&@%7.0f" * 6 + "&@%6.0f%c" * 1 + "&@%7.0f" * 8) %
+                      (withdrawal['IRA'] / OneK, deposit['IRA'] / OneK,  # sum IRA
+                       S.taxed[year] / OneK, taxinfo.SS_taxable * \
+                       S.SS[year] / OneK,
+                       taxinfo.stded * i_mul / OneK, T / OneK, earlytax / \
+                       OneK, star, tax / OneK, rate * 100,
+                       withdrawal['aftertax'] / \
+                       OneK, deposit['aftertax'] / OneK,  # Aftertax
+                       f * 100, cg_tax / OneK,
+                       ttax / OneK, rv.s[year] / OneK))
+            ao.output("\n")
+        printheader_tax()
+        ao.flush()
+
+    def print_tax_brackets(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        rv = self.rv
+        ao = self.ao
+        OneK = self.OneK
+        def printheader_tax_brackets():
+            if S.secondary != "":
+                #ao.output("@@@@@@@%64s" % "Marginal Rate(%):")
+                spaces = 47
+            else:
+                #ao.output("@@@@@@@%61s" % "Marginal Rate(%):")
+                spaces = 44
+            ao.output("{amp:&<{amp_width}.{amp_width}s}{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
+                str="Marginal Rate(%):", width=17, amp='&', amp_width=spaces, at='@', at_width=7))
+            for k in range(len(taxinfo.taxtable)):
+                (cut, size, rate, base) = taxinfo.taxtable[k]
+                ao.output("&@%6.0f" % (rate * 100))
+            ao.output("\n")
+            if S.secondary != "":
+                ao.output("%s/%s\n" % (S.primary, S.secondary))
+                ao.output("    age ")
+            else:
+                if S.primary != 'nokey':
+                    ao.output("%s\n" % (S.primary))
+                ao.output(" age ")
+            ao.output(("&@%7s" * 7) % ("fIRA", "tIRA", "TxbleO",
+                                       "TxbleSS", "deduct", "T_inc", "fedtax"))
+            for k in range(len(taxinfo.taxtable)):
+                ao.output("&@brckt%d" % k)
+            ao.output("&@brkTot\n")
+
+        ao.output("\nOverall Tax Bracket Summary:\n")
+        printheader_tax_brackets()
+        for year in range(S.numyr):
+            age = year + S.startage
+            i_mul = S.i_mul[year]
+            T, spendable, tax, rate, cg_tax, earlytax, rothearly = self.IncomeSummary(
+                year)
+            ttax = tax + cg_tax
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
+            for j in range(len(S.accounttable)):
+                withdrawal[S.accounttable[j]['acctype']] += rv.w[year, j]
+                deposit[S.accounttable[j]['acctype']
+                        ] += deposit_amount(S, rv, year, j)
+            ao.output(("&@%7.0f" * 7) %
+                      (
+                withdrawal['IRA'] / OneK, deposit['IRA'] / OneK,  # IRA
+                S.taxed[year] / OneK, taxinfo.SS_taxable * S.SS[year] / OneK,
+                taxinfo.stded * i_mul / OneK, T / OneK, tax / OneK))
+            bt = 0
+            for k in range(len(taxinfo.taxtable)):
+                ao.output("&@%6.0f" % rv.x[year, k])
+                bt += rv.x[year, k]
+            ao.output("&@%6.0f\n" % bt)
+        printheader_tax_brackets()
+        ao.flush()
+
+    def print_cap_gains_brackets(self):
+        S = self.S
+        taxinfo = self.taxinfo
+        model = self.model
+        rv = self.rv
+        ao = self.ao
+        OneK = self.OneK
+        def printheader_capgains_brackets():
+            if S.secondary != "":
+                spaces = 39
+            else:
+                spaces = 36
+            ao.output("{amp:&<{amp_width}.{amp_width}s}{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
+                str="Marginal Rate(%):", width=17, amp='&', amp_width=spaces, at='@', at_width=6))
+            for l in range(len(taxinfo.capgainstable)):
+                (cut, size, rate) = taxinfo.capgainstable[l]
+                ao.output("&@%6.0f" % (rate * 100))
+            ao.output("\n")
+            if S.secondary != "":
+                ao.output("%s/%s\n" % (S.primary, S.secondary))
+                ao.output("    age ")
+            else:
+                if S.primary != 'nokey':
+                    ao.output("%s\n" % (S.primary))
+                ao.output(" age ")
+            ao.output(("&@%7s" * 6) % ("fAftaTx", "tAftaTx",
+                                       "cgTax%", "cgTaxbl", "T_inc", "cgTax"))
+            for l in range(len(taxinfo.capgainstable)):
+                ao.output("&@brckt%d" % l)
+            ao.output("&@brkTot\n")
+
+        ao.output("\nOverall Capital Gains Bracket Summary:\n")
+        printheader_capgains_brackets()
+        for year in range(S.numyr):
+            age = year + S.startage
+            i_mul = S.i_mul[year]
+            f = 1
+            atw = 0
+            atd = 0
+            att = 0
+            if S.accmap['aftertax'] > 0:
+                f = model.cg_taxable_fraction(year)
+                # Aftertax / investment account always the last entry when present
+                j = len(S.accounttable) - 1
+                # Aftertax / investment account
+                atw = rv.w[year, j] / OneK
+                # Aftertax / investment account
+                atd = deposit_amount(S, rv, year, j) / OneK
+                #
+                # OK, this next bit can be confusing. In the line above atd
+                # includes both the D(i,j) and net amount from sell of assets
+                # like homes or real estate. But the sale of these illiquid assets
+                # does not use the aftertax account basis. They have been handled
+                # separately in S.cg_asset_taxed. Given this we only ad to
+                # cg_taxable the withdrawals over deposits, as is normal, plus
+                # the taxable amounts from asset sales.
+                att = ((f * (rv.w[year, j] - rv.D[year, j])) +
+                       S.cg_asset_taxed[year]) / OneK  # non-basis fraction / cg taxable $
+                if atd > atw:
+                    # non-basis fraction / cg taxable $
+                    att = S.cg_asset_taxed[year] / OneK
+            T, spendable, tax, rate, cg_tax, earlytax, rothearly = self.IncomeSummary(
+                year)
+            ttax = tax + cg_tax
+            if S.secondary != "":
+                ao.output("%3d/%3d:" %
+                          (year + S.startage, year + S.startage - S.delta))
+            else:
+                ao.output(" %3d:" % (year + S.startage))
+            ao.output(("&@%7.0f" * 6) %
+                      (
+                atw, atd,  # Aftertax / investment account
+                f * 100, att,  # non-basis fraction / cg taxable $
+                T / OneK, cg_tax / OneK))
+            bt = 0
+            bttax = 0
+            for l in range(len(taxinfo.capgainstable)):
+                ty = 0
+                if S.accmap['aftertax'] > 0:
+                    ty = rv.y[year, l]
+                ao.output("&@%6.0f" % ty)
+                bt += ty
+                bttax += ty * taxinfo.capgainstable[l][2]
+            ao.output("&@%6.0f\n" % bt)
+            if self.verbosewga:
+                ao.flush()  # keep order with the print() calls below
+                print(" cg bracket ttax %6.0f " % bttax, end='')
+                print("x->y[1]: %6.0f " % (rv.x[year, 0] +
+                                           rv.x[year, 1]), end='')
+                print("x->y[2]: %6.0f " % (rv.x[year, 2] + rv.x[year, 3] +
+                                           rv.x[year, 4] + rv.x[year, 5]), end='')
+                print("x->y[3]: %6.0f" % rv.x[year, 6])
+            # TODO move to self.consistancy_check()
+            # if (taxinfo.capgainstable[0][1]*i_mul -(rv.x[year,0]+rv.x[year,1])) <= rv.y[year,1]:
+            #    print("y[1]remain: %6.0f "% (taxinfo.capgainstable[0][1]*i_mul -(rv.x[year,0]+rv.x[year,1])))
+            # if (taxinfo.capgainstable[1][1]*i_mul - (rv.x[year,2]+ rv.x[year,3]+ rv.x[year,4]+rv.x[year,5])) <= rv.y[year,2]:
+            #    print("y[2]remain: %6.0f " % (taxinfo.capgainstable[1][1]*i_mul - (rv.x[year,2]+ rv.x[year,3]+ rv.x[year,4]+rv.x[year,5])))
+        printheader_capgains_brackets()
+        ao.flush()
+
+    def OrdinaryTaxable(self, year):
+        return self.isum.T[year]
+
+    def IncomeSummary(self, year):
+        #
+        # return OrdinaryTaxable, Spendable, Tax, Rate, CG_Tax, EarlyTax, RothEarly
+        # Need to account for withdrawals from IRA deposited in Investment account NOT SPENDABLE
+        #
+        return self.isum.year(year)
+
+    def get_result_totals(self):
+        S = self.S
+        rv = self.rv
+        isum = self.isum
+        twithd = rv.w.sum()
+        tincome = sum(S.income) + sum(S.SS)  # + withdrawals
+        ttax = isum.tax.sum()
+        tcg_tax = isum.cg_tax.sum()
+        tearlytax = isum.earlytax.sum()
+        tT = isum.T.sum()
+        tspendable = isum.spendable.sum()
+        tbeginbal = rv.b[0].sum()
+        # balance for the year following the last year
+        tendbal = rv.b[S.numyr].sum()
+
+        return twithd, tincome + twithd, tT, ttax, tcg_tax, tearlytax, tspendable, tbeginbal, tendbal
+
+    def schedule(self):
+        #
+        # The solved plan as plain python data, ready for json: the
+        # Activity Summary, Tax Summary and Account Transactions columns
+        # keyed by their table headers with one value per plan year, in
+        # dollars rather than thousands, and the plan totals.
+        #
+        S = self.S
+        taxinfo = self.taxinfo
+        rv = self.rv
+        isum = self.isum
+        years = range(S.numyr)
+        deposits = deposit_amounts(S, rv)
+        acctype = np.array([v['acctype'] for v in S.accounttable])
+        rmdref = np.zeros((S.numyr, len(S.accounttable)))
+        # at most the first two accounts are type IRA w/ RMD requirement
+        for year in years:
+            for j in range(min(2, len(S.accounttable))):
+                if S.accounttable[j]['acctype'] == 'IRA':
+                    rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
+                    if rmd > 0:
+                        rmdref[year, j] = rv.b[year, j] / rmd
 
-    ao.output("\nTax Summary:\n\n")
-    printheader_tax()
-    for year in range(S.numyr):
-        age = year + S.startage
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        f = model.cg_taxable_fraction(year)
-        ttax = tax + cg_tax + earlytax
-        withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        for j in range(len(S.accounttable)):
-            withdrawal[S.accounttable[j]['acctype']] += res.x[vindx.w(year, j)]
-            deposit[S.accounttable[j]['acctype']
-                    ] += deposit_amount(S, res, year, j)
-        if S.secondary != "":
-            ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
-        else:
-            ao.output(" %3d:" % (year + S.startage))
-        star = ' '
-        if rothearly:
-            star = '*'
-        ao.output(("&@%7.0f" * 6 + "&@%6.0f%c" * 1 + "&@%7.0f" * 8) %
-                  (withdrawal['IRA'] / OneK, deposit['IRA'] / OneK,  # sum IRA
-                   S.taxed[year] / OneK, taxinfo.SS_taxable * \
-                   S.SS[year] / OneK,
-                   taxinfo.stded * i_mul / OneK, T / OneK, earlytax / \
-                   OneK, star, tax / OneK, rate * 100,
-                   withdrawal['aftertax'] / \
-                   OneK, deposit['aftertax'] / OneK,  # Aftertax
-                   f * 100, cg_tax / OneK,
-                   ttax / OneK, res.x[vindx.s(year)] / OneK))
-        ao.output("\n")
-    printheader_tax()
+        def by_type(M, t):
+            return M[:, acctype == t].sum(axis=1).tolist()
 
+        def values(v):
+            return [float(x) for x in v]
 
-def print_tax_brackets(res):
-    def printheader_tax_brackets():
+        ages = {'age': [year + S.startage for year in years]}
         if S.secondary != "":
-            #ao.output("@@@@@@@%64s" % "Marginal Rate(%):")
-            spaces = 47
-        else:
-            #ao.output("@@@@@@@%61s" % "Marginal Rate(%):")
-            spaces = 44
-        ao.output("{amp:&<{amp_width}.{amp_width}s}{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
-            str="Marginal Rate(%):", width=17, amp='&', amp_width=spaces, at='@', at_width=7))
-        for k in range(len(taxinfo.taxtable)):
-            (cut, size, rate, base) = taxinfo.taxtable[k]
-            ao.output("&@%6.0f" % (rate * 100))
+            ages['spouse_age'] = [year + S.startage - S.delta for year in years]
+        ttax = isum.tax + isum.cg_tax + isum.earlytax
+        activity = dict(ages)
+        activity.update({
+            'fIRA': by_type(rv.w, 'IRA'), 'tIRA': by_type(deposits, 'IRA'),
+            'RMDref': values(rmdref.sum(axis=1)),
+            'fRoth': by_type(rv.w, 'roth'), 'tRoth': by_type(deposits, 'roth'),
+            'fAftaTx': by_type(rv.w, 'aftertax'),
+            'tAftaTx': by_type(deposits, 'aftertax'),
+            'o_inc': values(S.income), 'SS': values(S.SS),
+            'Expense': values(S.expenses), 'TFedTax': values(ttax),
+            'Spndble': values(rv.s)})
+        tax = dict(ages)
+        tax.update({
+            'fIRA': activity['fIRA'], 'tIRA': activity['tIRA'],
+            'TxbleO': values(S.taxed),
+            'TxbleSS': values(taxinfo.SS_taxable * np.array(S.SS, dtype=float)),
+            'deduct': values(taxinfo.stded * S.i_mul[:S.numyr]),
+            'T_inc': values(isum.T), 'earlyP': values(isum.earlytax),
+            'fedtax': values(isum.tax), 'mTaxB%': values(isum.rate * 100),
+            'fAftaTx': activity['fAftaTx'], 'tAftaTx': activity['tAftaTx'],
+            'cgTax%': [float(self.model.cg_taxable_fraction(year) * 100)
+                       for year in years],
+            'cgTax': values(isum.cg_tax), 'TFedTax': values(ttax),
+            'spndble': values(rv.s)})
+        accounts = []
+        for j, v in enumerate(S.accounttable):
+            account = {'acctype': v['acctype'], 'owner': v.get('mykey'),
+                       'bal': values(rv.b[:, j]), 'withdrawal': values(rv.w[:, j]),
+                       'deposit': values(deposits[:, j])}
+            if v['acctype'] == 'IRA':
+                account['RMDref'] = values(rmdref[:, j])
+            accounts.append(account)
+        totals = dict(zip(['withdrawals', 'income', 'taxable', 'tax', 'cg_tax',
+                           'earlytax', 'spendable', 'beginbal', 'endbal'],
+                          [float(t) for t in self.get_result_totals()]))
+        return {'maximize': S.maximize, 'status': S.retirement_type,
+                'spending': float(rv.s[0]), 'activity': activity, 'tax': tax,
+                'accounts': accounts, 'totals': totals}
+
+    def print_base_config(self):
+        S = self.S
+        rv = self.rv
+        ao = self.ao
+        totwithd, tincome, tTaxable, tincometax, tcg_tax, tearlytax, tspendable, tbeginbal, tendbal = self.get_result_totals()
         ao.output("\n")
-        if S.secondary != "":
-            ao.output("%s/%s\n" % (S.primary, S.secondary))
-            ao.output("    age ")
-        else:
-            if S.primary != 'nokey':
-                ao.output("%s\n" % (S.primary))
-            ao.output(" age ")
-        ao.output(("&@%7s" * 7) % ("fIRA", "tIRA", "TxbleO",
-                                   "TxbleSS", "deduct", "T_inc", "fedtax"))
-        for k in range(len(taxinfo.taxtable)):
-            ao.output("&@brckt%d" % k)
-        ao.output("&@brkTot\n")
-
-    ao.output("\nOverall Tax Bracket Summary:\n")
-    printheader_tax_brackets()
-    for year in range(S.numyr):
-        age = year + S.startage
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        ttax = tax + cg_tax
-        if S.secondary != "":
-            ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
-        else:
-            ao.output(" %3d:" % (year + S.startage))
-        withdrawal = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        deposit = {'IRA': 0, 'roth': 0, 'aftertax': 0}
-        for j in range(len(S.accounttable)):
-            withdrawal[S.accounttable[j]['acctype']] += res.x[vindx.w(year, j)]
-            deposit[S.accounttable[j]['acctype']
-                    ] += deposit_amount(S, res, year, j)
-        ao.output(("&@%7.0f" * 7) %
-                  (
-            withdrawal['IRA'] / OneK, deposit['IRA'] / OneK,  # IRA
-            S.taxed[year] / OneK, taxinfo.SS_taxable * S.SS[year] / OneK,
-            taxinfo.stded * i_mul / OneK, T / OneK, tax / OneK))
-        bt = 0
-        for k in range(len(taxinfo.taxtable)):
-            ao.output("&@%6.0f" % res.x[vindx.x(year, k)])
-            bt += res.x[vindx.x(year, k)]
-        ao.output("&@%6.0f\n" % bt)
-    printheader_tax_brackets()
-
-
-def print_cap_gains_brackets(res):
-    def printheader_capgains_brackets():
-        if S.secondary != "":
-            spaces = 39
-        else:
-            spaces = 36
-        ao.output("{amp:&<{amp_width}.{amp_width}s}{at:@<{at_width}.{at_width}s}{str:<{width}.{width}s}".format(
-            str="Marginal Rate(%):", width=17, amp='&', amp_width=spaces, at='@', at_width=6))
-        for l in range(len(taxinfo.capgainstable)):
-            (cut, size, rate) = taxinfo.capgainstable[l]
-            ao.output("&@%6.0f" % (rate * 100))
+        ao.output("======\n")
+        ao.output("Optimized for {} with {} status\n\tstarting at age {} with an estate of ${:_.0f} liquid and ${:_.0f} illiquid\n".format(
+            S.maximize, S.retirement_type, S.startage, tbeginbal, S.illiquidassetplanstart))
+        ao.output('\n')
+        ao.output('Minium desired: ${:0_.0f}\n'.format(S.min))
+        ao.output('Maximum desired: ${:0_.0f}\n'.format(S.max))
+        ao.output('\n')
+        ao.output('After tax yearly income: ${:0_.0f} adjusting for inflation\n\tand final estate at age {} with ${:_.0f} liquid and ${:_.0f} illiquid\n'.format(
+            rv.s[0], S.startage + S.numyr, tendbal, S.illiquidassetplanend))
         ao.output("\n")
-        if S.secondary != "":
-            ao.output("%s/%s\n" % (S.primary, S.secondary))
-            ao.output("    age ")
-        else:
-            if S.primary != 'nokey':
-                ao.output("%s\n" % (S.primary))
-            ao.output(" age ")
-        ao.output(("&@%7s" * 6) % ("fAftaTx", "tAftaTx",
-                                   "cgTax%", "cgTaxbl", "T_inc", "cgTax"))
-        for l in range(len(taxinfo.capgainstable)):
-            ao.output("&@brckt%d" % l)
-        ao.output("&@brkTot\n")
-
-    ao.output("\nOverall Capital Gains Bracket Summary:\n")
-    printheader_capgains_brackets()
-    for year in range(S.numyr):
-        age = year + S.startage
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        f = 1
-        atw = 0
-        atd = 0
-        att = 0
-        if S.accmap['aftertax'] > 0:
-            f = model.cg_taxable_fraction(year)
-            # Aftertax / investment account always the last entry when present
-            j = len(S.accounttable) - 1
-            # Aftertax / investment account
-            atw = res.x[vindx.w(year, j)] / OneK
-            # Aftertax / investment account
-            atd = deposit_amount(S, res, year, j) / OneK
-            #
-            # OK, this next bit can be confusing. In the line above atd
-            # includes both the D(i,j) and net amount from sell of assets
-            # like homes or real estate. But the sale of these illiquid assets
-            # does not use the aftertax account basis. They have been handled
-            # separately in S.cg_asset_taxed. Given this we only ad to
-            # cg_taxable the withdrawals over deposits, as is normal, plus
-            # the taxable amounts from asset sales.
-            att = ((f * (res.x[vindx.w(year, j)] - res.x[vindx.D(year, j)])) +
-                   S.cg_asset_taxed[year]) / OneK  # non-basis fraction / cg taxable $
-            if atd > atw:
-                # non-basis fraction / cg taxable $
-                att = S.cg_asset_taxed[year] / OneK
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        ttax = tax + cg_tax
-        if S.secondary != "":
-            ao.output("%3d/%3d:" %
-                      (year + S.startage, year + S.startage - S.delta))
-        else:
-            ao.output(" %3d:" % (year + S.startage))
-        ao.output(("&@%7.0f" * 6) %
-                  (
-            atw, atd,  # Aftertax / investment account
-            f * 100, att,  # non-basis fraction / cg taxable $
-            T / OneK, cg_tax / OneK))
-        bt = 0
-        bttax = 0
-        for l in range(len(taxinfo.capgainstable)):
-            ty = 0
-            if S.accmap['aftertax'] > 0:
-                ty = res.x[vindx.y(year, l)]
-            ao.output("&@%6.0f" % ty)
-            bt += ty
-            bttax += ty * taxinfo.capgainstable[l][2]
-        ao.output("&@%6.0f\n" % bt)
-        if args.verbosewga:
-            print(" cg bracket ttax %6.0f " % bttax, end='')
-            print("x->y[1]: %6.0f " % (res.x[vindx.x(year, 0)] +
-                                       res.x[vindx.x(year, 1)]), end='')
-            print("x->y[2]: %6.0f " % (res.x[vindx.x(year, 2)] + res.x[vindx.x(year, 3)
-                                                                       ] + res.x[vindx.x(year, 4)] + res.x[vindx.x(year, 5)]), end='')
-            print("x->y[3]: %6.0f" % res.x[vindx.x(year, 6)])
-        # TODO move to consistancy_check()
-        # if (taxinfo.capgainstable[0][1]*i_mul -(res.x[vindx.x(year,0)]+res.x[vindx.x(year,1)])) <= res.x[vindx.y(year,1)]:
-        #    print("y[1]remain: %6.0f "% (taxinfo.capgainstable[0][1]*i_mul -(res.x[vindx.x(year,0)]+res.x[vindx.x(year,1)])))
-        # if (taxinfo.capgainstable[1][1]*i_mul - (res.x[vindx.x(year,2)]+ res.x[vindx.x(year,3)]+ res.x[vindx.x(year,4)]+res.x[vindx.x(year,5)])) <= res.x[vindx.y(year,2)]:
-        #    print("y[2]remain: %6.0f " % (taxinfo.capgainstable[1][1]*i_mul - (res.x[vindx.x(year,2)]+ res.x[vindx.x(year,3)]+ res.x[vindx.x(year,4)]+res.x[vindx.x(year,5)])))
-    printheader_capgains_brackets()
-
-
-def OrdinaryTaxable(year):
-    withdrawals = 0
-    deposits = 0
-    for j in range(min(2, len(S.accounttable))):
-        if S.accounttable[j]['acctype'] == 'IRA':
-            withdrawals += res.x[vindx.w(year, j)]
-            deposits += deposit_amount(S, res, year, j)
-    T = withdrawals - deposits + S.taxed[year] + taxinfo.SS_taxable * \
-        S.SS[year] - (taxinfo.stded * S.i_rate**(S.preplanyears + year))
-    if T < 0:
-        T = 0
-    return T
-
-
-def IncomeSummary(year):
-    # TODO clean up and simplify this fuction
-    #
-    # return OrdinaryTaxable, Spendable, Tax, Rate, CG_Tax
-    # Need to account for withdrawals from IRA deposited in Investment account NOT SPENDABLE
-    age = year + S.startage
-    earlytax = 0
-    roth_early = False
-    for j in range(len(S.accounttable)):
-        if S.accounttable[j]['acctype'] != 'aftertax':
-            if S.apply_early_penalty(year, S.accounttable[j]['mykey']):
-                earlytax += res.x[vindx.w(year, j)] * taxinfo.penalty
-                if res.x[vindx.w(year, j)] > 0 and S.accounttable[j]['acctype'] == 'roth':
-                    roth_early = True
-    T = OrdinaryTaxable(year)
-    ntax = 0
-    rate = 0
-    for k in range(len(taxinfo.taxtable)):
-        ntax += res.x[vindx.x(year, k)] * taxinfo.taxtable[k][2]
-        if res.x[vindx.x(year, k)] > 0:
-            rate = taxinfo.taxtable[k][2]
-    tax = ntax
-    D = 0
-    ncg_tax = 0
-    # if S.accmap['aftertax'] > 0:
-    for j in range(len(S.accounttable)):
-        D += deposit_amount(S, res, year, j)
-    if S.accmap['aftertax'] > 0:
-        for l in range(len(taxinfo.capgainstable)):
-            ncg_tax += res.x[vindx.y(year, l)] * taxinfo.capgainstable[l][2]
-    tot_withdrawals = 0
-    for j in range(len(S.accounttable)):
-        tot_withdrawals += res.x[vindx.w(year, j)]
-    spendable = tot_withdrawals - D + \
-        S.income[year] + S.SS[year] - S.expenses[year] - \
-        tax - ncg_tax - earlytax + S.asset_sale[year]
-    return T, spendable, tax, rate, ncg_tax, earlytax, roth_early
-
-
-def get_result_totals(res):
-    twithd = 0
-    ttax = 0
-    tcg_tax = 0
-    tT = 0
-    tearlytax = 0
-    tincome = 0
-    pv_tincome = 0
-    tspendable = 0
-    pv_twithd = 0
-    pv_ttax = 0
-    pv_tT = 0
-    for year in range(S.numyr):
-        i_mul = S.i_rate ** (S.preplanyears + year)
-        T, spendable, tax, rate, cg_tax, earlytax, rothearly = IncomeSummary(
-            year)
-        tot_withdrawals = 0
-        for j in range(len(S.accounttable)):
-            tot_withdrawals += res.x[vindx.w(year, j)]
-        twithd += tot_withdrawals
-        tincome += S.income[year] + S.SS[year]  # + withdrawals
-        ttax += tax
-        tcg_tax += cg_tax
-        tearlytax += earlytax
-        tT += T
-        tspendable += spendable
-    tbeginbal = 0
-    tendbal = 0
-    for j in range(len(S.accounttable)):
-        tbeginbal += res.x[vindx.b(0, j)]
-        # balance for the year following the last year
-        tendbal += res.x[vindx.b(S.numyr, j)]
-
-    return twithd, tincome + twithd, tT, ttax, tcg_tax, tearlytax, tspendable, tbeginbal, tendbal
-
-
-def print_base_config(res):
-    totwithd, tincome, tTaxable, tincometax, tcg_tax, tearlytax, tspendable, tbeginbal, tendbal = get_result_totals(
-        res)
-    ao.output("\n")
-    ao.output("======\n")
-    ao.output("Optimized for {} with {} status\n\tstarting at age {} with an estate of ${:_.0f} liquid and ${:_.0f} illiquid\n".format(
-        S.maximize, S.retirement_type, S.startage, tbeginbal, S.illiquidassetplanstart))
-    ao.output('\n')
-    ao.output('Minium desired: ${:0_.0f}\n'.format(S.min))
-    ao.output('Maximum desired: ${:0_.0f}\n'.format(S.max))
-    ao.output('\n')
-    ao.output('After tax yearly income: ${:0_.0f} adjusting for inflation\n\tand final estate at age {} with ${:_.0f} liquid and ${:_.0f} illiquid\n'.format(
-        res.x[vindx.s(0)], S.startage + S.numyr, tendbal, S.illiquidassetplanend))
-    ao.output("\n")
-    ao.output('total withdrawals: ${:0_.0f}\n'.format(totwithd))
-    ao.output('total ordinary taxable income ${:_.0f}\n'.format(tTaxable))
-    ao.output('total ordinary tax on all taxable income: ${:0_.0f} ({:.1f}%) of taxable income\n'.format(
-        tincometax + tearlytax, 100 * (tincometax + tearlytax) / tTaxable))
-    ao.output('total income (withdrawals + other) ${:_.0f}\n'.format(tincome))
-    ao.output('total cap gains tax: ${:0_.0f}\n'.format(tcg_tax))
-    ao.output('total all tax on all income: ${:0_.0f} ({:.1f}%)\n'.format(
-        tincometax + tcg_tax + tearlytax, 100 * (tincometax + tcg_tax + tearlytax) / tincome))
-    ao.output(
-        "Total spendable (after tax money): ${:0_.0f}\n".format(tspendable))
-    ao.output("\n")
-
-
-def verifyInputs(c, A, b):
-    m = len(A)
-    n = len(A[0])
-    if len(c) != n:
-        print("lp: c vector incorrect length")
-    if len(b) != m:
-        print("lp: b vector incorrect length")
-
-        # Do some sanity checks so that ab does not become singular during the
-        # simplex solution. If the ZeroRow checks are removed then the code for
-        # finding a set of linearly indepent columns must be improved.
-
-        # Check that if a row of A only has zero elements that corresponding
-        # element in b is zero, otherwise the problem is infeasible.
-        # Otherwise return ErrZeroRow.
-    zeroRows = 0
-    for i in range(m):
-        isZero = True
-        for j in range(n):
-            if A[i][j] != 0:
-                isZero = False
-                break
-        if isZero and b[i] != 0:
-            # Infeasible
-            print("ErrInfeasible -- row[%d]\n" % i)
-        elif isZero:
-            zeroRows += 1
-            print("ErrZeroRow -- row[%d]\n" % i)
-    # Check that if a column only has zero elements that the respective C vector
-    # is positive (otherwise unbounded). Otherwise return ErrZeroColumn.
-    zeroColumns = 0
-    for j in range(n):
-        isZero = True
+        ao.output('total withdrawals: ${:0_.0f}\n'.format(totwithd))
+        ao.output('total ordinary taxable income ${:_.0f}\n'.format(tTaxable))
+        ao.output('total ordinary tax on all taxable income: ${:0_.0f} ({:.1f}%) of taxable income\n'.format(
+            tincometax + tearlytax, 100 * (tincometax + tearlytax) / tTaxable))
+        ao.output('total income (withdrawals + other) ${:_.0f}\n'.format(tincome))
+        ao.output('total cap gains tax: ${:0_.0f}\n'.format(tcg_tax))
+        ao.output('total all tax on all income: ${:0_.0f} ({:.1f}%)\n'.format(
+            tincometax + tcg_tax + tearlytax, 100 * (tincometax + tcg_tax + tearlytax) / tincome))
+        ao.output(
+            "Total spendable (after tax money): ${:0_.0f}\n".format(tspendable))
+        ao.output("\n")
+        ao.flush()
+
+    def verifyInputs(self, c, A, b):
+        vindx = self.vindx
+        m = len(A)
+        n = len(A[0])
+        if len(c) != n:
+            print("lp: c vector incorrect length")
+        if len(b) != m:
+            print("lp: b vector incorrect length")
+
+            # Do some sanity checks so that ab does not become singular during the
+            # simplex solution. If the ZeroRow checks are removed then the code for
+            # finding a set of linearly indepent columns must be improved.
+
+            # Check that if a row of A only has zero elements that corresponding
+            # element in b is zero, otherwise the problem is infeasible.
+            # Otherwise return ErrZeroRow.
+        zeroRows = 0
         for i in range(m):
-            if A[i][j] != 0:
-                isZero = False
-                break
-        if isZero and c[j] < 0:
-            print("ErrUnbounded -- column[%d] %s\n" % (j, vindx.varstr(j)))
-        elif isZero:
-            zeroColumns += 1
-            print("ErrZeroColumn -- column[%d] %s\n" % (j, vindx.varstr(j)))
-    print("\nZero Rows: %d, Zero Columns: %d\n" % (zeroRows, zeroColumns))
+            isZero = True
+            for j in range(n):
+                if A[i][j] != 0:
+                    isZero = False
+                    break
+            if isZero and b[i] != 0:
+                # Infeasible
+                print("ErrInfeasible -- row[%d]\n" % i)
+            elif isZero:
+                zeroRows += 1
+                print("ErrZeroRow -- row[%d]\n" % i)
+        # Check that if a column only has zero elements that the respective C vector
+        # is positive (otherwise unbounded). Otherwise return ErrZeroColumn.
+        zeroColumns = 0
+        for j in range(n):
+            isZero = True
+            for i in range(m):
+                if A[i][j] != 0:
+                    isZero = False
+                    break
+            if isZero and c[j] < 0:
+                print("ErrUnbounded -- column[%d] %s\n" % (j, vindx.varstr(j)))
+            elif isZero:
+                zeroColumns += 1
+                print("ErrZeroColumn -- column[%d] %s\n" % (j, vindx.varstr(j)))
+        print("\nZero Rows: %d, Zero Columns: %d\n" % (zeroRows, zeroColumns))
+
+
+def watch(plan, conffile, tables, interval=0.5, timesimplex=False):
+    #
+    # Keep the solved plan (and this process with scipy imported) alive
+    # and re-plan each time conffile is saved. Only the toml input is
+    # reread, the model is updated in place where possible (see
+    # PlanSession.update()) and only the tables whose text changed are
+    # printed; so are the checking messages when they change. Errors in
+    # the edited file are reported and the previous tables are kept
+    # until the next save. Runs until interrupted.
+    #
+    def mtime():
+        try:
+            return os.stat(conffile).st_mtime_ns
+        except OSError:
+            return None  # editors may replace the file while saving
+
+    last = plan.render(tables)
+    with contextlib.redirect_stdout(io.StringIO()) as f:
+        plan.precheck_consistancy()
+        plan.check()
+    last_messages = f.getvalue()
+    seen = mtime()
+    print("\nWatching %s for changes (Ctrl-C to stop)" % conffile)
+    try:
+        while True:
+            time.sleep(interval)
+            m = mtime()
+            if m is None or m == seen:
+                continue
+            seen = m
+            start = time.perf_counter()
+            try:
+                with open(conffile) as f:
+                    toml_dict = toml.loads(f.read())
+            except (IOError, toml.TomlDecodeError) as e:
+                print("Error: %s - %s" % (conffile, e))
+                continue
+            res = None
+            error = None
+            with contextlib.redirect_stdout(io.StringIO()) as f:
+                try:
+                    kept = plan.update(toml_dict)
+                    if plan.precheck_consistancy():
+                        res = plan.solve(timesimplex)
+                        if res.success:
+                            plan.check()
+                except SystemExit:
+                    pass  # the toml checks print the reason and exit()
+                except Exception as e:
+                    # a key missing from or of the wrong type in the edit
+                    error = e
+                if res is None and plan.model is not None:
+                    # the failed edit may have left the model half
+                    # updated, build it afresh from the next save
+                    plan.model = None
+            messages = f.getvalue()
+            if res is None or not res.success:
+                sys.stdout.write(messages)
+                if error is not None:
+                    print("Error: %s: %s" % (type(error).__name__, error))
+                if res is not None:
+                    print(res)
+                print("Error: %s could not be planned, keeping the previous tables" % conffile)
+                continue
+            if messages != last_messages:
+                sys.stdout.write(messages)
+                last_messages = messages
+            text = plan.render(tables)
+            changed = [name for name, t in tables if text[name] != last.get(name)]
+            for name in changed:
+                sys.stdout.write(text[name])
+            last = text
+            print("\nRe-planned in %.0f ms, model %s; changed: %s" % (
+                (time.perf_counter() - start) * 1000,
+                "updated" if kept else "rebuilt",
+                ', '.join(changed) if len(changed) > 0 else "no tables"))
+    except KeyboardInterrupt:
+        print()
 
 
 # Program entry point
@@ -753,14 +1277,28 @@ if __name__ == '__main__':
                         help="Output the entire LP model - not just the binding constraints")
     parser.add_argument('-mdp', '--modeldumptable', nargs='?',
                         const='./RPlanModel.dat', default='',
-                        help="Output the entire LP model as c, A, b to file MODELDUMPTABLE (default: ./RPlanModel.dat)")
+                        help="Output the entire LP model and its solution to file MODELDUMPTABLE, which -mld replays (default: ./RPlanModel.dat)")
+    parser.add_argument('-mdck', '--modeldumpcheck', action='store_true',
+                        help="After -mdp load the dump back and compare every value (by default only its header is read back)")
     parser.add_argument('-mld', '--modelloadtable', nargs='?',
                         const='./RPlanModel.dat', default='',
-                        help="Load the LP model as c, A, b from file MODELLOADTABLE (default: ./RPlanModel.dat)")
+                        help="Replay the plan dumped by -mdp to file MODELLOADTABLE, without conffile (default: ./RPlanModel.dat)")
+    parser.add_argument('-mx', '--modelexport', nargs='?',
+                        const='./RPlanModel.lp', default='',
+                        help="Write the LP model, with named rows and variables, to file MODELEXPORT as CPLEX LP or, if it ends in .mps, as MPS (default: ./RPlanModel.lp)")
     parser.add_argument('-ts', '--timesimplex', action='store_true',
                         help="Measure and print the amount of time used by the simplex solver")
+    parser.add_argument('-s', '--solver', choices=lp_solvers.names, default='highs',
+                        help="LP solver backend (default: highs, letting HiGHS choose; glpk and cbc need the glpsol or cbc program)")
+    parser.add_argument('-sc', '--solutioncache', nargs='?',
+                        const='./.rplan_cache', default='',
+                        help="Reuse solutions of identical models from cache directory SOLUTIONCACHE (default: ./.rplan_cache)")
+    parser.add_argument('-scmax', '--solutioncachemax', type=float, default=64,
+                        help="Maximum size of the solution cache in MB (default: 64)")
     parser.add_argument('-csv', '--csv', nargs='?', const='./a.csv', default='',
                         help="Additionally write the output to a csv file CVS (default: ./ .cvs)")
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help="Keep running and re-plan each time conffile is saved, printing only the tables that changed (not written to the csv file)")
     parser.add_argument('-1k', '--noroundingoutput', action='store_true',
                         help="Do not round the output to thousands")
     parser.add_argument('-nd', '--notdrarothradeposits', action='store_true',
@@ -768,8 +1306,10 @@ if __name__ == '__main__':
     parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
                         help="Display the program version number and exit")
     parser.add_argument(
-        'conffile', help='Require configuration input toml file')
+        'conffile', nargs='?', help='Require configuration input toml file (unless -mld)')
     args = parser.parse_args()
+    if args.conffile is None and args.modelloadtable == '':
+        parser.error('the following arguments are required: conffile')
 
     if args.alltables:
         args.verboseaccounttrans = True
@@ -780,97 +1320,61 @@ if __name__ == '__main__':
     csv_file_name = None
     if args.csv != '':
         csv_file_name = args.csv
-    ao = app_out.app_output(csv_file_name)
 
-    taxinfo = tif.taxinfo()
-    S = tomldata.Data(taxinfo)
-    S.load_toml_file(args.conffile)
-    S.process_toml_info()
+    if args.watch and args.modelloadtable != '':
+        print("Error: -w/--watch re-plans from the toml file and can not be used with -mld")
+        exit(1)
 
-    #print("\naccounttable: ", S.accounttable)
+    if not lp_solvers.available(args.solver):
+        print("Error: solver %s is not available here" % args.solver)
+        exit(1)
 
-    if S.accmap['IRA'] + S.accmap['roth'] + S.accmap['aftertax'] == 0:
-        print('Error: This app optimizes the withdrawals from your retirement account(s); you must have at least one specified in the input toml file.')
-        exit(0)
+    cache = None
+    if args.solutioncache != '':
+        cache = solution_cache.solution_cache(
+            args.solutioncache, int(args.solutioncachemax * 1024 * 1024))
 
-    if args.verbosewga:
-        print("accounttable: ", S.accounttable)
+    plan = PlanSession(args.conffile, csv_file_name, args.verbose,
+                       args.verbosewga, args.noroundingoutput,
+                       args.notdrarothradeposits, cache=cache,
+                       solver=args.solver,
+                       modelfile=args.modelloadtable if args.modelloadtable != '' else None)
 
     non_binding_only = True
     if args.verbosemodelall:
         non_binding_only = False
 
-    OneK = 1000.0
-    if args.noroundingoutput:
-        OneK = 1
-
-    years = S.numyr
-    taxbins = len(taxinfo.taxtable)
-    cgbins = len(taxinfo.capgainstable)
-    accounts = len(S.accounttable)
-
-    vindx = vvar.vector_var_index(years, taxbins, cgbins, accounts, S.accmap)
-
-    vid = [years, taxbins, cgbins, S.accmap["IRA"],
-           S.accmap["roth"], S.accmap["aftertax"]]
-
     #print("Is modelDumpTable Set?")
     if args.modeldumptable != '':
         #print("ModelDumpTable set")
         print(args.modeldumptable)
 
-    if precheck_consistancy():
+    with plan:
+        if plan.precheck_consistancy():
 
-        if args.modelloadtable == '':
-            model = lp.lp_constraint_model(S, vindx, taxinfo.taxtable, taxinfo.capgainstable, taxinfo.penalty,
-                                           taxinfo.stded, taxinfo.SS_taxable, args.verbose, args.notdrarothradeposits)
-            c, A, b, notes = model.build_model()
-            """
+            if args.modelloadtable == '':
+                # a replayed plan (-mld) arrives with its model
+                plan.build()
+            if args.modelexport != '':
+                plan.export_model(args.modelexport)
+            res = plan.solve(args.timesimplex)
             if args.modeldumptable != '':
-                #modelio.dumpModel(c, A, b)
-                modelio.binDumpModel(c, A, b, None, args.modeldumptable)
-            """
-        else:
-            print("Loadfile: ", args.modelloadtable)
-            c, A, b, vid = modelio.binLoadModel(args.modelloadtable)
-            note = None
-        #verifyInputs( c , A , b )
-        if args.timesimplex:
-            t = time.process_time()
-        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b,
-                                     options={"disp": args.verbose,
-                                              #"bland": True,
-                                              "tol": 1.0e-7,
-                                              "maxiter": 4000})
-        if args.timesimplex:
-            elapsed_time = time.process_time() - t
-            print("\nElapsed Simplex time: %s seconds" % elapsed_time)
-        if args.modeldumptable != '':
-            modelio.binDumpModel(c, A, b, res.x, vid,
-                                 args.modeldumptable + "X")
-        if args.verbosemodel or args.verbosemodelall:
-            if res.success == False:
-                model.print_model_matrix(c, A, b, notes, None, False)
+                plan.dump_model(args.modeldumptable, args.modeldumpcheck)
+            if args.verbosemodel or args.verbosemodelall:
+                plan.print_model(non_binding_only)
+                if res.success == False:
+                    print(res)
+                    exit(1)
+            if args.verbosewga or res.success == False:
                 print(res)
-                exit(1)
-            else:
-                model.print_model_matrix(
-                    c, A, b, notes, res.slack, non_binding_only)
-        if args.verbosewga or res.success == False:
-            print(res)
-            if res.success == False:
-                exit(1)
-        consistancy_check(res, years, taxbins, cgbins,
-                          accounts, S.accmap, vindx)
-
-        print_model_results(res)
-        if args.verboseincome:
-            print_income_expense_details()
-        if args.verboseaccounttrans:
-            print_account_trans(res)
-        if args.verbosetax:
-            print_tax(res)
-        if args.verbosetaxbrackets:
-            print_tax_brackets(res)
-            print_cap_gains_brackets(res)
-        print_base_config(res)
+                if res.success == False:
+                    exit(1)
+            plan.check()
+            plan.report(args.verboseincome, args.verboseaccounttrans,
+                        args.verbosetax, args.verbosetaxbrackets)
+            if args.watch:
+                plan.ao.flush()
+                watch(plan, args.conffile,
+                      plan.tables(args.verboseincome, args.verboseaccounttrans,
+                                  args.verbosetax, args.verbosetaxbrackets),
+                      timesimplex=args.timesimplex)
@@ -1,30 +1,63 @@
 import sys
 
 class app_output:
-    def __init__(self, file_name):
+    def __init__(self, file_name, buffered=False):
+        #
+        # With buffered=True output() only collects the fragments and
+        # flush() writes them out, as a single write to stdout and a
+        # single write to the csv file. Call flush() at the end of each
+        # table and use the object as a context manager so the final
+        # flush is guaranteed:
+        #     with app_output(name, buffered=True) as ao:
+        #
         self.csv_file = None
+        self.buffered = buffered
+        self.pending = []
         if file_name == '':
             print("\napp_output:File name can not be the empty string.\nIf no CSV file is desired use 'None' for the parameter.")
             exit(1)
         if file_name is not None:
             self.csv_file = open(file_name, 'w')
-    
+
     def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.flush()
         if self.csv_file is not None and not self.csv_file.closed:
             self.csv_file.close()
 
+    def flush(self):
+        if len(self.pending) > 0:
+            string = ''.join(self.pending)
+            self.pending = []
+            self.write(string)
+
     def output(self, string): # TODO move to a better place
+        if self.buffered:
+            self.pending.append(string)
+        else:
+            self.write(string)
+
+    def write(self, string):
         #
         # output writes the information after doing two separate
         # transformations. One for standard out and the other for
-        # writing the csv file. 
+        # writing the csv file.
         # For stdout, all '@' are removed and all '&' replaced with
         # a ' '.
-        # For cvs, all '@' are replaced with ',' and all '&' are 
-        # removed. 
+        # For cvs, all '@' are replaced with ',' and all '&' are
+        # removed.
         # The cvs wrok is done whenever the csv_file handle is not None
         #
         sys.stdout.write(string.replace('@','').replace('&',' '))
         if self.csv_file is not None:
             self.csv_file.write(string.replace('@',',').replace('&',''))
-            self.csv_file.flush()
\ No newline at end of file
+            self.csv_file.flush()
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+#
+# Historical backtest of a retirement plan: solve the plan once for each
+# historical start year, using the market returns and inflation that
+# followed it, and report the worst, median and best first year spending.
+#
+# The history is a local csv file with a header line and the columns
+#     year,return,cpi
+# where return is the market return for the year in percent (7.5) and
+# cpi is the consumer price index level for the year. Inflation for a
+# year is the change in cpi from the year before so the first row only
+# provides the starting cpi level. No dataset is shipped with the
+# planner; use one you trust and have the rights to.
+#
+
+import os
+import sys
+import csv
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+import ARetirementPlanner as planner
+import lp_solvers
+
+__version__ = planner.__version__
+
+
+def load_history(filename):
+    #
+    # returns years, gross returns and gross inflation as arrays, one
+    # entry for each year after the first row of the file
+    #
+    try:
+        with open(filename, newline='') as f:
+            rows = [r for r in csv.DictReader(f)]
+    except IOError as e:
+        print("Error: %s - %s." % (e.filename, e.strerror))
+        exit(1)
+    try:
+        rows.sort(key=lambda r: int(r['year']))
+        years = np.array([int(r['year']) for r in rows])
+        returns = np.array([float(r['return']) for r in rows])
+        cpi = np.array([float(r['cpi']) for r in rows])
+    except (KeyError, ValueError) as e:
+        print("Error: %s must have year, return and cpi columns of numbers (%s)" %
+              (filename, e))
+        exit(1)
+    if len(rows) < 2 or np.any(np.diff(years) != 1):
+        print("Error: %s must cover at least two consecutive years without gaps" % filename)
+        exit(1)
+    return years[1:], 1 + returns[1:] / 100, cpi[1:] / cpi[:-1]
+
+
+def init_worker():
+    #
+    # The planner's progress messages would only interleave across
+    # workers. The windows of a plan differ only in their rates so each
+    # solve starts from the basis of the worker's previous one.
+    #
+    global worker_solver
+    sys.stdout = open(os.devnull, 'w')
+    worker_solver = lp_solvers.warm_start(planner.solver_options)
+
+
+def solve_window(conffile, start, returns, inflation, notdrarothradeposits=False):
+    #
+    # returns start, success and s(0) for the plan starting in start, and
+    # the solver's iterations and whether it warm started
+    #
+    try:
+        with planner.PlanSession(conffile,
+                                 notdrarothradeposits=notdrarothradeposits,
+                                 inflation=inflation, returns=returns,
+                                 warm=worker_solver) as plan:
+            plan.build()
+            res = plan.solve()
+            if res.success:
+                return start, True, float(plan.rv.s[0]), res.nit, res.warm
+            return start, False, 0.0, res.nit, res.warm
+    except SystemExit:
+        pass
+    return start, False, 0.0, 0, False
+
+
+def run_backtest(conffile, years, returns, inflation, numyr, workers=None,
+                 notdrarothradeposits=False, stats=None):
+    #
+    # Solve the plan for every window of numyr consecutive years of the
+    # history (default: one worker per core). Returns the window start
+    # years, success flags and s(0) values as arrays. A stats dict is
+    # updated with the solver's lp_solvers.iteration_stats().
+    #
+    starts = range(len(years) - numyr + 1)
+    if len(starts) == 0:
+        print("Error: the history (%d years) is shorter than the plan (%d years)" %
+              (len(years), numyr))
+        exit(1)
+    if workers is None:
+        workers = os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=init_worker) as pool:
+        futures = [pool.submit(solve_window, conffile, years[i],
+                               returns[i:i + numyr], inflation[i:i + numyr],
+                               notdrarothradeposits)
+                   for i in starts]
+        results = [f.result() for f in futures]
+    start = np.array([r[0] for r in results])
+    success = np.array([r[1] for r in results], dtype=bool)
+    spending = np.array([r[2] for r in results])
+    if stats is not None:
+        stats.update(lp_solvers.iteration_stats([r[3] for r in results],
+                                                [r[4] for r in results]))
+    return start, success, spending
+
+
+def print_backtest(start, success, spending):
+    n = len(start)
+    print("\nHistorical Backtest: %d start years (%d-%d), %d solved, %d infeasible\n" %
+          (n, start[0], start[-1], success.sum(), n - success.sum()))
+    if success.sum() == 0:
+        return
+    start = start[success]
+    spending = spending[success]
+    order = np.argsort(spending, kind='stable')
+    for name, i in (("worst", order[0]),
+                    ("median", order[(len(order) - 1) // 2]),
+                    ("best", order[-1])):
+        print("%8s s(0): %10.0f  starting in %d" % (name, spending[i], start[i]))
+    print()
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Backtest an optimized finacial plan for retirement over historical returns and inflation.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes (default: number of cores)")
+    parser.add_argument('-a', '--all', action='store_true',
+                        help="Also list s(0) for every start year")
+    parser.add_argument('-nd', '--notdrarothradeposits', action='store_true',
+                        help="Do not allow deposits to TDRA or ROTHRA accounts beyond explicit contributions")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    parser.add_argument(
+        'history', help='csv file with year, return (percent) and cpi columns')
+    parser.add_argument(
+        'conffile', help='Require configuration input toml file')
+    args = parser.parse_args()
+
+    years, returns, inflation = load_history(args.history)
+    with planner.PlanSession(args.conffile,
+                             notdrarothradeposits=args.notdrarothradeposits) as plan:
+        plan.precheck_consistancy()
+        numyr = plan.S.numyr
+
+    t = time.perf_counter()
+    stats = {}
+    start, success, spending = run_backtest(args.conffile, years, returns,
+                                            inflation, numyr, args.jobs,
+                                            args.notdrarothradeposits, stats)
+    elapsed_time = time.perf_counter() - t
+    if args.all:
+        print()
+        for y, ok, s in zip(start, success, spending):
+            print("%d: %10.0f" % (y, s) if ok else "%d: infeasible" % y)
+    print_backtest(start, success, spending)
+    print("Solver: %d solves, %d warm started, %d iterations (about %d saved by warm starts)" %
+          (stats['solves'], stats['warm'], stats['nit'], stats['saved']))
+    print("Elapsed time: %.2f seconds" % elapsed_time)
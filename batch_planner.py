@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+
+#
+# Run many retirement plans (toml files) across a pool of worker processes
+# and collect a one line summary for each in a single csv file.
+#
+
+import os
+import sys
+import csv
+import time
+import argparse
+import concurrent.futures
+import ARetirementPlanner as planner
+import lp_solvers
+import solution_cache
+
+__version__ = planner.__version__
+
+summary_fields = ['file', 'success', 'message', 'spending',
+                  'withdrawals', 'income', 'taxable', 'tax', 'cg_tax',
+                  'earlytax', 'spendable', 'beginbal', 'endbal',
+                  'solver', 'iterations', 'load_time', 'build_time', 'solve_time', 'total_time']
+
+
+def init_worker():
+    #
+    # Runs once in each worker process, which then stays alive for many
+    # plans so scipy and the planner modules are only imported once per
+    # worker. The planner prints progress and checking messages to stdout
+    # which would only interleave across workers so they are discarded.
+    #
+    import scipy.optimize
+    sys.stdout = open(os.devnull, 'w')
+
+
+def run_plan(conffile, notdrarothradeposits=False, cachedir=None,
+             cachemax=64 * 1024 * 1024, solver='highs'):
+    #
+    # Load, build and solve one plan with the lp_solvers backend solver
+    # and return its summary row as a dict with the keys in
+    # summary_fields. With cachedir solutions are shared through a
+    # solution_cache in that directory.
+    #
+    cache = None
+    if cachedir is not None:
+        cache = solution_cache.solution_cache(cachedir, cachemax)
+    row = dict.fromkeys(summary_fields, '')
+    row['file'] = conffile
+    row['success'] = False
+    row['solver'] = solver
+    start = time.perf_counter()
+    try:
+        with planner.PlanSession(conffile,
+                                 notdrarothradeposits=notdrarothradeposits,
+                                 cache=cache, solver=solver) as plan:
+            t = time.perf_counter()
+            row['load_time'] = t - start
+            if plan.precheck_consistancy():
+                plan.build()
+                row['build_time'] = time.perf_counter() - t
+                t = time.perf_counter()
+                res = plan.solve()
+                row['solve_time'] = time.perf_counter() - t
+                row['success'] = res.success
+                row['message'] = res.message
+                row['iterations'] = res.get('nit', '')
+                if res.success:
+                    row['spending'] = plan.rv.s[0]
+                    for key, v in zip(summary_fields[4:13],
+                                      plan.get_result_totals()):
+                        row[key] = v
+    except SystemExit as e:
+        # the toml loader and the prechecks exit() on bad input
+        row['message'] = 'exit(%s) while loading or checking the plan' % e.code
+    except Exception as e:
+        row['message'] = '%s: %s' % (type(e).__name__, e)
+    row['total_time'] = time.perf_counter() - start
+    return row
+
+
+def plan_files(paths):
+    #
+    # Expand the command line paths: a directory contributes all its
+    # *.toml files, a .toml file is used as is and any other file is a
+    # manifest listing one toml file per line (blank lines and lines
+    # starting with '#' are skipped, relative paths are taken relative
+    # to the manifest).
+    #
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path)
+                            if f.endswith('.toml'))
+        elif path.endswith('.toml'):
+            files.append(path)
+        else:
+            try:
+                with open(path) as manifest:
+                    base = os.path.dirname(path)
+                    for line in manifest:
+                        line = line.strip()
+                        if line != '' and not line.startswith('#'):
+                            files.append(os.path.join(base, line))
+            except IOError as e:
+                print("Error: %s - %s." % (e.filename, e.strerror))
+                exit(1)
+    return files
+
+
+def run_batch(files, summary_file, workers=None, notdrarothradeposits=False,
+              cachedir=None, cachemax=64 * 1024 * 1024, solver='highs'):
+    #
+    # Solve all files using workers processes (default: one per core)
+    # and write the summary rows, in the order of files, to summary_file.
+    # Returns the list of rows.
+    #
+    if workers is None:
+        workers = os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=init_worker) as pool:
+        n = len(files)
+        rows = list(pool.map(run_plan, files, [notdrarothradeposits] * n,
+                             [cachedir] * n, [cachemax] * n, [solver] * n))
+    with open(summary_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=summary_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Create optimized finacial plans for many retirement toml files.')
+    parser.add_argument('-o', '--summary', default='./batch_summary.csv',
+                        help="Write the per plan summary to csv file SUMMARY (default: ./batch_summary.csv)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes (default: number of cores)")
+    parser.add_argument('-nd', '--notdrarothradeposits', action='store_true',
+                        help="Do not allow deposits to TDRA or ROTHRA accounts beyond explicit contributions")
+    parser.add_argument('-sc', '--solutioncache', nargs='?',
+                        const='./.rplan_cache', default=None,
+                        help="Reuse solutions of identical models from cache directory SOLUTIONCACHE (default: ./.rplan_cache)")
+    parser.add_argument('-scmax', '--solutioncachemax', type=float, default=64,
+                        help="Maximum size of the solution cache in MB (default: 64)")
+    parser.add_argument('-s', '--solver', choices=lp_solvers.names, default='highs',
+                        help="LP solver backend (default: highs)")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    parser.add_argument('paths', nargs='+',
+                        help='toml files, directories of toml files or manifest files listing toml files')
+    args = parser.parse_args()
+
+    if not lp_solvers.available(args.solver):
+        print("Error: solver %s is not available here" % args.solver)
+        exit(1)
+
+    files = plan_files(args.paths)
+    if len(files) == 0:
+        print("Error: no toml files found")
+        exit(1)
+
+    t = time.perf_counter()
+    rows = run_batch(files, args.summary, args.jobs,
+                     args.notdrarothradeposits, args.solutioncache,
+                     int(args.solutioncachemax * 1024 * 1024), args.solver)
+    elapsed_time = time.perf_counter() - t
+    failed = [r['file'] for r in rows if not r['success']]
+    print("%d plans, %d failed, in %.2f seconds; summary written to %s" %
+          (len(rows), len(failed), elapsed_time, args.summary))
+    for f in failed:
+        print("failed:", f)
@@ -0,0 +1,380 @@
+#!/usr/bin/python3
+
+#
+# Benchmark the planner's phases over a matrix of synthetic plans: plan
+# horizons, one or two retirees, the combinations of IRA, roth and
+# aftertax accounts, with and without assets to sell. For every plan
+# the wall time and peak memory of each phase is recorded:
+#
+#     process_toml_info     PlanSession() (tomldata.Data.process_toml_info()
+#                           and indexing the variables)
+#     precheck_consistancy
+#     build_model           PlanSession.build()
+#     solve                 PlanSession.solve()
+#     consistancy_check     PlanSession.check()
+#     print_*               each report table, including writing it out
+#
+# and the results are written as json to compare runs before and after
+# a change (see compare()). Each plan is run repeat times for the wall
+# times (the fastest and the median run are kept) and once more under
+# tracemalloc for the peak memory; tracemalloc sees python and numpy
+# allocations, not the solver's own. Everything the planner prints is
+# discarded.
+#
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import tracemalloc
+import contextlib
+import numpy as np
+import scipy
+import ARetirementPlanner as planner
+import lp_solvers
+
+__version__ = planner.__version__
+
+horizons = [10, 20, 40, 60, 80]
+account_types = ['IRA', 'roth', 'aftertax']
+# every non empty combination of account_types
+account_mixes = [list(mix) for n in range(1, len(account_types) + 1)
+                 for mix in itertools.combinations(account_types, n)]
+retiree_keys = ['pat', 'sam']
+
+
+def synthetic_plan(years, retirees=1, accounts=account_types, assets=False):
+    #
+    # The toml dict of a plan over years years for one or two retirees
+    # with the accounts (IRA and roth ones are per retiree) and, with
+    # assets, a home and a rental sold half way through the plan (into
+    # an aftertax account, with a zero balance if accounts has none). The
+    # planner models the years from retirement so the retirees retire
+    # as the plan starts; the first is 65, or younger for the plan to
+    # end by age 104, so every plan reaches RMD ages.
+    #
+    age = min(65, 105 - years)
+    keys = retiree_keys[:retirees]
+    d = {'title': 'benchmark %d years' % years,
+         'retirement_type': 'single' if retirees == 1 else 'joint',
+         'returns': 6, 'inflation': 2.5}
+    iam = {}
+    ss = {}
+    for n, key in enumerate(keys):
+        a = age - 3 * n
+        iam[key] = {'primary': n == 0, 'age': a, 'retire': a,
+                    'through': a + years - 1}
+        ss[key] = {'amount': 20000 - 4000 * n, 'FRA': 67,
+                   'age': '%d-' % max(a, 67)}
+    if retirees == 1:
+        d['iam'] = {k: v for k, v in iam[keys[0]].items() if k != 'primary'}
+        d['SocialSecurity'] = ss[keys[0]]
+    else:
+        d['iam'] = iam
+        d['SocialSecurity'] = ss
+    d['income'] = {'pension': {'amount': 12000, 'age': '%d-' % max(age, 65),
+                               'inflation': True, 'tax': True}}
+    if assets:
+        sell = age + years // 2
+        d['income']['rental'] = {'amount': 9000, 'age': '%d-%d' % (age, sell - 1),
+                                 'inflation': True, 'tax': True}
+        d['asset'] = {'home': {'value': 400000, 'costAndImprovements': 250000,
+                               'ageToSell': sell, 'owedAtAgeToSell': 0,
+                               'primaryResidence': True, 'rate': 3},
+                      'rental': {'value': 200000, 'costAndImprovements': 150000,
+                                 'ageToSell': sell, 'owedAtAgeToSell': 50000,
+                                 'primaryResidence': False, 'rate': 4}}
+    for acctype in ['IRA', 'roth']:
+        if acctype in accounts:
+            bal = 400000 if acctype == 'IRA' else 80000
+            if retirees == 1:
+                d[acctype] = {'bal': bal}
+            else:
+                d[acctype] = {key: {'bal': bal // (n + 1)}
+                              for n, key in enumerate(keys)}
+    if 'aftertax' in accounts:
+        d['aftertax'] = {'bal': 150000, 'basis': 90000}
+    elif assets:
+        d['aftertax'] = {'bal': 0, 'basis': 0}
+    return d
+
+
+def plan_name(years, retirees, accounts, assets):
+    return 'y%d-r%d-%s%s' % (years, retirees, '+'.join(accounts),
+                             '-assets' if assets else '')
+
+
+def plan_matrix(years=horizons, retirees=(1, 2), mixes=account_mixes,
+                assets=(False, True)):
+    # (name, description, toml dict) of every combination
+    plans = []
+    for y, r, mix, a in itertools.product(years, retirees, mixes, assets):
+        plans.append((plan_name(y, r, mix, a),
+                      {'years': y, 'retirees': r, 'accounts': mix, 'assets': a},
+                      synthetic_plan(y, r, mix, a)))
+    return plans
+
+
+class phase_recorder:
+    """ Times the phases of one plan run, with trace also their peak memory
+
+        with recorder.phase('solve'): ... records the wall time (and
+        peak bytes above what was allocated when the phase started)
+        under 'solve' in recorder.wall (recorder.peak).
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.wall = {}
+        self.peak = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.trace:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall[name] = time.perf_counter() - start
+            if self.trace:
+                self.peak[name] = tracemalloc.get_traced_memory()[1] - start_mem
+
+
+def run_once(toml_dict, recorder, solver='highs'):
+    #
+    # One pass of the planner over toml_dict recording its phases.
+    # Returns the session's model size and the solve's success.
+    #
+    info = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with recorder.phase('process_toml_info'):
+            plan = planner.PlanSession(toml_dict, solver=solver)
+        with plan:
+            with recorder.phase('precheck_consistancy'):
+                plan.precheck_consistancy()
+            with recorder.phase('build_model'):
+                plan.build()
+            with recorder.phase('solve'):
+                res = plan.solve()
+            info = {'vars': len(plan.c), 'rows': len(plan.b),
+                    'eq_rows': len(plan.b_eq),
+                    'nonzeros': int(plan.A.nnz + plan.A_eq.nnz),
+                    'success': bool(res.success), 'iterations': int(res.get('nit', 0))}
+            if res.success:
+                with recorder.phase('consistancy_check'):
+                    plan.check()
+                with recorder.phase('print_model'):
+                    plan.print_model()
+                for name, table in plan.tables(True, True, True, True):
+                    with recorder.phase(table.__name__):
+                        table()
+                        plan.ao.flush()
+    return info
+
+
+def run_plan(toml_dict, repeat=3, solver='highs', memory=True):
+    #
+    # Benchmark one plan: repeat timed runs and, with memory, one traced
+    # run. Returns the model size and, per phase, the fastest and median
+    # wall time in seconds and the peak memory in bytes (None without
+    # memory).
+    #
+    runs = []
+    for i in range(repeat):
+        recorder = phase_recorder()
+        info = run_once(toml_dict, recorder, solver)
+        runs.append(recorder.wall)
+    recorder = phase_recorder(trace=True)
+    if memory:
+        tracemalloc.start()
+        try:
+            run_once(toml_dict, recorder, solver)
+        finally:
+            tracemalloc.stop()
+    phases = {}
+    for name in runs[0]:
+        wall = [r[name] for r in runs]
+        phases[name] = {'wall_s': min(wall), 'wall_s_median': float(np.median(wall)),
+                        'peak_bytes': recorder.peak.get(name)}
+    info['phases'] = phases
+    return info
+
+
+def run_matrix(plans, repeat=3, solver='highs', memory=True, progress=None):
+    # the benchmark json (a dict) for plans (see plan_matrix())
+    results = {'version': __version__, 'python': platform.python_version(),
+               'numpy': np.__version__, 'scipy': scipy.__version__,
+               'platform': platform.platform(), 'solver': solver,
+               'repeat': repeat, 'memory': memory, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'plans': []}
+    for name, description, toml_dict in plans:
+        if progress is not None:
+            progress(name)
+        result = {'name': name}
+        result.update(description)
+        try:
+            result.update(run_plan(toml_dict, repeat, solver, memory))
+        except SystemExit as e:
+            # the toml loader and the prechecks exit() on bad input
+            result.update({'success': False, 'phases': {},
+                           'message': 'exit(%s) while loading or checking the plan' % e.code})
+        results['plans'].append(result)
+    return results
+
+
+def phase_totals(results):
+    #
+    # per phase the wall time summed over the plans and the largest peak
+    # memory (None if it was not measured)
+    #
+    totals = {}
+    for p in results['plans']:
+        for name, v in p['phases'].items():
+            t = totals.setdefault(name, {'wall_s': 0.0, 'peak_bytes': None})
+            t['wall_s'] += v['wall_s']
+            if v['peak_bytes'] is not None:
+                t['peak_bytes'] = max(t['peak_bytes'] or 0, v['peak_bytes'])
+    return totals
+
+
+def kb(peak):
+    return '-' if peak is None else '%.0f' % (peak / 1024)
+
+
+def compare(base, results, threshold=1.25, noise=0.01):
+    #
+    # Print the phase totals of results against those of base over the
+    # plans both ran and return the phases whose total wall time grew
+    # by more than threshold times and noise seconds, or whose peak
+    # memory (where both measured it) grew by more than threshold times.
+    #
+    names = set(p['name'] for p in base['plans']) & \
+        set(p['name'] for p in results['plans'])
+    old = phase_totals({'plans': [p for p in base['plans'] if p['name'] in names]})
+    new = phase_totals({'plans': [p for p in results['plans'] if p['name'] in names]})
+    print("\nCompared over %d plans with %s (version %s)\n" %
+          (len(names), base.get('date', '?'), base.get('version', '?')))
+    print("%-30s%10s%10s%8s%12s%12s%8s" % ("phase", "base s", "s", "ratio",
+                                            "base KB", "KB", "ratio"))
+    regressed = []
+    for name in new:
+        if name not in old:
+            continue
+        o, n = old[name], new[name]
+        t_ratio = n['wall_s'] / o['wall_s'] if o['wall_s'] > 0 else 1.0
+        m_ratio = None
+        if o['peak_bytes'] and n['peak_bytes'] is not None:
+            m_ratio = n['peak_bytes'] / o['peak_bytes']
+        flag = ''
+        if (t_ratio > threshold and n['wall_s'] - o['wall_s'] > noise) or \
+                (m_ratio is not None and m_ratio > threshold):
+            regressed.append(name)
+            flag = ' <<'
+        print("%-30s%10.3f%10.3f%8.2f%12s%12s%8s%s" %
+              (name, o['wall_s'], n['wall_s'], t_ratio, kb(o['peak_bytes']),
+               kb(n['peak_bytes']), '-' if m_ratio is None else '%.2f' % m_ratio, flag))
+    print()
+    return regressed
+
+
+def print_summary(results):
+    # wall ms of the main phases of each plan, then the phase totals
+    print("\n%-34s%6s%6s%4s%9s%9s%9s%9s" % ("plan", "vars", "rows", "ok", "build",
+                                            "solve", "reports", "total"))
+    for p in results['plans']:
+        ms = {name: v['wall_s'] * 1000 for name, v in p['phases'].items()}
+        if len(ms) == 0:
+            print("%-34s %s" % (p['name'], p.get('message', '')))
+            continue
+        reports = sum(v for name, v in ms.items() if name.startswith('print_'))
+        print("%-34s%6d%6d%4s%9.1f%9.1f%9.1f%9.1f" %
+              (p['name'], p['vars'], p['rows'] + p['eq_rows'],
+               'yes' if p['success'] else 'no', ms['build_model'], ms['solve'],
+               reports, sum(ms.values())))
+    print("\n%-30s%12s%12s" % ("phase", "total s", "max KB"))
+    for name, t in phase_totals(results).items():
+        print("%-30s%12.3f%12s" % (name, t['wall_s'], kb(t['peak_bytes'])))
+    print()
+
+
+def int_list(text):
+    return [int(v) for v in text.split(',')]
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the phases of the retirement planner over a matrix of synthetic plans.')
+    parser.add_argument('-o', '--output', default='./benchmark.json',
+                        help="Write the results as json to file OUTPUT (default: ./benchmark.json)")
+    parser.add_argument('-y', '--years', type=int_list, default=horizons,
+                        help="Comma separated plan horizons in years (default: %s)" %
+                        ','.join('%d' % y for y in horizons))
+    parser.add_argument('-r', '--retirees', type=int_list, default=[1, 2],
+                        help="Comma separated numbers of retirees, 1 and/or 2 (default: 1,2)")
+    parser.add_argument('-a', '--accounts', action='append', default=None,
+                        help="An account mix such as IRA+roth, may be repeated (default: every mix of %s)" %
+                        ', '.join(account_types))
+    parser.add_argument('-na', '--noassets', action='store_true',
+                        help="Only run plans without assets")
+    parser.add_argument('-n', '--repeat', type=int, default=3,
+                        help="Timed runs of each plan (default: 3)")
+    parser.add_argument('-nm', '--nomemory', action='store_true',
+                        help="Skip the tracemalloc run that measures peak memory (it is much slower than the timed runs)")
+    parser.add_argument('-s', '--solver', choices=lp_solvers.names, default='highs',
+                        help="LP solver backend (default: highs)")
+    parser.add_argument('-c', '--compare', default=None,
+                        help="Compare with the results in json file COMPARE and exit with 1 on a regression")
+    parser.add_argument('-t', '--threshold', type=float, default=1.25,
+                        help="With -c, the ratio of wall time or peak memory counted as a regression (default: 1.25)")
+    parser.add_argument('-tn', '--noise', type=float, default=0.01,
+                        help="With -c, seconds a phase's total wall time must also grow by to count as a regression (default: 0.01)")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    args = parser.parse_args()
+
+    mixes = account_mixes
+    if args.accounts is not None:
+        mixes = [mix.split('+') for mix in args.accounts]
+        for mix in mixes:
+            if len(mix) == 0 or any(a not in account_types for a in mix):
+                print("Error: account mix %s is not made of %s" %
+                      ('+'.join(mix), ', '.join(account_types)))
+                exit(1)
+    if any(r not in (1, 2) for r in args.retirees):
+        print("Error: plans have 1 or 2 retirees")
+        exit(1)
+    if any(y < 6 or y > 80 for y in args.years):
+        print("Error: plan horizons are from 6 to 80 years")
+        exit(1)
+    if args.repeat < 1:
+        print("Error: repeat must be at least 1")
+        exit(1)
+    if not lp_solvers.available(args.solver):
+        print("Error: solver %s is not available here" % args.solver)
+        exit(1)
+    base = None
+    if args.compare is not None:
+        try:
+            with open(args.compare) as f:
+                base = json.load(f)
+        except (IOError, ValueError) as e:
+            print("Error: can not read %s - %s." % (args.compare, e))
+            exit(1)
+
+    plans = plan_matrix(args.years, args.retirees, mixes,
+                        (False,) if args.noassets else (False, True))
+    results = run_matrix(plans, args.repeat, args.solver, not args.nomemory,
+                         progress=lambda name: print(name, file=sys.stderr))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print_summary(results)
+    print("Results written to %s" % args.output)
+    if base is not None and len(compare(base, results, args.threshold, args.noise)) > 0:
+        exit(1)
@@ -1,4 +1,78 @@
 
+import scipy.sparse
+import modelio
+
+
+class constraint_rows:
+    """ accumulates constraint rows as (row, col, value) triplets
+
+        Rows are added as {column: value} dictionaries (A += [row]) so
+        only the nonzero entries of each constraint are ever stored.
+        name() labels the last row added, for the exported model (see
+        lp_constraint_model.export_model()).
+    """
+
+    def __init__(self, nvars):
+        self.nvars = nvars
+        self.nrows = 0
+        self.rows = []
+        self.cols = []
+        self.vals = []
+        self.names = []
+
+    def __len__(self):
+        return self.nrows
+
+    def __iadd__(self, newrows):
+        for row in newrows:
+            for col, val in row.items():
+                self.rows.append(self.nrows)
+                self.cols.append(col)
+                self.vals.append(val)
+            self.nrows += 1
+            self.names.append(None)
+        return self
+
+    def name(self, name):
+        self.names[-1] = name
+
+    def csr(self):
+        A = scipy.sparse.csr_matrix((self.vals, (self.rows, self.cols)),
+                                    shape=(self.nrows, self.nvars))
+        A.eliminate_zeros()
+        A.sort_indices()
+        return A
+
+    def dense(self):
+        A = [[0] * self.nvars for i in range(self.nrows)]
+        for i in range(len(self.vals)):
+            A[self.rows[i]][self.cols[i]] = self.vals[i]
+        return A
+
+
+def lower_bound(bounds, index, value):
+    lo, hi = bounds[index]
+    if value > lo:
+        lo = value
+    bounds[index] = (lo, hi)
+
+
+def upper_bound(bounds, index, value):
+    lo, hi = bounds[index]
+    if hi is None or value < hi:
+        hi = value
+    bounds[index] = (lo, hi)
+
+
+def note_index(notes, text):
+    # the first row of the constraints that notes labels text
+    for n in notes:
+        if n['note'] == text:
+            return n['index']
+    print("Error: model has no '%s' constraints" % text)
+    exit(1)
+
+
 class lp_constraint_model:
     def __init__(self, S, vindx, taxtable, capgainstable, penalty, stded, SS_taxable, verbose, no_TDRA_ROTHRA_DEPOSITS):
         self.S = S
@@ -10,12 +84,27 @@ class lp_constraint_model:
         self.ss_taxable = SS_taxable
         self.verbose = verbose
         self.noTdraRothraDeposits = no_TDRA_ROTHRA_DEPOSITS
+        # the row names of A_ub and A_eq, set by build_model()
+        self.row_names = None
+        self.eq_row_names = None
 
     # Build model for:
     # Minimize: c^T * x
     # Subject to: A_ub * x <= b_ub
+    #             A_eq * x == b_eq
+    #             bounds[i][0] <= x[i] <= bounds[i][1]
     # all vars positiveA
-    def build_model(self):
+    #
+    # Single variable constraints (4', 5', 8', 9', N', 12', 16') are
+    # expressed as variable bounds rather than rows of A_ub or A_eq.
+    #
+    # Notes index into A_ub unless marked with "eq": True in which case
+    # they index into A_eq.
+    #
+    # Rows are collected as sparse (row, col, value) triplets. With
+    # sparse=True A is returned as a scipy.sparse CSR matrix otherwise
+    # it is expanded to the traditional list of dense rows.
+    def build_model(self, sparse=False):
 
         # TODO integrate the following assignments into the code and remove them
         S = self.S
@@ -23,51 +112,32 @@ class lp_constraint_model:
         taxtable = self.taxtable
         capgainstable = self.cgtaxtable
         penalty = self.penalty
-        stded = self.stded
-        SS_taxable = self.ss_taxable
 
         nvars = vindx.vsize
-        A = []
-        b = []
-        c = [0] * nvars
+        A = constraint_rows(nvars)
+        A_eq = constraint_rows(nvars)
         notes = []
 
         #
-        # Add objective function (S1') becomes (R1') if PlusEstate is added
-        #
-        for year in range(S.numyr):
-            c[vindx.s(year)] = -1
-        #
-        # Add objective function tax bracket forcing function (EXPERIMENTAL)
-        #
-        for year in range(S.numyr):
-            for k in range(len(taxtable)):
-                # multiplies the impact of higher brackets opposite to optimization
-                # the intent here is to pressure higher brackets more and pack the
-                # lower brackets
-                c[vindx.x(year, k)] = k / 10
-        #
-        # Adder objective function (R1') when PlusEstate is added
+        # Add objective function (S1') or (R1'), see build_objective()
         #
         if S.maximize == "PlusEstate":
-            for j in range(len(S.accounttable)):
-                # account discount rate
-                c[vindx.b(S.numyr, j)] = -1 * S.accounttable[j]['estateTax']
             print("\nConstructing Spending + Estate Model:\n")
         else:
             print("\nConstructing Spending Model:\n")
-            balancer = 0.001
-            for j in range(len(S.accounttable)):
-                # balance and discount rate
-                c[vindx.b(S.numyr, j)] = -1 * balancer * \
-                    S.accounttable[j]['estateTax']
+        c = self.build_objective()
+        #
+        # Right hand sides of all the rows below and the bounds (4', 5',
+        # 8', 9', N', 12', 16'), see build_rhs()
+        #
+        b, b_eq, bounds = self.build_rhs()
 
         #
         # Add constraint (2')
         #
         notes += [{"index": len(A), "note": "Constraints 2':"}]
         for year in range(S.numyr):
-            row = [0] * nvars
+            row = {}
             for j in range(len(S.accounttable)):
                 p = 1
                 if S.accounttable[j]['acctype'] != 'aftertax':
@@ -84,128 +154,47 @@ class lp_constraint_model:
                     row[vindx.D(year, j)] = 1
             row[vindx.s(year)] = 1
             A += [row]
-            b += [S.income[year] + S.SS[year] - S.expenses[year]]
+            A.name("c2_y%d" % year)
         #
-        # Add constraint (3a')
+        # Add constraint (3a') and (3b') as a single equality
         #
         #"""
-        notes += [{"index": len(A), "note": "Constraints 3a':"}]
+        notes += [{"index": len(A_eq), "note": "Constraints 3a'/3b':", "eq": True}]
         for year in range(S.numyr - 1):
-            row = [0] * nvars
+            row = {}
             row[vindx.s(year + 1)] = 1
-            row[vindx.s(year)] = -1 * S.i_rate
-            A += [row]
-            b += [0]
-        #"""
-        #
-        # Add constraint (3b')
-        #
-        #"""
-        notes += [{"index": len(A), "note": "Constraints 3b':"}]
-        for year in range(S.numyr - 1):
-            row = [0] * nvars
-            row[vindx.s(year)] = S.i_rate
-            row[vindx.s(year + 1)] = -1
-            A += [row]
-            b += [0]
-        #"""
-        #
-        # Add constrant (4') rows - not needed if [desired.income] is not defined in input
-        #
+            row[vindx.s(year)] = -1 * S.i_rates[year]
+            A_eq += [row]
+            A_eq.name("c3a_y%d" % year)
         #"""
-        notes += [{"index": len(A), "note": "Constraints 4':"}]
-        if S.min != 0:
-            for year in range(1):  # Only needs setting at the beginning
-                row = [0] * nvars
-                row[vindx.s(year)] = -1
-                A += [row]
-                b += [- S.min]     # [- d_i]
-
-        #
-        # Add constraints for (5') rows - not added if [max.income] is not defined in input
-        #
-        notes += [{"index": len(A), "note": "Constraints 5':"}]
-        if S.max != 0:
-            for year in range(1):  # Only needs to be set at the beginning
-                row = [0] * nvars
-                row[vindx.s(year)] = 1
-                A += [row]
-                b += [S.max]     # [ dm_i]
-
         #
         # Add constaints for (6') rows
         #
         #"""
         notes += [{"index": len(A), "note": "Constraints 6':"}]
         for year in range(S.numyr):
-            row = [0] * nvars
+            row = {}
             for j in range(len(S.accounttable)):
                 if S.accounttable[j]['acctype'] != 'aftertax':
                     row[vindx.D(year, j)] = 1
             A += [row]
-            # b+=[min(S.income[year],S.maxContribution(year,None))]
-            # using S.taxed rather than S.income because income could
-            # include non-taxed anueities that don't count.
-            b += [min(S.taxed[year], S.maxContribution(year, None))]
+            A.name("c6_y%d" % year)
         #
         # Add constaints for (7') rows
         #
         #"""
         notes += [{"index": len(A), "note": "Constraints 7':"}]
         for year in range(S.numyr):  # TODO this is not needed when there is only one retiree
-            for v in S.retiree:
-                row = [0] * nvars
+            for r, v in enumerate(S.retiree):
+                row = {}
                 for j in range(len(S.accounttable)):
                     # ['acctype'] != 'aftertax': no 'mykey' in aftertax (this will either break or just not match - we will see)
                     if v['mykey'] == S.accounttable[j]['mykey']:
                         row[vindx.D(year, j)] = 1
                 A += [row]
-                b += [S.maxContribution(year, v['mykey'])]
+                A.name("c7_y%d_r%d" % (year, r))
         #"""
         #
-        # Add constaints for (8') rows
-        #
-        notes += [{"index": len(A), "note": "Constraints 8':"}]
-        for year in range(S.numyr):
-            for j in range(len(S.accounttable)):
-                v = S.accounttable[j].get('contributions', None)
-                if v is not None:
-                    if v[year] > 0:
-                        row = [0] * nvars
-                        row[vindx.D(year, j)] = -1
-                        A += [row]
-                        b += [-1 * v[year]]
-        #
-        # Add constaints for (9') rows
-        #
-        notes += [{"index": len(A), "note": "Constraints 9':"}]
-        for year in range(S.numyr):
-            # at most the first two accounts are type IRA w/ RMD requirement
-            for j in range(min(2, len(S.accounttable))):
-                if S.accounttable[j]['acctype'] == 'IRA':
-                    ownerage = S.account_owner_age(year, S.accounttable[j])
-                    if ownerage >= 70:
-                        row = [0] * nvars
-                        row[vindx.D(year, j)] = 1
-                        A += [row]
-                        b += [0]
-        #
-        # Add constaints for (N') rows
-        #
-        notes += [{"index": len(A), "note": "Constraints N':"}]
-        if self.noTdraRothraDeposits:
-            for year in range(S.numyr):
-                for j in range(len(S.accounttable)):
-                    v = S.accounttable[j].get('contributions', None)
-                    max = 0
-                    if v is not None:
-                        max = v[year]
-                    if S.accounttable[j]['acctype'] != 'aftertax':
-                        row = [0] * nvars
-                        row[vindx.D(year, j)] = 1
-                        A += [row]
-                        b += [max]
-        #
         # Add constaints for (10') rows
         #
         notes += [{"index": len(A), "note": "Constraints 10':"}]
@@ -215,19 +204,18 @@ class lp_constraint_model:
                 if S.accounttable[j]['acctype'] == 'IRA':
                     rmd = S.rmd_needed(year, S.accounttable[j]['mykey'])
                     if rmd > 0:
-                        row = [0] * nvars
+                        row = {}
                         row[vindx.b(year, j)] = 1 / rmd
                         row[vindx.w(year, j)] = -1
                         A += [row]
-                        b += [0]
+                        A.name("c10_y%d_j%d" % (year, j))
 
         #
         # Add constraints for (11')
         #
         notes += [{"index": len(A), "note": "Constraints 11':"}]
         for year in range(S.numyr):
-            adj_inf = S.i_rate**(S.preplanyears + year)
-            row = [0] * nvars
+            row = {}
             # IRA can only be in the first two accounts
             for j in range(min(2, len(S.accounttable))):
                 if S.accounttable[j]['acctype'] == 'IRA':
@@ -236,18 +224,7 @@ class lp_constraint_model:
             for k in range(len(taxtable)):
                 row[vindx.x(year, k)] = -1
             A += [row]
-            b += [stded * adj_inf - S.taxed[year] - SS_taxable * S.SS[year]]
-        #
-        # Add constraints for (12')
-        #
-        notes += [{"index": len(A), "note": "Constraints 12':"}]
-        for year in range(S.numyr):
-            for k in range(len(taxtable) - 1):
-                row = [0] * nvars
-                row[vindx.x(year, k)] = 1
-                A += [row]
-                # inflation adjusted
-                b += [(taxtable[k][1]) * (S.i_rate**(S.preplanyears + year))]
+            A.name("c11_y%d" % year)
         #
         # Add constraints for (13a')
         #
@@ -255,7 +232,7 @@ class lp_constraint_model:
         if S.accmap['aftertax'] > 0:
             for year in range(S.numyr):
                 f = self.cg_taxable_fraction(year)
-                row = [0] * nvars
+                row = {}
                 for l in range(len(capgainstable)):
                     row[vindx.y(year, l)] = 1
                 # Awful Hack! If year of asset sale, assume w(i,j)-D(i,j) is
@@ -266,8 +243,7 @@ class lp_constraint_model:
                     row[vindx.w(year, j)] = -1 * f
                     row[vindx.D(year, j)] = f
                 A += [row]
-                # b+=[0]
-                b += [S.cg_asset_taxed[year]]
+                A.name("c13a_y%d" % year)
         #
         # Add constraints for (13b')
         #
@@ -275,7 +251,7 @@ class lp_constraint_model:
         if S.accmap['aftertax'] > 0:
             for year in range(S.numyr):
                 f = self.cg_taxable_fraction(year)
-                row = [0] * nvars
+                row = {}
                 # Awful Hack! If year of asset sale, assume w(i,j)-D(i,j) is
                 # negative so taxable from this is zero
                 if S.cg_asset_taxed[year] <= 0:  # i.e., no sale
@@ -286,94 +262,259 @@ class lp_constraint_model:
                 for l in range(len(capgainstable)):
                     row[vindx.y(year, l)] = -1
                 A += [row]
-                # b+=[0]
-                b += [-S.cg_asset_taxed[year]]
+                A.name("c13b_y%d" % year)
         #
         # Add constraints for (14')
         #
         notes += [{"index": len(A), "note": "Constraints 14':"}]
         if S.accmap['aftertax'] > 0:
             for year in range(S.numyr):
-                adj_inf = S.i_rate**(S.preplanyears + year)
                 for l in range(len(capgainstable) - 1):
-                    row = [0] * nvars
+                    row = {}
                     row[vindx.y(year, l)] = 1
                     for k in range(len(taxtable) - 1):
                         if taxtable[k][0] >= capgainstable[l][0] and taxtable[k][0] < capgainstable[l + 1][0]:
                             row[vindx.x(year, k)] = 1
                     A += [row]
-                    # mcg[i,l] inflation adjusted
-                    b += [capgainstable[l][1] * adj_inf]
-                    #print_constraint( row, capgainstable[l][1]*adj_inf)
+                    A.name("c14_y%d_l%d" % (year, l))
         #
-        # Add constraints for (15a')
+        # Add constraints for (15a') and (15b') as a single equality
         #
-        notes += [{"index": len(A), "note": "Constraints 15a':"}]
+        notes += [{"index": len(A_eq), "note": "Constraints 15a'/15b':", "eq": True}]
         for year in range(S.numyr):
             for j in range(len(S.accounttable)):  # for all accounts
                 # j = len(S.accounttable)-1 # nl the last account, the investment account
-                row = [0] * nvars
+                row = {}
                 row[vindx.b(year + 1, j)] = 1  # b[i,j] supports an extra year
-                row[vindx.b(year, j)] = -1 * S.accounttable[j]['rate']
-                row[vindx.w(year, j)] = S.accounttable[j]['rate']
-                row[vindx.D(year, j)] = -1 * S.accounttable[j]['rate']
-                A += [row]
-                # In the event of a sell of an asset for the year
-                temp = [0]
-                if S.accounttable[j]['acctype'] == 'aftertax':
-                    temp = [S.asset_sale[year] *
-                            S.accounttable[j]['rate']]  # TODO test
-                b += temp
-                #print('temp_a: ', temp, 'rate', S.accounttable[j]['rate'] , 'asset sell price: ', S.asset_sale[year]  )
+                rate = S.accounttable[j]['rates'][year]
+                row[vindx.b(year, j)] = -1 * rate
+                row[vindx.w(year, j)] = rate
+                row[vindx.D(year, j)] = -1 * rate
+                A_eq += [row]
+                A_eq.name("c15a_y%d_j%d" % (year, j))
+        notes += [{"index": len(A_eq), "note": "End of equality constraints", "eq": True}]
+        #
+        # Constrant for (17') is the default (0, None) bound so no code is needed
+        #
+        notes += [{"index": len(A), "note": "Constraints 17':"}]
+        assert len(b) == len(A) and len(b_eq) == len(A_eq)
+        self.row_names = A.names
+        self.eq_row_names = A_eq.names
+        if self.verbose:
+            print("Num vars: ", len(c))
+            print("Num contraints: ", len(b))
+            print("Num equality contraints: ", len(b_eq))
+            print("Num bounded vars: ", sum(1 for v in bounds if v != (0, None)))
+            print()
+
+        if sparse:
+            return c, A.csr(), b, A_eq.csr(), b_eq, bounds, notes
+        return c, A.dense(), b, A_eq.dense(), b_eq, bounds, notes
+
+    #
+    # build_objective() and build_rhs() compute the parts of the model
+    # that change with amounts in the toml file: c, b, b_eq and bounds.
+    # With self.S set to the Data for an edited toml file (expenses,
+    # income, social security, asset sale prices, opening balances,
+    # contributions, desired min/max spending) they return the new c,
+    # b, b_eq and bounds for the A and A_eq already built by
+    # build_model() so a sweep over such amounts costs no matrix
+    # construction. Both use the tax tables the model was built with.
+    # The matrices themselves depend on the filing status (the tax and
+    # cap gains brackets and standard deduction), the ages, the
+    # accounts, the returns and inflation, the aftertax basis and
+    # balance (13a'/13b' cap gains fractions) and on which years have
+    # an asset sale; a change to any of these needs a new build_model().
+    #
+    def matrix_inputs(self, S=None):
+        # the Data fields A and A_eq are built from, comparable with ==
+        if S is None:
+            S = self.S
+        accounts = [(v['acctype'], v['mykey'], list(v['rates']),
+                     v.get('basis'), v['bal'] if v['acctype'] == 'aftertax' else None,
+                     list(v['growth']) if v['acctype'] == 'aftertax' else None)
+                    for v in S.accounttable]
+        sale_years = [year for year in range(S.numyr) if S.cg_asset_taxed[year] > 0]
+        return (S.retirement_type, S.numyr, list(S.i_rates), S.retiree,
+                accounts, sale_years)
+
+    def tax_inputs(self):
+        # the tax tables and standard deduction the model was built with
+        return (self.taxtable, self.cgtaxtable, self.stded)
+
+    def build_objective(self):
+        S = self.S
+        vindx = self.var_index
+        taxtable = self.taxtable
+
+        c = [0] * vindx.vsize
+        #
+        # Add objective function (S1') becomes (R1') if PlusEstate is added
+        #
+        for year in range(S.numyr):
+            c[vindx.s(year)] = -1
+        #
+        # Add objective function tax bracket forcing function (EXPERIMENTAL)
+        #
+        for year in range(S.numyr):
+            for k in range(len(taxtable)):
+                # multiplies the impact of higher brackets opposite to optimization
+                # the intent here is to pressure higher brackets more and pack the
+                # lower brackets
+                c[vindx.x(year, k)] = k / 10
+        #
+        # Adder objective function (R1') when PlusEstate is added
+        #
+        if S.maximize == "PlusEstate":
+            for j in range(len(S.accounttable)):
+                # account discount rate
+                c[vindx.b(S.numyr, j)] = -1 * S.accounttable[j]['estateTax']
+        else:
+            balancer = 0.001
+            for j in range(len(S.accounttable)):
+                # balance and discount rate
+                c[vindx.b(S.numyr, j)] = -1 * balancer * \
+                    S.accounttable[j]['estateTax']
+        return c
+
+    def build_rhs(self):
+        # returns b, b_eq and bounds, the rows in build_model() order
+        S = self.S
+        vindx = self.var_index
+        taxtable = self.taxtable
+        capgainstable = self.cgtaxtable
+        stded = self.stded
+        SS_taxable = self.ss_taxable
+
+        b = []
+        b_eq = []
+        bounds = [(0, None)] * vindx.vsize
+        #
+        # (2')
+        #
+        for year in range(S.numyr):
+            b += [S.income[year] + S.SS[year] - S.expenses[year]]
+        #
+        # (3a') and (3b')
+        #
+        b_eq += [0] * (S.numyr - 1)
+        #
+        # Add constrant (4') bounds - not needed if [desired.income] is not defined in input
+        #
+        if S.min != 0:
+            for year in range(1):  # Only needs setting at the beginning
+                lower_bound(bounds, vindx.s(year), S.min)     # [d_i]
+        #
+        # Add constraints for (5') bounds - not added if [max.income] is not defined in input
+        #
+        if S.max != 0:
+            for year in range(1):  # Only needs to be set at the beginning
+                upper_bound(bounds, vindx.s(year), S.max)     # [dm_i]
+        #
+        # (6')
+        #
+        for year in range(S.numyr):
+            # b+=[min(S.income[year],S.maxContribution(year,None))]
+            # using S.taxed rather than S.income because income could
+            # include non-taxed anueities that don't count.
+            b += [min(S.taxed[year], S.maxContribution(year, None))]
+        #
+        # (7')
+        #
+        for year in range(S.numyr):
+            for v in S.retiree:
+                b += [S.maxContribution(year, v['mykey'])]
+        #
+        # Add constaints for (8') bounds
+        #
+        for year in range(S.numyr):
+            for j in range(len(S.accounttable)):
+                v = S.accounttable[j].get('contributions', None)
+                if v is not None:
+                    if v[year] > 0:
+                        lower_bound(bounds, vindx.D(year, j), v[year])
+        #
+        # Add constaints for (9') bounds
+        #
+        for year in range(S.numyr):
+            # at most the first two accounts are type IRA w/ RMD requirement
+            for j in range(min(2, len(S.accounttable))):
+                if S.accounttable[j]['acctype'] == 'IRA':
+                    ownerage = S.account_owner_age(year, S.accounttable[j])
+                    if ownerage >= 70:
+                        upper_bound(bounds, vindx.D(year, j), 0)
+        #
+        # Add constaints for (N') bounds
+        #
+        if self.noTdraRothraDeposits:
+            for year in range(S.numyr):
+                for j in range(len(S.accounttable)):
+                    v = S.accounttable[j].get('contributions', None)
+                    max = 0
+                    if v is not None:
+                        max = v[year]
+                    if S.accounttable[j]['acctype'] != 'aftertax':
+                        upper_bound(bounds, vindx.D(year, j), max)
+        #
+        # (10')
+        #
+        for year in range(S.numyr):
+            for j in range(min(2, len(S.accounttable))):
+                if S.accounttable[j]['acctype'] == 'IRA':
+                    if S.rmd_needed(year, S.accounttable[j]['mykey']) > 0:
+                        b += [0]
+        #
+        # (11')
+        #
+        for year in range(S.numyr):
+            adj_inf = S.i_mul[year]
+            b += [stded * adj_inf - S.taxed[year] - SS_taxable * S.SS[year]]
+        #
+        # Add constraints for (12') bounds
+        #
+        for year in range(S.numyr):
+            for k in range(len(taxtable) - 1):
+                # inflation adjusted
+                upper_bound(bounds, vindx.x(year, k),
+                            (taxtable[k][1]) * S.i_mul[year])
+        #
+        # (13a') and (13b')
+        #
+        if S.accmap['aftertax'] > 0:
+            for year in range(S.numyr):
+                # b+=[0]
+                b += [S.cg_asset_taxed[year]]
+            for year in range(S.numyr):
+                # b+=[0]
+                b += [-S.cg_asset_taxed[year]]
+        #
+        # (14')
+        #
+        if S.accmap['aftertax'] > 0:
+            for year in range(S.numyr):
+                adj_inf = S.i_mul[year]
+                for l in range(len(capgainstable) - 1):
+                    # mcg[i,l] inflation adjusted
+                    b += [capgainstable[l][1] * adj_inf]
         #
-        # Add constraints for (15b')
+        # (15a') and (15b')
         #
-        notes += [{"index": len(A), "note": "Constraints 15b':"}]
         for year in range(S.numyr):
             for j in range(len(S.accounttable)):  # for all accounts
-                # j = len(S.accounttable)-1 # nl the last account, the investment account
-                row = [0] * nvars
-                row[vindx.b(year, j)] = S.accounttable[j]['rate']
-                row[vindx.w(year, j)] = -1 * S.accounttable[j]['rate']
-                row[vindx.D(year, j)] = S.accounttable[j]['rate']
-                row[vindx.b(year + 1, j)] = -1  # b[i,j] supports an extra year
-                A += [row]
+                # In the event of a sell of an asset for the year
                 temp = [0]
                 if S.accounttable[j]['acctype'] == 'aftertax':
-                    temp = [-1 * S.asset_sale[year] *
-                            S.accounttable[j]['rate']]  # TODO test
-                b += temp
-                #print('temp_b: ', temp, 'rate', S.accounttable[j]['rate'] , 'asset sell price: ', S.asset_sale[year]  )
-        #
-        # Constraint for (16a')
-        #   Set the begining b[1,j] balances
+                    rate = S.accounttable[j]['rates'][year]
+                    temp = [S.asset_sale[year] * rate]  # TODO test
+                b_eq += temp
         #
-        notes += [{"index": len(A), "note": "Constraints 16a':"}]
-        for j in range(len(S.accounttable)):
-            row = [0] * nvars
-            row[vindx.b(0, j)] = 1
-            A += [row]
-            b += [S.accounttable[j]['bal']]
-        #
-        # Constraint for (16b')
+        # Constraint for (16a') and (16b') as fixed bounds
         #   Set the begining b[1,j] balances
         #
-        notes += [{"index": len(A), "note": "Constraints 16b':"}]
         for j in range(len(S.accounttable)):
-            row = [0] * nvars
-            row[vindx.b(0, j)] = -1
-            A += [row]
-            b += [-1 * S.accounttable[j]['bal']]
-        #
-        # Constrant for (17') is default for sycpy so no code is needed
-        #
-        notes += [{"index": len(A), "note": "Constraints 17':"}]
-        if self.verbose:
-            print("Num vars: ", len(c))
-            print("Num contraints: ", len(b))
-            print()
-
-        return c, A, b, notes
+            lower_bound(bounds, vindx.b(0, j), S.accounttable[j]['bal'])
+            upper_bound(bounds, vindx.b(0, j), S.accounttable[j]['bal'])
+        return b, b_eq, bounds
 
     def cg_taxable_fraction(self, year):
         f = 1
@@ -382,11 +523,43 @@ class lp_constraint_model:
                 if v['acctype'] == 'aftertax':
                     f = 1
                     if v['bal'] > 0:
-                        f = 1 - (v['basis'] / (v['bal'] * v['rate']**year))
+                        f = 1 - (v['basis'] / (v['bal'] * v['growth'][year]))
                     break  # should be the last entry anyway but...
         return f
 
-    def print_model_matrix(self, c, A, b, notes, s, non_binding_only):
+    def print_model_matrix(self, c, A, b, notes, s, non_binding_only, A_eq=None, b_eq=None, bounds=None):
+        if scipy.sparse.issparse(A):
+            A = A.toarray()
+        if scipy.sparse.issparse(A_eq):
+            A_eq = A_eq.toarray()
+        ub_notes = None
+        eq_notes = None
+        if notes is not None:
+            ub_notes = [n for n in notes if not n.get("eq", False)]
+            eq_notes = [n for n in notes if n.get("eq", False)]
+        if not non_binding_only:
+            print("c: ")
+            self.print_model_row(c)
+            print()
+            print("B? i: A_ub[i]: b[i]")
+            self.print_constraint_block(A, b, ub_notes, s, False, "<=")
+            if A_eq is not None and len(b_eq) > 0:
+                # equality constraints are always binding
+                s_eq = None
+                if s is not None:
+                    s_eq = [0] * len(b_eq)
+                print("\n\nB? i: A_eq[i]: b_eq[i]")
+                self.print_constraint_block(
+                    A_eq, b_eq, eq_notes, s_eq, False, "==")
+            if bounds is not None:
+                self.print_bounds(bounds)
+        else:
+            print(" i: A_ub[i]: b[i]")
+            j = self.print_constraint_block(A, b, ub_notes, s, True, "<=")
+            print("\n\n%d non-binding constrains printed\n" % j)
+        print()
+
+    def print_constraint_block(self, A, b, notes, s, non_binding_only, relation):
         note = ""
         notesIndex = 0
         nextModelIndex = len(A) + 1  # beyond the end of A
@@ -394,67 +567,54 @@ class lp_constraint_model:
             nextModelIndex = notes[notesIndex]["index"]
             note = notes[notesIndex]["note"]
             notesIndex += 1
-        if nextModelIndex < 0:  # Object function index -1
-            fromm = nextModelIndex
-            nextModelIndex = notes[notesIndex].index
-            to = nextModelIndex - 1
-            print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
-            note = notes[notesIndex].note
-            notesIndex += 1
-        if not non_binding_only:
-            print("c: ")
-            self.print_model_row(c)
-            print()
-            print("B? i: A_ub[i]: b[i]")
-            for constraint in range(len(A)):
-                if nextModelIndex == constraint:
-                    fromm = nextModelIndex
-                    nextModelIndex = notes[notesIndex]["index"]
-                    to = nextModelIndex - 1
-                    while to < fromm:
-                        print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
-                        note = notes[notesIndex]["note"]
-                        notesIndex += 1
-                        fromm = nextModelIndex
-                        nextModelIndex = notes[notesIndex]["index"]
-                        to = nextModelIndex - 1
+        j = 0
+        for constraint in range(len(A)):
+            if nextModelIndex == constraint:
+                fromm = nextModelIndex
+                nextModelIndex = notes[notesIndex]["index"]
+                to = nextModelIndex - 1
+                while to < fromm:
                     print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
                     note = notes[notesIndex]["note"]
                     notesIndex += 1
-                if s is None or s[constraint] > 0:
-                    print("  ", end='')
-                else:
-                    print("B ", end='')
-                print(constraint, ": ", sep='', end='')
-                self.print_constraint(A[constraint], b[constraint])
-        else:
-            print(" i: A_ub[i]: b[i]")
-            j = 0
-            for constraint in range(len(A)):
-                if nextModelIndex == constraint:
                     fromm = nextModelIndex
                     nextModelIndex = notes[notesIndex]["index"]
                     to = nextModelIndex - 1
-                    while to < fromm:
-                        print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
-                        note = notes[notesIndex]["note"]
-                        notesIndex += 1
-                        fromm = nextModelIndex
-                        nextModelIndex = notes[notesIndex]["index"]
-                        to = nextModelIndex - 1
-                    print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
-                    note = notes[notesIndex]["note"]
-                    notesIndex += 1
+                print("\n##== [%d-%d]: %s ==##\n" % (fromm, to, note))
+                note = notes[notesIndex]["note"]
+                notesIndex += 1
+            if non_binding_only:
                 if s[constraint] > 0:
                     j += 1
                     print(constraint, ": ", sep='', end='')
-                    self.print_constraint(A[constraint], b[constraint])
-            print("\n\n%d non-binding constrains printed\n" % j)
-        print()
+                    self.print_constraint(A[constraint], b[constraint], relation)
+            else:
+                if s is None or s[constraint] > 0:
+                    print("  ", end='')
+                else:
+                    print("B ", end='')
+                print(constraint, ": ", sep='', end='')
+                self.print_constraint(A[constraint], b[constraint], relation)
+        return j
+
+    def print_bounds(self, bounds):
+        # only the bounds other than the default 0 <= x[i] are printed
+        print("\n\nBounds (all others 0 <= x[i]):\n")
+        for i in range(len(bounds)):
+            lo, hi = bounds[i]
+            if (lo, hi) == (0, None):
+                continue
+            if hi is None:
+                print("%6.2f <= %s" % (lo, self.var_index.varstr(i)))
+            else:
+                print("%6.2f <= %s <= %6.2f" % (lo, self.var_index.varstr(i), hi))
 
-    def print_constraint(self, row, b):
+    def print_constraint(self, row, b, relation="<="):
         self.print_model_row(row, True)
-        print("<= b[]: %6.2f" % b)
+        if relation == "==":
+            print("== b_eq[]: %6.2f" % b)
+        else:
+            print("<= b[]: %6.2f" % b)
 
     def print_model_row(self, row, suppress_newline=False):
 
@@ -498,3 +658,117 @@ class lp_constraint_model:
                           (i, j, row[vindx.D(i, j)]), end=' ')
         if not suppress_newline:
             print()
+
+    def export_model(self, fname, c, A, b, A_eq, b_eq, bounds, notes):
+        #
+        # Write the model as a CPLEX LP file or, when fname ends in
+        # .mps, a free format MPS file for command line solvers (glpsol
+        # --lp or --freemps, highs, cbc). Variables are named after
+        # varstr() (w[12,2] is w_12_2) and rows after their constraint
+        # family, year and account, bracket or retiree as build_model()
+        # labels them (c15a_y12_j2); rows of a model that was not built
+        # here are named by family and their number in it (c15a_38).
+        #
+        colnames = var_names(self.var_index)
+        rownames = self.row_names
+        if rownames is None or len(rownames) != len(b):
+            rownames = row_names(notes, len(b))
+        eqnames = self.eq_row_names
+        if eqnames is None or len(eqnames) != len(b_eq):
+            eqnames = row_names(notes, len(b_eq), eq=True)
+        if fname.lower().endswith(".mps"):
+            modelio.mpsDumpModel(c, A, b, A_eq, b_eq, bounds, fname,
+                                 colnames, rownames, eqnames)
+        else:
+            modelio.lpDumpModel(c, A, b, A_eq, b_eq, bounds, fname,
+                                colnames, rownames, eqnames)
+
+
+def as_ub_model(A, b, A_eq, b_eq, bounds=None):
+    """ Returns A_ub, b_ub with each equality row written as the pair of
+        opposing <= rows and each bound other than the default 0 <= x[i]
+        as a single variable row, for consumers that only handle
+        A_ub * x <= b_ub with x >= 0 """
+    if scipy.sparse.issparse(A):
+        nvars = A.shape[1]
+    else:
+        nvars = len(A[0])
+    extra = constraint_rows(nvars)
+    b_extra = []
+    if A_eq is not None and len(b_eq) > 0:
+        if scipy.sparse.issparse(A_eq):
+            A_eq = A_eq.toarray()
+        for sign in (1, -1):
+            for i in range(len(b_eq)):
+                extra += [{j: sign * A_eq[i][j]
+                           for j in range(nvars) if A_eq[i][j] != 0}]
+                b_extra += [sign * b_eq[i]]
+    if bounds is not None:
+        for i in range(len(bounds)):
+            lo, hi = bounds[i]
+            if lo != 0:
+                extra += [{i: -1}]
+                b_extra += [-lo]
+            if hi is not None:
+                extra += [{i: 1}]
+                b_extra += [hi]
+    if len(extra) == 0:
+        return A, b
+    if scipy.sparse.issparse(A):
+        A_ub = scipy.sparse.vstack([A, extra.csr()], format='csr')
+    else:
+        A_ub = list(A) + extra.dense()
+    b_ub = list(b) + b_extra
+    return A_ub, b_ub
+
+
+def patch_entries(old, new):
+    # write the entries of new that differ from old into old (in place)
+    # and return their indices
+    changed = [i for i in range(len(new)) if old[i] != new[i]]
+    for i in changed:
+        old[i] = new[i]
+    return changed
+
+
+def row_families(notes, rows, eq=False):
+    #
+    # count rows by the constraint family (note) they belong to, for
+    # A_ub rows or with eq=True for A_eq rows
+    #
+    starts = [n for n in notes if n.get("eq", False) == eq]
+    counts = {}
+    for row in rows:
+        note = None
+        for n in starts:
+            if n['index'] > row:
+                break
+            note = n['note']
+        counts[note] = counts.get(note, 0) + 1
+    return counts
+
+
+def var_names(vindx):
+    # varstr() of every variable as a name for LP and MPS files (x_3_1)
+    return [vindx.varstr(i).replace('[', '_').replace(',', '_').replace(']', '')
+            for i in range(vindx.vsize)]
+
+
+def family_name(note):
+    # "Constraints 15a'/15b':" is c15a
+    return "c" + note.split()[-1].split("'")[0]
+
+
+def row_names(notes, nrows, eq=False):
+    #
+    # names for the nrows rows of A_ub, or with eq=True of A_eq, by the
+    # constraint family (note) they belong to and their number in it
+    #
+    starts = [n for n in notes if n.get("eq", False) == eq and
+              n['note'].startswith("Constraints")]
+    names = ["r_%d" % i for i in range(starts[0]['index'] if len(starts) > 0 else nrows)]
+    for k, n in enumerate(starts):
+        end = starts[k + 1]['index'] if k + 1 < len(starts) else nrows
+        names += ["%s_%d" % (family_name(n['note']), i)
+                  for i in range(end - n['index'])]
+    return names
@@ -0,0 +1,320 @@
+#
+# LP solver backends. Every backend takes the model in the linprog() form
+# (minimize c x subject to A x <= b, A_eq x == b_eq, bounds) and returns a
+# scipy OptimizeResult with the same members whichever solver ran:
+#
+#     x, fun, slack, con      as from linprog()
+#     status, success         linprog()'s codes: 0 optimal, 1 iteration
+#                             limit, 2 infeasible, 3 unbounded, 4 other
+#     message                 the solver's own words
+#     nit                     simplex (or interior point) iterations
+#     time                    wall time of the solve in seconds
+#     solver                  the backend name
+#
+# The backends:
+#
+#     highs        HiGHS choosing its own method (the linprog() default)
+#     highs-ds     HiGHS dual simplex
+#     highs-ipm    HiGHS interior point followed by crossover
+#     simplex      scipy's legacy dense tableau simplex, only in the scipy
+#                  releases that still have it
+#     glpk, cbc    a local glpsol or cbc binary run on an MPS file of the
+#                  model (see modelio.mpsDumpModel())
+#
+# options are linprog() options; each backend passes on those it knows
+# (maxiter, tol, disp, ...) and ignores the rest.
+#
+# warm_start solves a sequence of related models, each starting from the
+# optimal basis of the previous one. It needs the optional highspy
+# package (HiGHS' own python interface); without it every solve is cold.
+#
+
+import os
+import re
+import time
+import shutil
+import tempfile
+import warnings
+import subprocess
+import numpy as np
+import scipy.optimize
+import scipy.sparse
+import modelio
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+names = ['highs', 'highs-ds', 'highs-ipm', 'simplex', 'glpk', 'cbc']
+
+# linprog() options understood by each linprog() method family
+linprog_options = {
+    'highs': ('maxiter', 'disp', 'presolve', 'time_limit',
+              'dual_feasibility_tolerance', 'primal_feasibility_tolerance',
+              'ipm_optimality_tolerance'),
+    'simplex': ('maxiter', 'disp', 'presolve', 'tol', 'autoscale', 'rr',
+                'bland'),
+}
+
+# the program each MPS file backend runs
+binaries = {'glpk': 'glpsol', 'cbc': 'cbc'}
+
+
+def available(name):
+    # True when backend name can run here
+    if name in binaries:
+        return shutil.which(binaries[name]) is not None
+    if name == 'simplex':
+        return 'simplex' in scipy.optimize._linprog.LINPROG_METHODS
+    return name in names
+
+
+def run_linprog(name, c, A, b, A_eq, b_eq, bounds, options):
+    family = 'simplex' if name == 'simplex' else 'highs'
+    options = {k: v for k, v in options.items()
+               if k in linprog_options[family]}
+    if family == 'simplex':
+        # the tableau is dense
+        if scipy.sparse.issparse(A):
+            A = A.toarray()
+        if scipy.sparse.issparse(A_eq):
+            A_eq = A_eq.toarray()
+    with warnings.catch_warnings():
+        # linprog() warns that method='simplex' is deprecated
+        warnings.simplefilter('ignore', DeprecationWarning)
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds, method=name,
+                                     options=options)
+    res.nit = int(res.get('nit', 0))
+    return res
+
+
+def mps_status(text):
+    #
+    # linprog() status and message from the solution file status of
+    # glpsol (the "s bas" line) or cbc (the first line)
+    #
+    m = re.search(r'^s\s+bas\s+\d+\s+\d+\s+(\w)\s+(\w)', text, re.M)
+    if m is not None:
+        primal, dual = m.groups()
+        if primal == 'f' and dual == 'f':
+            return 0, 'Optimal'
+        if primal == 'n':
+            return 2, 'The problem is infeasible'
+        if dual == 'n':
+            return 3, 'The problem is unbounded'
+        return 4, 'glpsol solution status primal %s dual %s' % (primal, dual)
+    first = text.strip().split('\n')[0] if text.strip() != '' else 'no solution'
+    if first.startswith('Optimal'):
+        return 0, 'Optimal'
+    if 'nfeasible' in first:
+        return 2, first
+    if 'nbounded' in first:
+        return 3, first
+    if 'iterations' in first:
+        return 1, first
+    return 4, first
+
+
+def mps_objective(text):
+    # the objective in a glpsol or cbc solution file, None if not found
+    m = re.search(r'^s\s+bas\s+\d+\s+\d+\s+\w\s+\w\s+(\S+)', text, re.M)
+    if m is None:
+        m = re.search(r'objective value\s+(\S+)', text)
+    return None if m is None else float(m.group(1))
+
+
+def mps_values(name, text, n):
+    # the column values of a glpsol or cbc solution file
+    x = np.zeros(n)
+    for line in text.split('\n'):
+        fields = line.replace('**', ' ').split()
+        if name == 'glpk' and len(fields) >= 4 and fields[0] == 'j':
+            # j col status value dual
+            x[int(fields[1]) - 1] = float(fields[3])
+        elif name == 'cbc' and len(fields) >= 3 and fields[1].startswith('C'):
+            # index name value reduced cost, columns and rows mixed
+            x[int(fields[1][1:])] = float(fields[2])
+    return x
+
+
+def run_binary(name, c, A, b, A_eq, b_eq, bounds, options):
+    with tempfile.TemporaryDirectory() as d:
+        mps = os.path.join(d, 'model.mps')
+        sol = os.path.join(d, 'model.sol')
+        modelio.mpsDumpModel(c, A, b, A_eq, b_eq, bounds, mps)
+        if name == 'glpk':
+            cmd = [binaries[name], '--freemps', mps, '--min', '-w', sol]
+        else:
+            cmd = [binaries[name], mps, '-printingOptions', 'all',
+                   '-solve', '-solu', sol]
+        run = subprocess.run(cmd, capture_output=True, text=True)
+        if options.get('disp', False):
+            print(run.stdout)
+        try:
+            with open(sol) as f:
+                text = f.read()
+        except IOError:
+            text = ''
+    status, message = mps_status(text)
+    if run.returncode != 0 and status == 0:
+        status, message = 4, '%s exited with %d' % (cmd[0], run.returncode)
+    # the last iteration count in the solver's log
+    counts = re.findall(r'^\s*[*|]?\s*(\d+):', run.stdout, re.M) if name == 'glpk' \
+        else re.findall(r'(\d+) iterations', run.stdout)
+    x = mps_values(name, text, len(c))
+    res = scipy.optimize.OptimizeResult(x=x, status=status, success=status == 0,
+                                        message=message,
+                                        nit=int(counts[-1]) if len(counts) > 0 else 0)
+    # cbc writes values to about 8 digits so the file's objective is
+    # more accurate than c x
+    fun = mps_objective(text)
+    res.fun = float(np.dot(c, x)) if fun is None else fun
+    res.slack = np.empty(0) if A is None else b - A @ x
+    res.con = np.empty(0) if A_eq is None else b_eq - A_eq @ x
+    return res
+
+
+def solve(name, c, A, b, A_eq=None, b_eq=None, bounds=None, options=None):
+    #
+    # Solve the model with backend name and return the result described
+    # above. Raises ValueError for an unknown backend or one that can
+    # not run here.
+    #
+    if name not in names:
+        raise ValueError('unknown solver %s, use one of %s' %
+                         (name, ', '.join(names)))
+    if not available(name):
+        raise ValueError('solver %s is not available here' % name)
+    if options is None:
+        options = {}
+    t = time.perf_counter()
+    if name in binaries:
+        res = run_binary(name, c, A, b, A_eq, b_eq, bounds, options)
+    else:
+        res = run_linprog(name, c, A, b, A_eq, b_eq, bounds, options)
+    res.time = time.perf_counter() - t
+    res.solver = name
+    return res
+
+
+def iteration_stats(nits, warm):
+    #
+    # Totals for a sequence of solves given each one's iterations and
+    # whether it started from a previous basis: solves, warm (solves
+    # warm started), nit (all iterations) and saved, an estimate of the
+    # iterations warm starting saved: the warm solves at the mean
+    # iterations of the cold ones less what they took.
+    #
+    nits = np.asarray(nits, dtype=float)
+    warm = np.asarray(warm, dtype=bool)
+    saved = 0
+    if warm.any() and (~warm).any():
+        saved = int(round(warm.sum() * nits[~warm].mean() - nits[warm].sum()))
+    return {'solves': len(nits), 'warm': int(warm.sum()),
+            'nit': int(nits.sum()), 'saved': saved}
+
+
+# HiGHS model status to linprog() status
+highs_status = {'kOptimal': 0, 'kIterationLimit': 1, 'kTimeLimit': 1,
+                'kInfeasible': 2, 'kUnbounded': 3, 'kUnboundedOrInfeasible': 2}
+
+
+class warm_start:
+    """ Solves related models in turn, reusing the last optimal basis
+
+        solve() takes the same model as lp_solvers.solve() and returns
+        the same result, plus warm (True when it started from the basis
+        of the previous solve). With highspy installed the models are
+        solved by HiGHS' dual simplex and a basis is reused whenever the
+        model has the same shape as the previous one, which suits sweeps
+        that patch values into one built plan. Without highspy each
+        solve is a cold lp_solvers.solve(fallback).
+
+        nits and warms record every solve; stats() totals them (see
+        iteration_stats()).
+    """
+
+    def __init__(self, options=None, fallback='highs-ds'):
+        self.options = {} if options is None else options
+        self.fallback = fallback
+        self.supported = highspy is not None
+        self.highs = None
+        self.basis = None
+        self.shape = None
+        self.nits = []
+        self.warms = []
+
+    def stats(self):
+        return iteration_stats(self.nits, self.warms)
+
+    def highs_model(self, c, A, b, A_eq, b_eq, bounds):
+        n = len(c)
+        A = scipy.sparse.csr_matrix((0, n)) if A is None else scipy.sparse.csr_matrix(A)
+        A_eq = scipy.sparse.csr_matrix((0, n)) if A_eq is None else scipy.sparse.csr_matrix(A_eq)
+        b = np.empty(0) if b is None else np.asarray(b, dtype=float)
+        b_eq = np.empty(0) if b_eq is None else np.asarray(b_eq, dtype=float)
+        M = scipy.sparse.vstack([A, A_eq]).tocsc()
+        inf = highspy.kHighsInf
+        pairs = modelio.bound_pairs(bounds, n)
+        lp = highspy.HighsLp()
+        lp.num_col_ = n
+        lp.num_row_ = M.shape[0]
+        lp.col_cost_ = np.asarray(c, dtype=float)
+        lp.col_lower_ = np.array([-inf if lo is None else lo for lo, hi in pairs], dtype=float)
+        lp.col_upper_ = np.array([inf if hi is None else hi for lo, hi in pairs], dtype=float)
+        lp.row_lower_ = np.concatenate((np.full(A.shape[0], -inf), b_eq))
+        lp.row_upper_ = np.concatenate((b, b_eq))
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.num_col_ = n
+        lp.a_matrix_.num_row_ = M.shape[0]
+        lp.a_matrix_.start_ = M.indptr
+        lp.a_matrix_.index_ = M.indices
+        lp.a_matrix_.value_ = M.data
+        return lp, A, b, A_eq, b_eq
+
+    def run_highs(self, c, A, b, A_eq, b_eq, bounds):
+        if self.highs is None:
+            self.highs = highspy.Highs()
+            self.highs.setOptionValue('output_flag', bool(self.options.get('disp', False)))
+            self.highs.setOptionValue('solver', 'simplex')
+            if 'maxiter' in self.options:
+                self.highs.setOptionValue('simplex_iteration_limit',
+                                          int(self.options['maxiter']))
+        lp, A, b, A_eq, b_eq = self.highs_model(c, A, b, A_eq, b_eq, bounds)
+        h = self.highs
+        h.passModel(lp)
+        warm = self.basis is not None and self.shape == (lp.num_row_, lp.num_col_)
+        if warm:
+            h.setBasis(self.basis)
+        h.run()
+        status = highs_status.get(h.getModelStatus().name, 4)
+        info = h.getInfo()
+        x = np.array(h.getSolution().col_value)
+        if len(x) != len(c):
+            x = np.zeros(len(c))
+        res = scipy.optimize.OptimizeResult(
+            x=x, fun=info.objective_function_value, status=status,
+            success=status == 0, message=h.modelStatusToString(h.getModelStatus()),
+            nit=int(info.simplex_iteration_count), warm=warm)
+        res.slack = b - A @ x
+        res.con = b_eq - A_eq @ x
+        if res.success:
+            self.basis = h.getBasis()
+            self.shape = (lp.num_row_, lp.num_col_)
+        else:
+            self.basis = None
+        return res
+
+    def solve(self, c, A, b, A_eq=None, b_eq=None, bounds=None):
+        if not self.supported:
+            res = solve(self.fallback, c, A, b, A_eq, b_eq, bounds, self.options)
+            res.warm = False
+        else:
+            t = time.perf_counter()
+            res = self.run_highs(c, A, b, A_eq, b_eq, bounds)
+            res.time = time.perf_counter() - t
+            res.solver = 'highs-ds'
+        self.nits.append(res.nit)
+        self.warms.append(res.warm)
+        return res
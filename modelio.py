@@ -1,6 +1,37 @@
 
 import os
+import json
+import zlib
+import struct
+import tempfile
 from array import array
+import numpy as np
+import scipy.sparse
+
+#
+# Model file format 2, written by binDumpModel() and read by
+# binLoadModel(). Every number is little endian whatever the platform.
+#
+#     magic         8 bytes, b'RPLANMDL'
+#     version       <u4, 2
+#     sections      <u4, the number of sections
+#     then a 32 byte entry for each section
+#         name      8 bytes, ascii, zero padded
+#         dtype     4 bytes, numpy dtype string ('<f8', '<i4'), zero padded
+#         crc32     <u4, zlib.crc32 of the section's bytes
+#         count     <u8, the number of items
+#         offset    <u8, from the start of the file, a multiple of 8
+#     header crc32  <u4, of everything before it, then 4 zero bytes
+#     the sections, each padded to a multiple of 8 bytes
+#
+# A model is the sections c, b, Ashape (rows, columns), Aindptr, Aindices
+# and Adata (A as CSR) and, when dumped, X and vid; binDumpModel() takes
+# any further sections in extra (see csr_sections() and json_section()).
+# Format 1, the dense A with native 'L' headers of earlier releases, can
+# still be loaded.
+#
+model_magic = b'RPLANMDL'
+model_version = 2
 
 
 def checkDump(c, A, b):
@@ -51,76 +82,217 @@ def checkDump(c, A, b):
 
 
 def binDumpCheck(c, A, b, X, vid, ftocheck):
-    fsize = os.path.getsize(ftocheck)
-
-    overheads = 3
-    sizeX = 0
-    if X is not None:
-        sizeX = 8 * len(X)
-        overheads += 1
-
-    sizevid = 0
-    if vid is not None:
-        sizevid = 4 * len(vid)
-        overheads += 1
-
-    if fsize != overheads * 12 + 8 * len(c) + 8 * len(A) * len(A[0]) + 8 * len(b) + sizeX + sizevid:
-        print('Error - dump file size error, filesize: %d, len(c): %d, len(A): %d, Len(A[0]): %d, len(b): %d, sizeX: %d, sizevid: %d' % (
-            fsize, len(c), len(A), len(A[0]), len(b), sizeX, sizevid))
-
-    c1, A1, b1, X1, vid1 = binLoadModel(ftocheck)
-
-    # Check loaded C vector
-    if len(c) != len(c1):
-        print("modelio error: len(c): %d does not match len(c1) %d" %
-              (len(c), len(c1)))
-    for i in range(len(c)):
-        if c[i] != c1[i]:
-            print("c[%d] is %g but found %g" % (i, c[i], c1[i]))
-
-    # Checking A matrix
-    if len(A) != len(A1):
-        print("modelio error: len(A): %d does not match len(A1) %d" %
-              (len(A), len(A1)))
-    for i in range(len(A)):
-        if len(A[0]) != len(A1[i]):
-            print("modelio error: len(A[0]): %d does not match len(A1[%d]) %d" % (
-                i, len(A[0]), len(A1[i])))
-        for j in range(len(A[0])):
-            if A[i][j] != A1[i][j]:
-                print("A[%d][%d] is %g but found %g" %
-                      (i, j, A[i][j], A1[i][j]))
-
-    # Checking b vector
-    if len(b) != len(b1):
-        print("modelio error: len(b): %d does not match len(b1) %d" %
-              (len(b), len(b1)))
-    for i in range(len(b)):
-        if b[i] != b1[i]:
-            print("b[%d] is %g but found %g" % (i, b[i], b1[i]))
-
-    # Checking X vector
-    if X is not None:
-        if len(X) != len(X1):
-            print("modelio error: len(X): %d does not match len(X1) %d" %
-                  (len(X), len(X1)))
-        for i in range(len(X)):
-            if X[i] != X1[i]:
-                print("X[%d] is %g but found %g" % (i, X[i], X1[i]))
-
-    # Checking vid vector
-    if vid is not None:
-        if len(vid) != len(vid1):
-            print("modelio error: len(vid): %d does not match len(vid1) %d" %
-                  (len(vid), len(vid1)))
-        for i in range(len(vid)):
-            if vid[i] != vid1[i]:
-                print("vid[%d] is %d but found %d" % (i, vid[i], vid1[i]))
-
-
-def binLoadModel(filename=None):
+    # load ftocheck, checking its checksums, and report every value that
+    # differs from the model dumped
+    c1, A1, b1, X1, vid1 = binLoadModel(ftocheck, verify=True)
+
+    def compare(name, v, v1):
+        if v is None:
+            return
+        v = np.asarray(v)
+        if len(v) != len(v1):
+            print("modelio error: len(%s): %d does not match len(%s1) %d" %
+                  (name, len(v), name, len(v1)))
+            return
+        for i in np.flatnonzero(v != v1):
+            print("%s[%d] is %g but found %g" % (name, i, v[i], v1[i]))
+
+    compare('c', c, c1)
+    A = scipy.sparse.csr_matrix(A)
+    if A.shape != A1.shape:
+        print("modelio error: A is %d x %d but found %d x %d" %
+              (A.shape[0], A.shape[1], A1.shape[0], A1.shape[1]))
+    else:
+        rows, cols = (A != A1).nonzero()
+        for i, j in zip(rows, cols):
+            print("A[%d][%d] is %g but found %g" % (i, j, A[i, j], A1[i, j]))
+    compare('b', b, b1)
+    compare('X', X, X1)
+    compare('vid', vid, vid1)
+
+
+def writeSections(fname, sections, chunk=1 << 20):
+    #
+    # Write the (name, array) sections as a format 2 file, chunk bytes at
+    # a time; each section's checksum is accumulated over the chunks as
+    # they are written and the header, which holds them, is written
+    # last. Returns the header and the file size.
+    #
+    # The sections may be memmaps of fname itself (a loaded model dumped
+    # back to where it came from), so the file is written next to fname
+    # and only replaces it once complete.
+    #
+    entries = []
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(fname) or '.',
+                                   suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(bytes(model_header_size(len(sections))))
+            for name, a in sections:
+                offset = f.tell()
+                data = memoryview(np.ascontiguousarray(a)).cast('B')
+                crc = 0
+                for i in range(0, len(data), chunk):
+                    f.write(data[i:i + chunk])
+                    crc = zlib.crc32(data[i:i + chunk], crc)
+                f.write(bytes(-len(data) % 8))  # keep every section 8 byte aligned
+                entries.append((name, a.dtype.str, len(a), offset, crc))
+            size = f.tell()
+            header = model_header(entries)
+            f.seek(0)
+            f.write(header)
+        mask = os.umask(0)  # mkstemp() makes the file 0600; use the umask
+        os.umask(mask)
+        os.chmod(tmpname, 0o666 & ~mask)
+        os.replace(tmpname, fname)
+    except BaseException:
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+        raise
+    return header, size
+
+
+def checkHeader(fname, header, size):
+    #
+    # After a dump: the file must have the size written and start with
+    # the header written. The section data is not read back
+    # (binDumpCheck() does that).
+    #
+    with open(fname, 'rb') as f:
+        ok = f.read(len(header)) == header
+    if not ok or os.path.getsize(fname) != size:
+        print("Error: %s model file does not match what was dumped" % fname)
+        return False
+    return True
+
+
+def model_header_size(nsections):
+    # magic, version, count, the entries and the header crc padded to 8
+    return 16 + 32 * nsections + 8
+
+
+def model_header(entries):
+    header = model_magic + struct.pack('<II', model_version, len(entries))
+    for name, dtype, count, offset, crc in entries:
+        header += struct.pack('<8s4sIQQ', name.encode(), dtype.encode(),
+                              crc, count, offset)
+    return header + struct.pack('<II', zlib.crc32(header), 0)
+
+
+def readSections(filename, verify=False):
+    #
+    # The sections of a format 2 file as a dict of read only numpy.memmap
+    # arrays by name; None when filename is not a format 2 file. The
+    # header checksum is always checked, the section checksums (which
+    # read every byte) only with verify.
+    #
+    with open(filename, 'rb') as f:
+        head = f.read(16)
+        if len(head) < 16 or head[:8] != model_magic:
+            return None
+        version, nsections = struct.unpack('<II', head[8:])
+        if version != model_version:
+            print("Error: %s is model file version %d, this planner reads version %d" %
+                  (filename, version, model_version))
+            exit(1)
+        header = head + f.read(model_header_size(nsections) - 16)
+    body = header[:-8]
+    if len(header) != model_header_size(nsections) or \
+            struct.unpack('<I', header[-8:-4])[0] != zlib.crc32(body):
+        print("Error: %s model file header checksum mismatch" % filename)
+        exit(1)
+    sections = {}
+    for k in range(nsections):
+        name, dtype, crc, count, offset = struct.unpack(
+            '<8s4sIQQ', body[16 + 32 * k:48 + 32 * k])
+        name = name.rstrip(b'\0').decode()
+        dtype = np.dtype(dtype.rstrip(b'\0').decode())
+        if count == 0:
+            a = np.empty(0, dtype=dtype)
+        else:
+            a = np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                          shape=(count,))
+        if verify and zlib.crc32(a.tobytes()) != crc:
+            print("Error: %s model file section %s checksum mismatch" %
+                  (filename, name))
+            exit(1)
+        sections[name] = a
+    return sections
+
+
+def binLoadModel(filename=None, verify=False):
+    #
+    # Returns c, A (csr), b, X and vid from a model file, X and vid None
+    # when not dumped. Format 2 arrays are memory mapped, not read, so
+    # even a large model opens at once and worker processes loading the
+    # same file share its pages. Format 1 files are read whole.
+    #
     if filename is None:
         filename = "./RPlanModel.dat"
+    m = readSections(filename, verify)
+    if m is None:
+        c, A, b, X, vid = binLoadModelV1(filename)
+        return np.array(c), scipy.sparse.csr_matrix(np.array(A)), np.array(b), \
+            None if X is None else np.array(X), None if vid is None else np.array(vid)
+    return m['c'], csr_of(m, 'A'), m['b'], m.get('X'), m.get('vid')
+
+
+def csr_sections(prefix, M):
+    #
+    # The sections holding matrix M as CSR: <prefix>shape (rows,
+    # columns), <prefix>indptr, <prefix>indices and <prefix>data
+    # (prefix at most one character). The index type is the one scipy
+    # would pick so csr_of() does not convert them.
+    #
+    M = scipy.sparse.csr_matrix(M, dtype=np.float64)
+    M.sort_indices()
+    index = '<i4' if max(M.nnz, M.shape[1]) < 2**31 else '<i8'
+    return [(prefix + 'shape', np.array(M.shape, dtype='<i8')),
+            (prefix + 'indptr', M.indptr.astype(index)),
+            (prefix + 'indices', M.indices.astype(index)),
+            (prefix + 'data', M.data.astype('<f8'))]
+
+
+def csr_of(sections, prefix):
+    # the csr_matrix of csr_sections(prefix), over the mapped arrays
+    rows, cols = sections[prefix + 'shape']
+    return scipy.sparse.csr_matrix((sections[prefix + 'data'],
+                                    sections[prefix + 'indices'],
+                                    sections[prefix + 'indptr']),
+                                   shape=(int(rows), int(cols)), copy=False)
+
+
+def json_default(obj):
+    # numpy values in json_section(), arrays tagged for json_of()
+    if isinstance(obj, np.ndarray):
+        return {'__ndarray__': obj.tolist(), 'dtype': obj.dtype.str}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('%s can not be dumped' % type(obj).__name__)
+
+
+def json_array(d):
+    if '__ndarray__' in d:
+        return np.array(d['__ndarray__'], dtype=d['dtype'])
+    return d
+
+
+def json_section(obj):
+    # obj (dicts, lists, numbers, strings and numpy arrays) as json bytes
+    return np.frombuffer(json.dumps(obj, default=json_default).encode(),
+                         dtype='|u1')
+
+
+def json_of(a):
+    # the object of a json_section()
+    return json.loads(bytes(a).decode(), object_hook=json_array)
+
+
+def binLoadModelV1(filename):
+    # the format 1 files, with native 'L' headers and a dense A, that
+    # binDumpModel() wrote before format 2
     fsize = os.path.getsize(filename)
     with open(filename, 'rb') as input_file:
 
@@ -220,66 +392,30 @@ def binLoadModel(filename=None):
     return c, A, b, X, vid
 
 
-def binDumpModel(c, A, b, X, vid, fname=None):
+def binDumpModel(c, A, b, X, vid, fname=None, check=False, extra=None):
+    #
+    # Dump the model as a format 2 file, followed by the (name, array)
+    # sections in extra. The section checksums are taken as the file is
+    # written and the header is checked after; with check the file is
+    # also loaded back and compared value by value.
+    #
     if fname is None:
         fname = "./RPlanModel.dat"
-    stream = open(fname, 'wb')
-
-    header = [len(c), 0, 0xDEADBEEF]
-    hArray = array('L', header)
-    hArray.tofile(stream)
-    print("c length: %d, dumping" % len(c))
-    a = array('d', c)
-    a.tofile(stream)
-
-    header = [len(A), len(A[0]), 0xDEADBEEF]
-    hArray = array('L', header)
-    hArray.tofile(stream)
-    print("A length: %d, %d, dumping" % (len(A), len(A[0])))
-    for row in A:
-        a = array('d', row)
-        a.tofile(stream)
-
-    header = [len(b), 0, 0xDEADBEEF]
-    hArray = array('L', header)
-    hArray.tofile(stream)
-    print("b length: %d, dumping" % len(b))
-    a = array('d', b)
-    a.tofile(stream)
-
-    overheads = 3
-    sizeX = 0
+    A = scipy.sparse.csr_matrix(A, dtype=np.float64)
+    sections = [('c', np.asarray(c, dtype='<f8')),
+                ('b', np.asarray(b, dtype='<f8'))] + csr_sections('A', A)
     if X is not None:
-        header = [len(X), 0, 0xDEADBEEF]
-        hArray = array('L', header)
-        hArray.tofile(stream)
-        print("X length: %d, dumping" % len(X))
-        a = array('d', X)
-        a.tofile(stream)
-        sizeX = 8 * len(X)
-        overheads += 1
-
-    sizevid = 0
+        sections.append(('X', np.asarray(X, dtype='<f8')))
     if vid is not None:
-        header = [len(vid), 0, 0xDEADBEEF]
-        hArray = array('L', header)
-        hArray.tofile(stream)
-        print("vid length: %d, dumping" % len(vid))
-        a = array('l', vid)
-        a.tofile(stream)
-        sizevid = 4 * len(vid)
-        overheads += 1
-
-    stream.flush()
-    stream.close()
-
-    fsize = os.path.getsize(fname)
-    calcsize = overheads * 12 + 8 * \
-        len(c) + 8 * len(A) * len(A[0]) + 8 * len(b) + sizeX + sizevid
-    if fsize != calcsize:
-        print('Error - dump file size error, filesize: %d, len(c): %d, len(A): %d, Len(A[0]): %d, len(b): %d, sizeX: %d, sizevid: %d' % (
-            fsize, len(c), len(A), len(A[0]), len(b), sizeX, sizevid))
-    binDumpCheck(c, A, b, X, vid, fname)
+        sections.append(('vid', np.asarray(vid, dtype='<i8')))
+    if extra is not None:
+        sections += extra
+    print("c length: %d, A: %d x %d with %d entries, b length: %d, dumping" %
+          (len(c), A.shape[0], A.shape[1], A.nnz, len(b)))
+    header, size = writeSections(fname, sections)
+    checkHeader(fname, header, size)
+    if check:
+        binDumpCheck(c, A, b, X, vid, fname)
 
 
 def dumpModel(c, A, b):
@@ -301,3 +437,161 @@ def dumpModel(c, A, b):
             print('%g' % val, file=fil)
     fil.close()
     # checkDump(c,A,b)
+
+
+def bound_pairs(bounds, n):
+    #
+    # linprog() bounds (None, one (lo, hi) pair or one per variable) as
+    # n pairs with None for an infinite bound
+    #
+    if bounds is None:
+        bounds = [(0, None)] * n
+    elif len(bounds) == 2 and not isinstance(bounds[0], (tuple, list)):
+        bounds = [tuple(bounds)] * n
+    return [(None if lo is None or np.isneginf(lo) else lo,
+             None if hi is None or np.isposinf(hi) else hi)
+            for lo, hi in bounds]
+
+
+def number(v):
+    # the shortest text that reads back as exactly v (1 rather than 1.0)
+    s = repr(float(v))
+    return s[:-2] if s.endswith('.0') else s
+
+
+def model_names(n, m, m_eq, colnames=None, rownames=None, eqnames=None,
+                eqprefix="E"):
+    # the column, A row and A_eq row names, C<j>, R<i> and E<i> (or
+    # eqprefix) counting from 0 for those not given
+    if colnames is None:
+        colnames = ["C%d" % j for j in range(n)]
+    if rownames is None:
+        rownames = ["R%d" % i for i in range(m)]
+    if eqnames is None:
+        eqnames = ["%s%d" % (eqprefix, i) for i in range(m_eq)]
+    return colnames, rownames, eqnames
+
+
+def mpsDumpModel(c, A, b, A_eq, b_eq, bounds, fname=None,
+                 colnames=None, rownames=None, eqnames=None):
+    #
+    # Write the linprog() form of the model (minimize c x subject to
+    # A x <= b, A_eq x == b_eq, bounds) as a free format MPS file.
+    # Rows are named R<i> (A) and E<i> (A_eq), columns C<j>, counting
+    # from 0, unless names are given (which must not contain spaces).
+    # The file is written a column at a time so A is never expanded to
+    # a dense matrix.
+    #
+    if fname is None:
+        fname = "./RPlanModel.mps"
+    n = len(c)
+    A = scipy.sparse.csc_matrix((0, n)) if A is None else scipy.sparse.csc_matrix(A)
+    A_eq = scipy.sparse.csc_matrix((0, n)) if A_eq is None else scipy.sparse.csc_matrix(A_eq)
+    colnames, rownames, eqnames = model_names(n, A.shape[0], A_eq.shape[0],
+                                              colnames, rownames, eqnames)
+    with open(fname, 'w') as f:
+        f.write("NAME RPLAN\nROWS\n N COST\n")
+        for i in range(A.shape[0]):
+            f.write(" L %s\n" % rownames[i])
+        for i in range(A_eq.shape[0]):
+            f.write(" E %s\n" % eqnames[i])
+        f.write("COLUMNS\n")
+        for j in range(n):
+            entries = []
+            if c[j] != 0:
+                entries.append(("COST", c[j]))
+            for M, names in ((A, rownames), (A_eq, eqnames)):
+                start, end = M.indptr[j], M.indptr[j + 1]
+                entries += [(names[i], v)
+                            for i, v in zip(M.indices[start:end], M.data[start:end])
+                            if v != 0]
+            if len(entries) == 0:
+                # every column must appear for the solver to know of it
+                entries.append(("COST", 0.0))
+            for row, v in entries:
+                f.write(" %s %s %s\n" % (colnames[j], row, number(v)))
+        f.write("RHS\n")
+        for rhs, names in ((b, rownames), (b_eq, eqnames)):
+            if rhs is not None:
+                for i, v in enumerate(rhs):
+                    if v != 0:
+                        f.write(" RHS %s %s\n" % (names[i], number(v)))
+        f.write("BOUNDS\n")
+        for j, (lo, hi) in enumerate(bound_pairs(bounds, n)):
+            name = colnames[j]
+            if lo is None and hi is None:
+                f.write(" FR BND %s\n" % name)
+            elif lo is not None and hi is not None and lo == hi:
+                f.write(" FX BND %s %s\n" % (name, number(lo)))
+            else:
+                if lo is None:
+                    f.write(" MI BND %s\n" % name)
+                elif lo != 0 or (hi is not None and hi < 0):
+                    f.write(" LO BND %s %s\n" % (name, number(lo)))
+                if hi is not None:
+                    f.write(" UP BND %s %s\n" % (name, number(hi)))
+        f.write("ENDATA\n")
+
+
+def lp_terms(f, terms, per_line=8):
+    # write the (value, name) terms of a CPLEX LP expression, a few per
+    # line to keep clear of the format's line length limit
+    for k, (v, name) in enumerate(terms):
+        if k > 0 and k % per_line == 0:
+            f.write("\n   ")
+        f.write(" %s %s %s" % ("-" if v < 0 else "+", number(abs(v)), name))
+
+
+def lpDumpModel(c, A, b, A_eq, b_eq, bounds, fname=None,
+                colnames=None, rownames=None, eqnames=None):
+    #
+    # Write the linprog() form of the model as a CPLEX LP file, with
+    # the names of mpsDumpModel() except that A_eq rows default to Q<i>
+    # (LP names may not start with E). The constraints are written a
+    # row at a time from A as CSR so no dense row is built. Columns
+    # that appear nowhere else are listed in the objective with a zero
+    # coefficient so the solver keeps every column.
+    #
+    if fname is None:
+        fname = "./RPlanModel.lp"
+    n = len(c)
+    A = scipy.sparse.csr_matrix((0, n)) if A is None else scipy.sparse.csr_matrix(A)
+    A_eq = scipy.sparse.csr_matrix((0, n)) if A_eq is None else scipy.sparse.csr_matrix(A_eq)
+    colnames, rownames, eqnames = model_names(n, A.shape[0], A_eq.shape[0],
+                                              colnames, rownames, eqnames, "Q")
+    used = np.zeros(n, dtype=bool)
+    used[A.indices[A.data != 0]] = True
+    used[A_eq.indices[A_eq.data != 0]] = True
+    with open(fname, 'w') as f:
+        f.write("\\ RPLAN\nMinimize\n COST:")
+        lp_terms(f, [(c[j], colnames[j]) for j in range(n)
+                     if c[j] != 0 or not used[j]])
+        f.write("\nSubject To\n")
+        for M, rhs, names, relation in ((A, b, rownames, "<="),
+                                        (A_eq, b_eq, eqnames, "=")):
+            for i in range(M.shape[0]):
+                start, end = M.indptr[i], M.indptr[i + 1]
+                f.write(" %s:" % names[i])
+                terms = [(v, colnames[j])
+                         for j, v in zip(M.indices[start:end], M.data[start:end])
+                         if v != 0]
+                if len(terms) == 0:
+                    terms = [(0.0, colnames[0])]
+                lp_terms(f, terms)
+                f.write(" %s %s\n" % (relation, number(rhs[i])))
+        f.write("Bounds\n")
+        for j, (lo, hi) in enumerate(bound_pairs(bounds, n)):
+            name = colnames[j]
+            if lo is None and hi is None:
+                f.write(" %s free\n" % name)
+            elif lo is not None and hi is not None and lo == hi:
+                f.write(" %s = %s\n" % (name, number(lo)))
+            elif hi is None:
+                if lo is None:
+                    f.write(" %s >= -inf\n" % name)
+                elif lo != 0:
+                    f.write(" %s >= %s\n" % (name, number(lo)))
+            else:
+                f.write(" %s <= %s <= %s\n" %
+                        ("-inf" if lo is None else number(lo), name, number(hi)))
+        f.write("End\n")
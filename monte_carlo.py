@@ -0,0 +1,266 @@
+#!/usr/bin/python3
+
+#
+# Monte Carlo runs of a retirement plan: solve the plan for many sampled
+# sequences of account returns and inflation and report percentile bands
+# of the first year spending s(0) and of the ending estate.
+#
+
+import os
+import sys
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+import scipy.sparse
+import ARetirementPlanner as planner
+import lp_solvers
+import lp_constraint_model as lp
+import tomldata
+
+__version__ = planner.__version__
+
+
+def without_entries(M, rows, cols):
+    # M (csr) with the entries at (rows[i], cols[i]) removed
+    M = M.tocoo()
+    drop = set(zip(rows, cols))
+    keep = np.array([(r, c) not in drop for r, c in zip(M.row, M.col)],
+                    dtype=bool)
+    return scipy.sparse.csr_matrix((M.data[keep], (M.row[keep], M.col[keep])),
+                                   shape=M.shape)
+
+
+class path_model:
+    """ A built plan model with per-year returns and inflation patched in
+
+        The LP has the same structure for every return sequence; only the
+        coefficients that depend on the account rates or on inflation
+        change. They are located once in the model built by a PlanSession
+        and model(rates, infl) fills them in for one path:
+            rates[year, j]  gross return of account j in year (1.06)
+            infl[year]      gross inflation in year (1.025)
+        Patched are the 3' inflation links, the 15' account rates (and
+        the 15' asset sale amounts) and the 13a'/13b' cap gains taxable
+        fractions. b, b_eq and the bounds are rebuilt from the toml input
+        processed with the path's inflation, so the income, expense and
+        social security amounts, the contribution limits, the standard
+        deduction and the tax and cap gains brackets all follow it.
+    """
+
+    def __init__(self, plan):
+        S = plan.S
+        vindx = plan.vindx
+        taxinfo = plan.taxinfo
+        notes = plan.notes
+        years = S.numyr
+        accounts = len(S.accounttable)
+        self.c = plan.c
+        self.nvars = vindx.vsize
+        self.years = years
+        self.toml_dict = S.toml_dict
+        self.taxinfo = taxinfo
+        self.rhs_model = plan.constraint_model()
+        self.bal = np.array([v['bal'] for v in S.accounttable], dtype=float)
+        # (years, accounts) and (years,)
+        self.base_rates = np.array([v['rates'] for v in S.accounttable]).T
+        self.base_infl = S.i_rates
+        self.aftertax = S.accmap['aftertax'] > 0
+        last = accounts - 1
+
+        # 3' s(year+1) - infl[year] * s(year) == 0
+        eq3 = lp.note_index(notes, "Constraints 3a'/3b':")
+        self.eq3_rows = eq3 + np.arange(years - 1)
+        self.eq3_cols = np.array([vindx.s(year) for year in range(years - 1)])
+        # 15' b(year+1,j) - rate * (b(year,j) - w(year,j) + D(year,j)) == rate * sale
+        eq15 = lp.note_index(notes, "Constraints 15a'/15b':")
+        self.eq15_rows = eq15 + np.arange(years * accounts)
+        self.eq15_cols = np.array([[vindx.b(year, j), vindx.w(year, j),
+                                    vindx.D(year, j)]
+                                   for year in range(years) for j in range(accounts)])
+        eq_rows = np.concatenate((self.eq3_rows, np.repeat(self.eq15_rows, 3)))
+        eq_cols = np.concatenate((self.eq3_cols, self.eq15_cols.ravel()))
+        self.eq_rows = eq_rows
+        self.eq_cols = eq_cols
+        self.A_eq_fixed = without_entries(plan.A_eq, eq_rows, eq_cols)
+        self.sale_rows = self.eq15_rows.reshape(years, accounts)[:, last]
+
+        # 13a'/13b' cap gains taxable fraction f of w - D, no asset sale years
+        self.cg_years = np.array([year for year in range(years)
+                                  if self.aftertax and S.cg_asset_taxed[year] <= 0],
+                                 dtype=int)
+        ub_rows = []
+        ub_cols = []
+        if self.aftertax:
+            self.basis = S.accounttable[last]['basis']
+            i13a = lp.note_index(notes, "Constraints 13a':")
+            i13b = lp.note_index(notes, "Constraints 13b':")
+            for year in self.cg_years:
+                ub_rows += [i13a + year, i13a + year, i13b + year, i13b + year]
+                ub_cols += [vindx.w(year, last), vindx.D(year, last)] * 2
+        self.ub_rows = np.array(ub_rows, dtype=int)
+        self.ub_cols = np.array(ub_cols, dtype=int)
+        self.A_fixed = without_entries(plan.A, self.ub_rows, self.ub_cols)
+        self.s0_col = vindx.s(0)
+        self.end_cols = vindx.b_block(years)
+
+    def constant_path(self):
+        # the rates and inflation the toml file assumes
+        return self.base_rates.copy(), self.base_infl.copy()
+
+    def model(self, rates, infl):
+        # returns c, A, b, A_eq, b_eq, bounds for one path
+        S = tomldata.Data(self.taxinfo)
+        S.toml_dict = self.toml_dict
+        S.process_toml_info(infl)
+        self.rhs_model.S = S
+        b, b_eq, bounds = self.rhs_model.build_rhs()
+        b_eq = np.array(b_eq, dtype=float)
+        r = rates.ravel()
+        eq_vals = np.concatenate((-infl[:-1],
+                                  (np.array([-1, 1, -1]) * r[:, None]).ravel()))
+        A_eq = self.A_eq_fixed + scipy.sparse.csr_matrix(
+            (eq_vals, (self.eq_rows, self.eq_cols)), shape=self.A_eq_fixed.shape)
+        if self.aftertax:
+            b_eq[self.sale_rows] = np.array(S.asset_sale) * rates[:, -1]
+
+        A = self.A_fixed
+        if len(self.ub_rows) > 0:
+            # growth of the aftertax account before each year
+            growth = np.concatenate(([1], np.cumprod(rates[:-1, -1])))
+            f = np.ones(len(self.cg_years))
+            if self.bal[-1] > 0:
+                f = 1 - self.basis / (self.bal[-1] * growth[self.cg_years])
+            ub_vals = (np.array([-1, 1, 1, -1]) * f[:, None]).ravel()
+            A = A + scipy.sparse.csr_matrix(
+                (ub_vals, (self.ub_rows, self.ub_cols)), shape=A.shape)
+        return self.c, A, np.array(b, dtype=float), A_eq, b_eq, bounds
+
+
+def sample_paths(model, n, returnsd, inflationsd, seed=None):
+    #
+    # n return and inflation paths around the plan's per year rates.
+    # Every account sees the same yearly market shock; inflation is
+    # independent.
+    # Returns rates (n, years, accounts) and infl (n, years).
+    #
+    rng = np.random.default_rng(seed)
+    shock = rng.standard_normal((n, model.years))
+    rates = model.base_rates[None, :, :] + \
+        returnsd * shock[:, :, None]
+    infl = model.base_infl[None, :] + inflationsd * \
+        rng.standard_normal((n, model.years))
+    # a gross rate must stay positive
+    return np.maximum(rates, 0.01), np.maximum(infl, 0.01)
+
+
+def init_worker(model):
+    #
+    # each worker process receives the path_model once; the paths only
+    # change coefficients so each solve starts from the basis of the
+    # worker's previous one. The toml input processed for each path
+    # would repeat its warnings from every worker.
+    #
+    global worker_model, worker_solver
+    sys.stdout = open(os.devnull, 'w')
+    worker_model = model
+    worker_solver = lp_solvers.warm_start(planner.solver_options)
+
+
+def solve_path(rates, infl):
+    #
+    # returns success, s(0) and the ending estate for one path, and the
+    # solver's iterations and whether it warm started. A path whose
+    # inflation makes the toml input inconsistent is not solved.
+    #
+    model = worker_model
+    try:
+        lp_model = model.model(rates, infl)
+    except SystemExit:
+        return False, 0.0, 0.0, 0, False
+    res = worker_solver.solve(*lp_model)
+    if not res.success:
+        return False, 0.0, 0.0, res.nit, res.warm
+    return True, float(res.x[model.s0_col]), \
+        float(res.x[model.end_cols].sum()), res.nit, res.warm
+
+
+def run_paths(model, rates, infl, workers=None, stats=None):
+    #
+    # Solve every path across a pool of workers (default: one per core).
+    # Returns arrays success, spending (s(0)) and estate, one per path.
+    # A stats dict is updated with the solver's
+    # lp_solvers.iteration_stats().
+    #
+    if workers is None:
+        workers = os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=init_worker,
+                                                initargs=(model,)) as pool:
+        results = list(pool.map(solve_path, rates, infl,
+                                chunksize=max(1, len(rates) // (4 * workers))))
+    success = np.array([r[0] for r in results], dtype=bool)
+    spending = np.array([r[1] for r in results])
+    estate = np.array([r[2] for r in results])
+    if stats is not None:
+        stats.update(lp_solvers.iteration_stats([r[3] for r in results],
+                                                [r[4] for r in results]))
+    return success, spending, estate
+
+
+percentiles = [5, 10, 25, 50, 75, 90, 95]
+
+
+def print_bands(success, spending, estate):
+    n = len(success)
+    print("\nMonte Carlo Summary: %d paths, %d solved, %d infeasible\n" %
+          (n, success.sum(), n - success.sum()))
+    if success.sum() == 0:
+        return
+    print("%12s" % "percentile" + ("%10d" * len(percentiles)) % tuple(percentiles))
+    print("%12s" % "spending" + ("%10.0f" * len(percentiles)) %
+          tuple(np.percentile(spending[success], percentiles)))
+    print("%12s" % "estate" + ("%10.0f" * len(percentiles)) %
+          tuple(np.percentile(estate[success], percentiles)))
+    print()
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Monte Carlo runs of an optimized finacial plan for retirement.')
+    parser.add_argument('-n', '--paths', type=int, default=1000,
+                        help="Number of return and inflation paths (default: 1000)")
+    parser.add_argument('-rsd', '--returnsd', type=float, default=12,
+                        help="Standard deviation of the yearly returns in percent (default: 12)")
+    parser.add_argument('-isd', '--inflationsd', type=float, default=1,
+                        help="Standard deviation of the yearly inflation in percent (default: 1)")
+    parser.add_argument('-s', '--seed', type=int, default=None,
+                        help="Random seed for reproducible paths")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes (default: number of cores)")
+    parser.add_argument('-nd', '--notdrarothradeposits', action='store_true',
+                        help="Do not allow deposits to TDRA or ROTHRA accounts beyond explicit contributions")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    parser.add_argument(
+        'conffile', help='Require configuration input toml file')
+    args = parser.parse_args()
+
+    with planner.PlanSession(args.conffile,
+                             notdrarothradeposits=args.notdrarothradeposits) as plan:
+        if plan.precheck_consistancy():
+            plan.build()
+            model = path_model(plan)
+
+    t = time.perf_counter()
+    rates, infl = sample_paths(model, args.paths, args.returnsd / 100,
+                               args.inflationsd / 100, args.seed)
+    stats = {}
+    success, spending, estate = run_paths(model, rates, infl, args.jobs, stats)
+    elapsed_time = time.perf_counter() - t
+    print_bands(success, spending, estate)
+    print("Solver: %d solves, %d warm started, %d iterations (about %d saved by warm starts)" %
+          (stats['solves'], stats['warm'], stats['nit'], stats['saved']))
+    print("Elapsed time: %.2f seconds" % elapsed_time)
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+
+#
+# Local HTTP planning service: POST a plan (toml text or the same
+# structure as a json object) to /plan and get the solved schedule back
+# as json. Plans are solved in a pool of worker processes that are
+# started, with scipy imported, before the server accepts requests so
+# no request pays the python and scipy start up cost.
+#
+#     POST /plan[?nd=1]   body: toml text, or json with
+#                         Content-Type: application/json
+#     GET  /stats         request counts and latency percentiles
+#
+# The response to /plan holds success, message, the schedule (see
+# PlanSession.schedule()), the planner's messages in log and the
+# latency of the request in ms split into queue (waiting for a worker)
+# and solve (load, build, solve in the worker) time. At most QUEUE
+# requests are in the server at once, the rest are turned away with
+# 503 so a burst of clicks can not pile up unbounded work.
+#
+# The server binds to localhost by default; it runs whatever plan it
+# is sent and has no authentication so do not expose it to a network.
+#
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import contextlib
+import collections
+import concurrent.futures
+import urllib.parse
+import http.server
+import toml
+import numpy as np
+import ARetirementPlanner as planner
+
+__version__ = planner.__version__
+
+max_body = 1024 * 1024
+
+
+def init_worker():
+    # the planner's progress messages are collected per request instead
+    import scipy.optimize
+    sys.stdout = open(os.devnull, 'w')
+
+
+def warm():
+    # run once by every worker at start up to make sure they all exist
+    time.sleep(0.1)
+    return os.getpid()
+
+
+def solve_request(toml_dict, notdrarothradeposits=False):
+    #
+    # Load, build and solve one plan from its toml dict and return the
+    # response body (without the latency the server adds).
+    #
+    start = time.perf_counter()
+    response = {'success': False, 'message': '', 'schedule': None}
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        try:
+            with planner.PlanSession(toml_dict,
+                                     notdrarothradeposits=notdrarothradeposits) as plan:
+                if plan.precheck_consistancy():
+                    plan.build()
+                    res = plan.solve()
+                    response['success'] = bool(res.success)
+                    response['message'] = str(res.message)
+                    if res.success:
+                        response['schedule'] = plan.schedule()
+                else:
+                    response['message'] = 'the plan failed the pre-check'
+        except SystemExit as e:
+            # the toml loader and the prechecks exit() on bad input
+            response['message'] = 'exit(%s) while loading or checking the plan' % e.code
+        except Exception as e:
+            response['message'] = '%s: %s' % (type(e).__name__, e)
+    response['log'] = log.getvalue()
+    response['solve_ms'] = (time.perf_counter() - start) * 1000
+    return response
+
+
+class plan_server(http.server.ThreadingHTTPServer):
+    """ ThreadingHTTPServer with the worker pool and request statistics
+
+        Each request runs on its own thread which waits for the pool;
+        slots bounds how many may be in the server at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, queue=None):
+        if workers is None:
+            workers = os.cpu_count()
+        if queue is None:
+            queue = 2 * workers
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker)
+        # start every worker now rather than on the first requests
+        for f in [self.pool.submit(warm) for i in range(workers)]:
+            f.result()
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(queue)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latencies = collections.deque(maxlen=1000)
+        super().__init__(address, plan_handler)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+    def record(self, latency, success):
+        with self.lock:
+            self.requests += 1
+            if not success:
+                self.failed += 1
+            self.latencies.append(latency)
+
+    def stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            stats = {'workers': self.workers, 'requests': self.requests,
+                     'failed': self.failed, 'rejected': self.rejected}
+        if len(latencies) > 0:
+            stats['latency_ms'] = dict(zip(['p50', 'p90', 'p99', 'max'],
+                                           np.percentile(latencies, [50, 90, 99, 100]).tolist()))
+        return stats
+
+
+class plan_handler(http.server.BaseHTTPRequestHandler):
+    server_version = 'RetirementPlanner/' + __version__
+
+    def send_json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == '/stats':
+            self.send_json(200, self.server.stats())
+        else:
+            self.send_json(404, {'message': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/plan':
+            self.send_json(404, {'message': 'unknown path %s' % self.path})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > max_body:
+            self.send_json(413, {'message': 'plan larger than %d bytes' % max_body})
+            return
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                toml_dict = json.loads(body)
+            else:
+                toml_dict = toml.loads(body)
+            if not isinstance(toml_dict, dict):
+                raise ValueError('the plan must be a table of sections')
+        except (ValueError, toml.TomlDecodeError) as e:
+            self.send_json(400, {'message': 'can not parse the plan: %s' % e})
+            return
+        query = urllib.parse.parse_qs(url.query)
+        nd = query.get('nd', ['0'])[0] not in ('0', 'false', '')
+
+        if not self.server.slots.acquire(blocking=False):
+            with self.server.lock:
+                self.server.rejected += 1
+            self.send_json(503, {'message': 'busy, try again'})
+            return
+        try:
+            queued = time.perf_counter()
+            response = self.server.pool.submit(solve_request, toml_dict, nd).result()
+        finally:
+            self.server.slots.release()
+        latency = (time.perf_counter() - start) * 1000
+        response['latency_ms'] = latency
+        response['queue_ms'] = max(0.0, (time.perf_counter() - queued) * 1000 -
+                                   response['solve_ms'])
+        self.server.record(latency, response['success'])
+        self.latency = latency
+        self.send_json(200, response)
+
+    def log_request(self, code='-', size='-'):
+        latency = getattr(self, 'latency', None)
+        if latency is not None:
+            self.log_message('"%s" %s %.1f ms', self.requestline, str(code), latency)
+        else:
+            self.log_message('"%s" %s', self.requestline, str(code))
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve optimized finacial plans for retirement over local HTTP as json.')
+    parser.add_argument('-a', '--address', default='127.0.0.1',
+                        help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('-p', '--port', type=int, default=8765,
+                        help="Port to listen on (default: 8765)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes (default: number of cores)")
+    parser.add_argument('-q', '--queue', type=int, default=None,
+                        help="Most requests in the server at once, the rest get 503 (default: twice the workers)")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    args = parser.parse_args()
+
+    server = plan_server((args.address, args.port), args.jobs, args.queue)
+    print("Serving plans on http://%s:%d/plan with %d workers" %
+          (args.address, server.server_address[1], server.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    server.server_close()
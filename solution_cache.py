@@ -0,0 +1,111 @@
+import os
+import hashlib
+import numpy as np
+import scipy.sparse
+import scipy.optimize
+
+
+class solution_cache:
+    """ On disk cache of linprog() solutions keyed by a hash of the model
+
+        The key covers c, A, b, A_eq, b_eq, bounds and the solver options
+        so only a byte identical model reuses a solution. Each solution is
+        a .npz file in directory; a hit refreshes the file's mtime and
+        when the files add up to more than max_bytes the least recently
+        used ones are removed. Only successful solutions are stored.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, c, A, b, A_eq=None, b_eq=None, bounds=None, options=None):
+        h = hashlib.sha256()
+
+        def add_vector(tag, v):
+            h.update(tag)
+            if v is not None:
+                v = np.ascontiguousarray(v, dtype=np.float64)
+                h.update(repr(v.shape).encode())
+                h.update(v.tobytes())
+
+        def add_matrix(tag, M):
+            h.update(tag)
+            if M is not None:
+                # dense and sparse forms of the same matrix hash the same
+                M = scipy.sparse.csr_matrix(M, dtype=np.float64)
+                M.sum_duplicates()
+                M.eliminate_zeros()
+                M.sort_indices()
+                h.update(repr(M.shape).encode())
+                h.update(M.indptr.astype(np.int64).tobytes())
+                h.update(M.indices.astype(np.int64).tobytes())
+                h.update(M.data.tobytes())
+
+        add_vector(b'c', c)
+        add_matrix(b'A', A)
+        add_vector(b'b', b)
+        add_matrix(b'A_eq', A_eq)
+        add_vector(b'b_eq', b_eq)
+        h.update(b'bounds')
+        h.update(repr(bounds).encode())
+        h.update(b'options')
+        h.update(repr(sorted((options or {}).items())).encode())
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        # returns the cached OptimizeResult or None
+        fname = self.filename(key)
+        try:
+            with np.load(fname) as f:
+                res = scipy.optimize.OptimizeResult(
+                    x=f['x'], slack=f['slack'], con=f['con'],
+                    fun=float(f['fun']), status=int(f['status']),
+                    nit=int(f['nit']), message=str(f['message']),
+                    success=True)
+            os.utime(fname)
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return res
+
+    def put(self, key, res):
+        if not res.success:
+            return
+        fname = self.filename(key)
+        # write then rename so a concurrent reader never sees a partial file
+        tmpname = '%s.%d.tmp.npz' % (fname[:-4], os.getpid())
+        np.savez(tmpname, x=res.x, slack=res.get('slack', np.empty(0)),
+                 con=res.get('con', np.empty(0)), fun=res.fun,
+                 status=res.status, nit=res.get('nit', 0),
+                 message=str(res.message))
+        os.replace(tmpname, fname)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz') or name.endswith('.tmp.npz'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+        entries.sort()
+        while total > self.max_bytes and len(entries) > 0:
+            mtime, size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass  # another process got there first
+            total -= size
@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+
+#
+# Social security claiming age optimizer: solve a retirement plan for every
+# combination of claiming ages (62 through 70) of the retirees with
+# [SocialSecurity] sections and report the combination with the highest
+# first year spending s(0) along with a table of s(0) for every cell.
+#
+# Only the social security income changes from cell to cell and it only
+# enters the model in the b values of constraints 2' (income + SS -
+# expenses) and 11' (- SS_taxable * SS) so the plan is built once and each
+# cell patches those entries. Neighbouring cells differ little so each
+# worker solves its run of cells with an lp_solvers.warm_start.
+#
+
+import io
+import os
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import concurrent.futures
+import numpy as np
+import ARetirementPlanner as planner
+import lp_solvers
+import lp_constraint_model as lp
+import tomldata
+
+__version__ = planner.__version__
+
+claim_ages = range(62, 71)
+
+
+class claim_model:
+    """ A built plan model with the social security income patched in
+
+        model(ss) returns the model for the yearly social security
+        income ss (one amount per plan year, as in Data.SS); everything
+        but the 2' and 11' b values is shared with the plan.
+    """
+
+    def __init__(self, plan):
+        S = plan.S
+        years = S.numyr
+        self.c = plan.c
+        self.A = plan.A
+        self.b = np.array(plan.b, dtype=float)
+        self.A_eq = plan.A_eq
+        self.b_eq = plan.b_eq
+        self.bounds = plan.bounds
+        self.ss_taxable = plan.taxinfo.SS_taxable
+        self.base_ss = np.array(S.SS, dtype=float)
+        self.b2_rows = lp.note_index(plan.notes, "Constraints 2':") + \
+            np.arange(years)
+        self.b11_rows = lp.note_index(plan.notes, "Constraints 11':") + \
+            np.arange(years)
+        self.s0_col = plan.vindx.s(0)
+
+    def model(self, ss):
+        # returns c, A, b, A_eq, b_eq, bounds for social security income ss
+        delta = ss - self.base_ss
+        b = self.b.copy()
+        b[self.b2_rows] += delta
+        b[self.b11_rows] -= self.ss_taxable * delta
+        return self.c, self.A, b, self.A_eq, self.b_eq, self.bounds
+
+
+def claimants(S):
+    # the [SocialSecurity] section keys, in toml file order
+    return list(S.final_dict.get('SocialSecurity', {}).keys())
+
+
+def configured_ages(S):
+    # the claiming ages the toml file asks for
+    return tuple(next(tomldata.agelist(v['age']))
+                 for v in S.final_dict.get('SocialSecurity', {}).values())
+
+
+def ss_income(S, ages):
+    #
+    # The yearly social security income when the retirees in
+    # claimants(S) start their benefits at ages (one age each). The
+    # spousal benefit rules of Data.do_SS_details apply; its warnings
+    # about adjusted spousal ages are not printed.
+    #
+    d = json.loads(json.dumps(S.final_dict))  # thread safe deep copy
+    for k, age in zip(claimants(S), ages):
+        d['SocialSecurity'][k]['age'] = '%d-' % age
+    saved = S.SSinput
+    S.SSinput = [{}, {}]
+    bucket = [0] * S.numyr
+    with contextlib.redirect_stdout(io.StringIO()):
+        S.do_SS_details(d, bucket)
+    S.SSinput = saved
+    return np.array(bucket, dtype=float)
+
+
+def grid_cells(S, ages=claim_ages):
+    # every combination of claiming ages, one age per claimant
+    return list(itertools.product(ages, repeat=len(claimants(S))))
+
+
+def undominated(streams):
+    #
+    # Returns for each stream the index of the first identical stream and
+    # a flag that is True when some other stream pays at least as much
+    # every year (and more in some year). More social security in every
+    # year never leaves less to spend so a dominated cell need not be
+    # solved. Claiming before the plan starts or after a retiree's
+    # through age are the usual sources of such cells.
+    #
+    M = np.array(streams)
+    first = []
+    for i in range(len(M)):
+        first.append(next(j for j in range(i + 1)
+                          if np.array_equal(M[j], M[i])))
+    ge = np.all(M[:, None, :] >= M[None, :, :], axis=2)
+    gt = np.any(M[:, None, :] > M[None, :, :], axis=2)
+    dominated = np.any(ge & gt, axis=0)
+    return first, dominated
+
+
+def init_worker(model):
+    # each worker process receives the claim_model once
+    global worker_model, worker_solver
+    worker_model = model
+    worker_solver = lp_solvers.warm_start(planner.solver_options)
+
+
+def solve_cell(ss):
+    #
+    # returns success and s(0) for social security income ss, and the
+    # solver's iterations and whether it warm started
+    #
+    model = worker_model
+    res = worker_solver.solve(*model.model(ss))
+    if not res.success:
+        return False, 0.0, res.nit, res.warm
+    return True, float(res.x[model.s0_col]), res.nit, res.warm
+
+
+def run_grid(plan, ages=claim_ages, workers=None, stats=None):
+    #
+    # Solve the plan (built) for every cell of claiming ages that is not
+    # dominated, across a pool of workers (default: one per core).
+    # Returns the cells and, one per cell, arrays of the solved flag
+    # (False for dominated cells), success flag and s(0). A stats dict
+    # is updated with the solver's lp_solvers.iteration_stats().
+    #
+    model = claim_model(plan)
+    cells = grid_cells(plan.S, ages)
+    streams = [ss_income(plan.S, cell) for cell in cells]
+    first, dominated = undominated(streams)
+    todo = [i for i in range(len(cells))
+            if first[i] == i and not dominated[i]]
+    if workers is None:
+        workers = os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                initializer=init_worker,
+                                                initargs=(model,)) as pool:
+        # runs of neighbouring cells go to each worker
+        results = dict(zip(todo, pool.map(solve_cell,
+                                           [streams[i] for i in todo],
+                                           chunksize=max(1, len(todo) // (4 * workers)))))
+    if stats is not None:
+        stats.update(lp_solvers.iteration_stats([r[2] for r in results.values()],
+                                                [r[3] for r in results.values()]))
+    solved = np.array([first[i] in results for i in range(len(cells))],
+                      dtype=bool)
+    success = np.array([results.get(first[i], (False, 0.0))[0]
+                        for i in range(len(cells))], dtype=bool)
+    spending = np.array([results.get(first[i], (False, 0.0))[1]
+                         for i in range(len(cells))])
+    return cells, solved, success, spending
+
+
+def best_cell(cells, success, spending):
+    # index of the solved cell with the highest s(0), None if none solved
+    if success.sum() == 0:
+        return None
+    return int(np.argmax(np.where(success, spending, -np.inf)))
+
+
+def print_grid(names, cells, solved, success, spending, configured=None):
+    #
+    # Table of s(0) with the first claimant's age down the side and the
+    # second one's across the top (a single row with one claimant).
+    # Dominated cells show '-', infeasible ones 'x' and the best cell is
+    # marked with '*'.
+    #
+    best = best_cell(cells, success, spending)
+    if best is None:
+        print("\nNo combination of claiming ages has a solution\n")
+        return
+    print("\nSocial Security Claiming Ages: %d cells, %d dominated, %d infeasible\n" %
+          (len(cells), (~solved).sum(), (solved & ~success).sum()))
+    for name, age in zip(names, cells[best]):
+        print("%12s claims at %d" % (name, age))
+    print("%12s s(0): %.0f" % ("best", spending[best]))
+    if configured is not None and configured in cells:
+        i = cells.index(configured)
+        if success[i]:
+            print("%12s s(0): %.0f (%s)" % ("configured", spending[i],
+                                            ', '.join('%d' % a for a in configured)))
+    print()
+
+    value = {}
+    for i, cell in enumerate(cells):
+        if not solved[i]:
+            s = '-'
+        elif not success[i]:
+            s = 'x'
+        else:
+            s = '%.0f' % spending[i]
+        value[cell] = s + ('*' if i == best else ' ')
+    ages = sorted(set(cell[-1] for cell in cells))
+    if len(names) == 1:
+        print("%12s" % names[0] + ("%9d" * len(ages)) % tuple(ages))
+        print("%12s" % "s(0)" + ''.join("%9s" % value[(a,)] for a in ages))
+    else:
+        print("%12s" % (names[0] + '\\' + names[1]) +
+              ("%9d" * len(ages)) % tuple(ages))
+        for a0 in sorted(set(cell[0] for cell in cells)):
+            print("%12d" % a0 + ''.join("%9s" % value[(a0, a1)] for a1 in ages))
+    print()
+
+
+# Program entry point
+# Instantiate the parser
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Find the social security claiming ages that give the highest spending in an optimized finacial plan for retirement.')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="Number of worker processes (default: number of cores)")
+    parser.add_argument('-nd', '--notdrarothradeposits', action='store_true',
+                        help="Do not allow deposits to TDRA or ROTHRA accounts beyond explicit contributions")
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s Version ' + __version__,
+                        help="Display the program version number and exit")
+    parser.add_argument(
+        'conffile', help='Require configuration input toml file')
+    args = parser.parse_args()
+
+    with planner.PlanSession(args.conffile,
+                             notdrarothradeposits=args.notdrarothradeposits) as plan:
+        names = claimants(plan.S)
+        if len(names) == 0:
+            print("Error: %s has no [SocialSecurity] sections" % args.conffile)
+            exit(1)
+        if plan.precheck_consistancy():
+            plan.build()
+        configured = configured_ages(plan.S)
+
+        t = time.perf_counter()
+        stats = {}
+        cells, solved, success, spending = run_grid(plan, workers=args.jobs,
+                                                    stats=stats)
+        elapsed_time = time.perf_counter() - t
+    print_grid(names, cells, solved, success, spending, configured)
+    print("Solver: %d solves, %d warm started, %d iterations (about %d saved by warm starts)" %
+          (stats['solves'], stats['warm'], stats['nit'], stats['saved']))
+    print("Elapsed time: %.2f seconds" % elapsed_time)
@@ -2,6 +2,7 @@
 import json  # strickly to make a deep copy # threadsafe deepcopy
 import toml
 import re
+import numpy as np
 #import taxinfo
 
 
@@ -95,7 +96,7 @@ class Data:
                             max += self.tinfo.contribspecs['401kCatchup']
 
         # adjust for inflation
-        max *= self.i_rate ** (year + self.preplanyears)
+        max *= self.i_mul[year]
         #print('maxContribution: %6.0f' % max, retireekey)
         return max
 
@@ -172,6 +173,15 @@ class Data:
                 rate = 1 + v['rate'] / 100  # invest rate: 6 -> 1.06
                 entry['rate'] = rate
                 v['rate'] = rate
+            # per plan year rate and the growth of $1 from the plan start
+            # to the start of each year (growth has the extra final year)
+            if self.returns is None:
+                entry['rates'] = np.full(self.numyr, entry['rate'])
+                entry['growth'] = np.array([entry['rate'] ** year
+                                            for year in range(self.numyr + 1)])
+            else:
+                entry['rates'] = self.returns
+                entry['growth'] = np.concatenate(([1], np.cumprod(self.returns)))
             precontribs = 0
             precontibsPlusReturns = 0
             tillRetirement = ageAtStart - currentAge
@@ -214,7 +224,7 @@ class Data:
                             if entry['inflation']:
                                 #bucket[year] = entry['contrib'] * self.i_rate ** (preyear+year)
                                 bucket[year] = entry['contrib'] * \
-                                    self.i_rate ** (age - currentAge)
+                                    self.i_mul[year]
                             #print("age %d, year %d, bucket: %6.0f += amount %6.0f" %(age, year, bucket[year], adj_amount))
             if type == 'aftertax':
                 if 'basis' not in v:
@@ -363,8 +373,7 @@ class Data:
                 elif year >= self.numyr:
                     break
                 else:
-                    adj_amount = amount * \
-                        self.i_rate ** (age - currAge)  # year
+                    adj_amount = amount * self.i_mul[year]
                     #print("age %d, year %d, bucket: %6.0f += amount %6.0f" %(age, year, bucket[year], adj_amount))
                     bucket[year] += adj_amount
                     self.SSinput[i]['bucket'][year] = adj_amount
@@ -406,7 +415,7 @@ class Data:
                     amount = v['amount']
                     #print("amount %6.0f, " % (amount), end='')
                     if v.get('inflation'):
-                        amount *= self.i_rate ** (age - self.primAge)  # year
+                        amount *= self.i_mul[year]
                     #print("inf amount %6.0f, year %d, curbucket %6.0f" % (amount , year, bucket[year]), end='')
                     bucket[year] += amount
                     self.details[category][i]['bucket'][year] = amount
@@ -554,7 +563,12 @@ class Data:
         if verification_failure:
             exit(1)
 
-    def process_toml_info(self):
+    def process_toml_info(self, inflation=None, returns=None):
+        #
+        # inflation and returns optionally replace the constant rates of
+        # the toml file with per plan year gross rates (1.025), returns
+        # applying to every account
+        #
         self.accounttable = []
         d = json.loads(json.dumps(self.toml_dict))  # thread safe deep copy
         #"""
@@ -603,6 +617,22 @@ class Data:
         self.preplanyears = self.startage - self.primAge
         #print("\nself.preplanyears: ", self.preplanyears, "\n\n")
 
+        # per plan year inflation (year to year + 1) and the cumulative
+        # inflation multiplier from today to each plan year, i_mul[year] is
+        # i_rate**(preplanyears + year) for a constant rate. i_mul has an
+        # entry for the year after the plan
+        if inflation is None:
+            self.i_rates = np.full(self.numyr, self.i_rate)
+            self.i_mul = np.array([self.i_rate ** (self.preplanyears + year)
+                                   for year in range(self.numyr + 1)])
+        else:
+            self.i_rates = np.array(inflation[:self.numyr], dtype=float)
+            self.i_mul = self.i_rate ** self.preplanyears * \
+                np.concatenate(([1], np.cumprod(self.i_rates)))
+        self.returns = None
+        if returns is not None:
+            self.returns = np.array(returns[:self.numyr], dtype=float)
+
         #print("input dictionary(processed): ", d)
         # returns entry for each account
         self.accounttable += self.get_account_info(d, 'IRA')
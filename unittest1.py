@@ -5,12 +5,27 @@ import unittest
 import json
 import argparse
 import toml
+import numpy
 import scipy.optimize
 import vector_var_index as v
 import app_output
 import taxinfo as tif
 import lp_constraint_model as lpclass
 import tomldata
+import ARetirementPlanner as planner
+import batch_planner
+import solution_cache
+import monte_carlo
+import backtest
+import ss_optimizer
+import struct
+import lp_solvers
+import modelio
+import plan_server
+import threading
+import urllib.request
+import shutil
+import benchmark
 #import cfg_master  #has the optparse option-handling code
 
 orig_tomls = """
@@ -133,6 +148,53 @@ class TestIndexes(unittest.TestCase):
         self.assertTrue(z)
 
 
+    def test_index_var_blocks_match_scalar_functions(self):
+        years = 10
+        taxbins = 8
+        cgbins = 3
+        accounts = 4
+        accmap = {'IRA': 2, 'roth': 1, 'aftertax': 1}
+
+        indx = v.vector_var_index(years, taxbins, cgbins, accounts, accmap)
+        fast = v.vector_var_index(years, taxbins, cgbins, accounts, accmap, fast=True)
+        self.assertEqual(indx.b_block().shape, (years + 1, accounts))
+        for i in range(years):
+            self.assertEqual(list(indx.x_block(i)), [indx.x(i, k) for k in range(taxbins)])
+            self.assertEqual(list(indx.y_block(i)), [indx.y(i, l) for l in range(cgbins)])
+            self.assertEqual(indx.s_block(i), indx.s(i))
+            for j in range(accounts):
+                self.assertEqual(indx.w_block(i, j), indx.w(i, j))
+                self.assertEqual(indx.D_block(i, j), fast.D(i, j))
+        for j in range(accounts):
+            self.assertEqual(list(indx.b_block(j=j)), [fast.b(i, j) for i in range(years + 1)])
+        with self.assertRaises(AssertionError):
+            indx.w(years, 0)
+        fast.w(years, 0)  # no range checks in fast mode
+
+
+    def test_index_var_views_share_solution_memory(self):
+        years = 10
+        taxbins = 8
+        cgbins = 3
+        accounts = 4
+        accmap = {'IRA': 2, 'roth': 1, 'aftertax': 1}
+
+        indx = v.vector_var_index(years, taxbins, cgbins, accounts, accmap)
+        X = numpy.arange(indx.vsize, dtype=float)
+        rv = indx.views(X)
+        self.assertEqual(rv.w.shape, (years, accounts))
+        self.assertEqual(rv.b.shape, (years + 1, accounts))
+        self.assertEqual(rv.x[3, 2], X[indx.x(3, 2)])
+        self.assertEqual(rv.y[3, 2], X[indx.y(3, 2)])
+        self.assertEqual(rv.b[years, 1], X[indx.b(years, 1)])
+        self.assertEqual(rv.s[4], X[indx.s(4)])
+        self.assertEqual(rv.D[9, 3], X[indx.D(9, 3)])
+        # views, not copies
+        X[indx.w(2, 1)] = -1
+        self.assertEqual(rv.w[2, 1], -1)
+        self.assertTrue(numpy.shares_memory(rv.D, X))
+
+
 class TestAppOutput(unittest.TestCase):
     def test_app_output_without_csv_file(self):
         ao = app_output.app_output(None)
@@ -178,11 +240,39 @@ class TestAppOutput(unittest.TestCase):
         except OSError as e:  # if failed, report it back to the user ##
             print("Error: %s - %s." % (e.filename, e.strerror))
 
+    def test_app_output_buffered_matches_unbuffered(self):
+        fn = 'test_csv_file_for_unit_testing.csv'
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with app_output.app_output(fn, buffered=True) as ao:
+            ao.output("1&@2")
+            ao.output("&@3&@4\n")
+            sys.stdout.flush()
+            self.assertEqual(0, os.path.getsize('stdout.log'))
+            ao.flush()
+            ao.output("5&@6\n")
+        sys.stdout.close()
+        sys.stdout = temp
+        with open('stdout.log', 'r') as inf:
+            result = inf.read()
+        with open(fn, 'r') as incsv:
+            result2 = incsv.read()
+        self.assertEqual("1 2 3 4\n5 6\n", result)
+        self.assertEqual("1,2,3,4\n5,6\n", result2)
+        try:
+            os.remove('stdout.log')
+            os.remove(fn)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
 
 class TestLpConstraintModel(unittest.TestCase):
     # TODO define some good test for model construction and printing
     def __init__(self, other):
-        # bcm = binary constraint model
+        # bcm = binary constraint model: the pickled c, A, b, A_eq, b_eq
+        # and bounds; known_good_model_matrix.pickle (see
+        # test_lp_constraint_model_build_against_know_model) is the
+        # pickled text print_model_matrix() prints for them
         self.bin_constraint_name = 'constrain_model_test_file.bcm'
         super().__init__(other)
 
@@ -211,18 +301,19 @@ class TestLpConstraintModel(unittest.TestCase):
                                          self.taxinfo.SS_taxable,
                                          verbose, 
                                          disallowdeposits)
-        c, A, b = lp.build_model()
-        return vindx, lp, c, A, b
+        c, A, b, A_eq, b_eq, bounds, notes = lp.build_model()
+        return vindx, lp, c, A, b, A_eq, b_eq, bounds, notes
 
     def test_lp_constraint_model_contrib_IRA1(self):
         S = self.lp_constraint_model_load_default_toml()
         # TODO: add any local changes to the initial data
         # default toml has IRA.will contrib 100 with inflation from 56-65, No need to modify
-        vindx, lp, c, A, b = self.lp_constraint_model_build_model(S)
+        vindx, lp, c, A, b, A_eq, b_eq, bounds, notes = self.lp_constraint_model_build_model(S)
         # TODO: Test created model or solve...
         verbose = False
         #res = solve(c, A, b, verbose)
-        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b,
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds,
                                      options={"disp": verbose,
                                               #"bland": True,
                                               "tol": 1.0e-7,
@@ -242,27 +333,76 @@ class TestLpConstraintModel(unittest.TestCase):
             res.x[vindx.D(onePassedYear, 0)], atleast,
             msg='Contribution should likely be less than previous year contribution {} and is {}'.format(atleast, res.x[vindx.D(onePassedYear, 0)]))
 
+    def test_lp_constraint_model_sparse_matches_dense(self):
+        S = self.lp_constraint_model_load_default_toml()
+        vindx, lp, c, A, b, A_eq, b_eq, bounds, notes = self.lp_constraint_model_build_model(S)
+        sc, sA, sb, sA_eq, sb_eq, sbounds, snotes = lp.build_model(sparse=True)
+        self.assertEqual(sA.shape, (len(A), len(A[0])))
+        self.assertEqual(sA.toarray().tolist(), A)
+        self.assertEqual(sb, b)
+        self.assertEqual(sA_eq.toarray().tolist(), A_eq)
+        self.assertEqual(sb_eq, b_eq)
+        self.assertEqual(sc, c)
+        # only the nonzero coefficients are stored
+        nonzeros = sum(1 for row in A for val in row if val != 0)
+        self.assertEqual(sA.nnz, nonzeros)
+
+    def test_lp_constraint_model_equality_block(self):
+        S = self.lp_constraint_model_load_default_toml()
+        vindx, lp, c, A, b, A_eq, b_eq, bounds, notes = self.lp_constraint_model_build_model(S)
+        accounts = len(S.accounttable)
+        # 3' and 15' are equalities rather than mirrored <= pairs
+        self.assertEqual(len(b_eq), (S.numyr - 1) + S.numyr * accounts)
+        eq_notes = [n['note'] for n in notes if n.get('eq', False)]
+        self.assertIn("Constraints 15a'/15b':", eq_notes)
+        for n in notes:
+            self.assertNotIn(n['note'], ("Constraints 3b':", "Constraints 15b':", "Constraints 16b':"))
+        # the <= only form solves to the same spending
+        A_ub, b_ub = lpclass.as_ub_model(A, b, A_eq, b_eq, bounds)
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds)
+        res_ub = scipy.optimize.linprog(c, A_ub=A_ub, b_ub=b_ub)
+        self.assertAlmostEqual(res.x[vindx.s(0)], res_ub.x[vindx.s(0)], places=2)
+
+    def test_lp_constraint_model_bounds(self):
+        S = self.lp_constraint_model_load_default_toml()
+        vindx, lp, c, A, b, A_eq, b_eq, bounds, notes = self.lp_constraint_model_build_model(S)
+        self.assertEqual(len(bounds), vindx.vsize)
+        for j in range(len(S.accounttable)):
+            bal = S.accounttable[j]['bal']
+            self.assertEqual(bounds[vindx.b(0, j)], (bal, bal))
+        for year in range(S.numyr):
+            cap = self.taxinfo.taxtable[0][1] * S.i_rate**(S.preplanyears + year)
+            self.assertEqual(bounds[vindx.x(year, 0)], (0, cap))
+            # top bracket is unbounded
+            self.assertEqual(bounds[vindx.x(year, len(self.taxinfo.taxtable) - 1)], (0, None))
+        # IRA.will contributes 100 with inflation from 56-65
+        self.assertGreater(bounds[vindx.D(0, 0)][0], 0)
+        for n in notes:
+            self.assertNotIn(n['note'], ("Constraints 8':", "Constraints 12':", "Constraints 16a'/16b':"))
+
     def test_lp_constraint_model_build_against_know_model(self):
         S = self.lp_constraint_model_load_default_toml()
         # TODO: add any local changes to the initial data
-        vindx, lp, c, A, b = self.lp_constraint_model_build_model(S)
+        vindx, lp, c, A, b, A_eq, b_eq, bounds, notes = self.lp_constraint_model_build_model(S)
         # TODO: Test created model or solve...
 
         #with open(self.bin_constraint_name, 'wb') as fil:  # USE TO UPDATE THE BINARY 'GOOD' model
-        #   pickle.dump([c, A, b], fil)
+        #   pickle.dump([c, A, b, A_eq, b_eq, bounds], fil)
 
         with open(self.bin_constraint_name, 'rb') as fil:
-            [nc, nA, nb] = pickle.load(fil)
+            [nc, nA, nb, nA_eq, nb_eq, nbounds] = pickle.load(fil)
 
         # Do a deep compare:
-        self.assertEqual(pickle.dumps([c, A, b]), pickle.dumps([nc, nA, nb]))
+        self.assertEqual(pickle.dumps([c, A, b, A_eq, b_eq, bounds]),
+                         pickle.dumps([nc, nA, nb, nA_eq, nb_eq, nbounds]))
 
         self.model_matrix_name = 'known_good_model_matrix.pickle'
         temp = sys.stdout
         sys.stdout = open('stdout.log', 'w')
         #sys.stderr = open('stderr.log', 'w')
 
-        lp.print_model_matrix(c, A, b, None, False)
+        lp.print_model_matrix(c, A, b, notes, None, False, A_eq, b_eq, bounds)
 
         sys.stdout.close()
         sys.stdout = temp
@@ -318,9 +458,10 @@ class TestInputThroughSolver(unittest.TestCase):
                                         taxinfo.SS_taxable, 
                                         verbose, 
                                         disallowdeposits)
-        c, A, b = lp.build_model()
+        c, A, b, A_eq, b_eq, bounds, notes = lp.build_model()
 
-        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b,
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds,
                                      options={"disp": verbose,
                                               #"bland": True,
                                               "tol": 1.0e-7,
@@ -359,9 +500,10 @@ class TestInputThroughSolver(unittest.TestCase):
                                         taxinfo.SS_taxable, 
                                         verbose, 
                                         disallowdeposits)
-        c, A, b = lp.build_model()
+        c, A, b, A_eq, b_eq, bounds, notes = lp.build_model()
 
-        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b,
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds,
                                      options={"disp": verbose,
                                               #"bland": True,
                                               "tol": 1.0e-7,
@@ -399,9 +541,10 @@ class TestInputThroughSolver(unittest.TestCase):
                                         taxinfo.SS_taxable,
                                         verbose, 
                                         disallowdeposits)
-        c, A, b = lp.build_model()
+        c, A, b, A_eq, b_eq, bounds, notes = lp.build_model()
 
-        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b,
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds,
                                      options={"disp": verbose,
                                               #"bland": True,
                                               "tol": 1.0e-7,
@@ -413,6 +556,802 @@ class TestInputThroughSolver(unittest.TestCase):
         self.assertEqual(round(res.x[vindx.s(year)],3), round(verifiedSolverResult,3), msg='Verified solver result is ${:0_.3f} but here we got ${:0_.3f}'.format(verifiedSolverResult, res.x[vindx.s(year)]))
 
 
+class TestIncomeSummary(unittest.TestCase):
+    def test_income_summary_matches_solution(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        taxinfo = tif.taxinfo()
+        S = tomldata.Data(taxinfo)
+        S.load_toml_file(toml_file_name)
+        S.process_toml_info()
+        vindx = v.vector_var_index(S.numyr, len(taxinfo.taxtable),
+                                   len(taxinfo.capgainstable),
+                                   len(S.accounttable), S.accmap)
+        lp = lpclass.lp_constraint_model(S, vindx, taxinfo.taxtable,
+                                         taxinfo.capgainstable,
+                                         taxinfo.penalty,
+                                         taxinfo.stded,
+                                         taxinfo.SS_taxable,
+                                         False, False)
+        c, A, b, A_eq, b_eq, bounds, notes = lp.build_model(sparse=True)
+        res = scipy.optimize.linprog(c, A_ub=A, b_ub=b, A_eq=A_eq, b_eq=b_eq,
+                                     bounds=bounds)
+        self.assertTrue(res.success, msg='res.success indicates solver failed')
+        rv = vindx.views(res.x)
+        isum = planner.income_summary(S, rv, taxinfo)
+        for year in range(S.numyr):
+            # the model defines s(year) as the spendable amount and the
+            # ordinary taxable income fills the tax brackets
+            self.assertAlmostEqual(isum.spendable[year], rv.s[year], delta=0.1)
+            self.assertAlmostEqual(isum.T[year], rv.x[year].sum(), delta=0.1)
+            self.assertAlmostEqual(isum.tax[year], sum(
+                rv.x[year, k] * taxinfo.taxtable[k][2] for k in range(len(taxinfo.taxtable))), delta=0.1)
+        self.assertEqual(len(isum.year(0)), 7)
+
+
+class TestPlanSession(unittest.TestCase):
+    def test_plan_session_runs_repeatably_in_process(self):
+        toml_file_name = 't.toml'
+        fn = 'test_csv_file_for_unit_testing.csv'
+        tf = working_toml_file(toml_file_name)
+        totals = []
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        for i in range(2):
+            with planner.PlanSession(toml_file_name, fn) as plan:
+                self.assertTrue(plan.precheck_consistancy())
+                plan.build()
+                res = plan.solve()
+                self.assertTrue(res.success, msg='res.success indicates solver failed')
+                plan.check()
+                plan.report(tax=True)
+                totals.append((plan.rv.s[0],) + plan.get_result_totals())
+        sys.stdout.close()
+        sys.stdout = temp
+        with open(fn, 'r') as incsv:
+            result = incsv.read()
+        self.assertIn("Activity Summary:", result)
+        self.assertIn("Tax Summary:", result)
+        self.assertNotIn("Account Transactions Summary:", result)
+        for a, b in zip(totals[0], totals[1]):
+            self.assertAlmostEqual(a, b, delta=0.1)
+        try:
+            os.remove('stdout.log')
+            os.remove(fn)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_plan_session_update_rebuilds_only_rhs(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        d = tf.toml_dict()
+        d['income']['rental_1']['amount'] = 30000
+        d['IRA']['will']['bal'] = 1500000
+        tf2 = working_toml_file('t2.toml')
+        tf2.write_working_toml_file(toml.dumps(d))
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            A = plan.A
+            self.assertTrue(plan.update(d))
+            self.assertIs(plan.A, A)
+            res = plan.solve()
+            with planner.PlanSession('t2.toml') as fresh:
+                fresh.build()
+                fresh_res = fresh.solve()
+            self.assertEqual(plan.c, fresh.c)
+            self.assertEqual(plan.b, fresh.b)
+            self.assertEqual(plan.b_eq, fresh.b_eq)
+            self.assertEqual(plan.bounds, fresh.bounds)
+            self.assertEqual((A != fresh.A).nnz, 0)
+            self.assertAlmostEqual(res.fun, fresh_res.fun, delta=0.01)
+            # returns are in the 15' coefficients so A must be rebuilt
+            d['returns'] = 7
+            self.assertFalse(plan.update(d))
+        sys.stdout.close()
+        sys.stdout = temp
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_plan_session_update_records_changes(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        d = tf.toml_dict()
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            b = plan.b
+            bounds = plan.bounds
+            d['expense'] = {'trip': {'amount': 9000, 'age': '60-62',
+                                     'inflation': True}}
+            self.assertTrue(plan.update(d))
+            expense_changes = plan.changes
+            d['IRA']['will']['bal'] = 1500000
+            self.assertTrue(plan.update(d))
+            bal_changes = plan.changes
+            self.assertIs(plan.b, b)
+            self.assertIs(plan.bounds, bounds)
+        sys.stdout.close()
+        sys.stdout = temp
+        # the trip covers ages 60 to 62, three years of 2'
+        self.assertEqual(expense_changes, {'toml': ['expense'],
+                                           "Constraints 2':": 3})
+        self.assertEqual(bal_changes, {'toml': ['IRA'], 'bounds': 1})
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_plan_session_update_filing_status_matches_fresh_build(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        d = tf.toml_dict()
+        # only the filing status changes, which changes the tax brackets
+        d['retirement_type'] = 'mseparate'
+        tf2 = working_toml_file('t2.toml')
+        tf2.write_working_toml_file(toml.dumps(d))
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            plan.solve()
+            self.assertFalse(plan.update(d))
+            res = plan.solve()
+            with planner.PlanSession('t2.toml') as fresh:
+                fresh.build()
+                fresh_res = fresh.solve()
+            self.assertEqual(plan.model.stded, fresh.model.stded)
+            self.assertEqual(plan.vid, fresh.vid)
+            self.assertEqual(plan.c, fresh.c)
+            self.assertEqual(plan.b, fresh.b)
+            self.assertEqual(plan.b_eq, fresh.b_eq)
+            self.assertEqual(plan.bounds, fresh.bounds)
+            self.assertEqual((plan.A != fresh.A).nnz, 0)
+            self.assertAlmostEqual(res.fun, fresh_res.fun, delta=0.01)
+        sys.stdout.close()
+        sys.stdout = temp
+        try:
+            os.remove('stdout.log')
+            os.remove('t2.toml')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_plan_session_render_matches_report(self):
+        toml_file_name = 't.toml'
+        fn = 'test_csv_file_for_unit_testing.csv'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name, fn) as plan:
+            plan.build()
+            plan.solve()
+            tables = plan.tables(tax=True)
+            text = plan.render(tables)
+            plan.ao.flush()
+        with open(fn, 'r') as incsv:
+            csv_before_report = incsv.read()
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            plan.solve()
+            sys.stdout.close()
+            sys.stdout = open('stdout.log', 'w')
+            plan.report(tax=True)
+            plan.ao.flush()
+        sys.stdout.close()
+        sys.stdout = temp
+        with open('stdout.log', 'r') as inf:
+            result = inf.read()
+        self.assertEqual([name for name, table in tables],
+                         ["Activity Summary", "Tax Summary", "Plan Summary"])
+        self.assertEqual(''.join(text[name] for name, table in tables), result)
+        self.assertEqual(csv_before_report, '')
+        try:
+            os.remove('stdout.log')
+            os.remove(fn)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_plan_session_replays_dumped_model(self):
+        toml_file_name = 't.toml'
+        model_file = 'test_model_for_unit_testing.dat'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            plan.solve()
+            plan.dump_model(model_file)
+            text = plan.render(plan.tables(True, True, True, True))
+        # the toml file is not needed to replay the plan
+        os.remove(toml_file_name)
+        with planner.PlanSession(None, modelfile=model_file,
+                                 solver='highs-ds') as replay:
+            res = replay.solve()
+            replay.check()
+            replayed = replay.render(replay.tables(True, True, True, True))
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertTrue(res.success)
+        self.assertEqual(replay.vid, plan.vid)
+        self.assertEqual(replay.notes, plan.notes)
+        self.assertEqual(replay.bounds, plan.bounds)
+        self.assertEqual((replay.A_eq != plan.A_eq).nnz, 0)
+        self.assertAlmostEqual(replay.rv.s[0], plan.rv.s[0], delta=1)
+        self.assertEqual(replayed, text)
+        try:
+            os.remove('stdout.log')
+            os.remove(model_file)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestBatchPlanner(unittest.TestCase):
+    def test_batch_planner_summary(self):
+        toml_file_name = 't.toml'
+        summary = 'test_batch_summary_for_unit_testing.csv'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        row = batch_planner.run_plan(toml_file_name)
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertTrue(row['success'], msg=row['message'])
+        rows = batch_planner.run_batch(
+            [toml_file_name, 'no_such_file.toml'], summary, workers=2)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0]['success'])
+        self.assertAlmostEqual(rows[0]['spending'], row['spending'], delta=0.1)
+        self.assertFalse(rows[1]['success'])
+        with open(summary, 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0].split(','), batch_planner.summary_fields)
+        try:
+            os.remove('stdout.log')
+            os.remove(summary)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestSolutionCache(unittest.TestCase):
+    def test_solution_cache_hit_skips_solver_and_evicts(self):
+        toml_file_name = 't.toml'
+        cachedir = 'test_solution_cache_for_unit_testing'
+        tf = working_toml_file(toml_file_name)
+        shutil.rmtree(cachedir, ignore_errors=True)
+        cache = solution_cache.solution_cache(cachedir)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        results = []
+        for i in range(2):
+            with planner.PlanSession(toml_file_name, cache=cache) as plan:
+                plan.build()
+                results.append(plan.solve())
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(results[1].success)
+        self.assertTrue(numpy.array_equal(results[0].x, results[1].x))
+        self.assertTrue(numpy.array_equal(results[0].slack, results[1].slack))
+        # different model, different key
+        key = cache.key(plan.c, plan.A, plan.b, plan.A_eq, plan.b_eq,
+                        plan.bounds)
+        self.assertEqual(key, cache.key(plan.c, plan.A.toarray(), plan.b,
+                                        plan.A_eq, plan.b_eq, plan.bounds))
+        self.assertNotEqual(key, cache.key(plan.c, plan.A, plan.b * 2,
+                                           plan.A_eq, plan.b_eq, plan.bounds))
+        # a cache too small for one solution keeps nothing
+        cache.max_bytes = 1
+        cache.evict()
+        self.assertEqual(os.listdir(cachedir), [])
+        shutil.rmtree(cachedir, ignore_errors=True)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_monte_carlo_constant_path_matches_plan(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+        sys.stdout.close()
+        sys.stdout = temp
+        model = monte_carlo.path_model(plan)
+        c, A, b, A_eq, b_eq, bounds = model.model(*model.constant_path())
+        self.assertTrue(numpy.allclose(A.toarray(), plan.A.toarray()))
+        self.assertTrue(numpy.allclose(A_eq.toarray(), plan.A_eq.toarray()))
+        self.assertTrue(numpy.allclose(b, plan.b))
+        self.assertTrue(numpy.allclose(b_eq, plan.b_eq))
+        for lo_hi, plan_lo_hi in zip(bounds, plan.bounds):
+            self.assertEqual(lo_hi[1] is None, plan_lo_hi[1] is None)
+            if lo_hi[1] is not None:
+                self.assertAlmostEqual(lo_hi[1], plan_lo_hi[1], delta=0.01)
+        rates, infl = monte_carlo.sample_paths(model, 3, 0.1, 0.01, seed=7)
+        self.assertEqual(rates.shape, (3, model.years, len(plan.S.accounttable)))
+        rates2, infl2 = monte_carlo.sample_paths(model, 3, 0.1, 0.01, seed=7)
+        self.assertTrue(numpy.array_equal(rates, rates2))
+        rates[0], infl[0] = model.constant_path()
+        success, spending, estate = monte_carlo.run_paths(
+            model, rates, infl, workers=1)
+        self.assertTrue(success[0])
+        self.assertAlmostEqual(spending[0], res.x[plan.vindx.s(0)], delta=0.1)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+    def test_monte_carlo_path_inflation_matches_fresh_build(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+        model = monte_carlo.path_model(plan)
+        rates, infl = model.constant_path()
+        infl += 0.05
+        c, A, b, A_eq, b_eq, bounds = model.model(rates, infl)
+        # the plan built with the path's inflation from the start
+        with planner.PlanSession(toml_file_name, inflation=infl) as fresh:
+            fresh.build()
+        sys.stdout.close()
+        sys.stdout = temp
+        # income, social security and expenses follow the path
+        i2 = lpclass.note_index(plan.notes, "Constraints 2':")
+        rows2 = i2 + numpy.arange(plan.S.numyr)
+        self.assertFalse(numpy.allclose(b[rows2], numpy.array(plan.b)[rows2]))
+        self.assertTrue(numpy.allclose(b, fresh.b))
+        self.assertTrue(numpy.allclose(b_eq, fresh.b_eq))
+        self.assertTrue(numpy.allclose(A_eq.toarray(), fresh.A_eq.toarray()))
+        for lo_hi, fresh_lo_hi in zip(bounds, fresh.bounds):
+            self.assertAlmostEqual(lo_hi[0], fresh_lo_hi[0], delta=0.01)
+            self.assertEqual(lo_hi[1] is None, fresh_lo_hi[1] is None)
+            if lo_hi[1] is not None:
+                self.assertAlmostEqual(lo_hi[1], fresh_lo_hi[1], delta=0.01)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestBacktest(unittest.TestCase):
+    def test_backtest_constant_history_matches_plan(self):
+        toml_file_name = 't.toml'
+        history = 'test_history_for_unit_testing.csv'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+        # made up history with the toml file's 6% returns and 2.5% inflation
+        with open(history, 'w') as f:
+            f.write("year,return,cpi\n")
+            for i in range(plan.S.numyr + 4):
+                f.write("%d,6,%f\n" % (1900 + i, 100 * 1.025 ** i))
+        years, returns, inflation = backtest.load_history(history)
+        start, success, spending = backtest.run_backtest(
+            toml_file_name, years, returns, inflation, plan.S.numyr, workers=1)
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertEqual(list(start), [1901, 1902, 1903, 1904])
+        self.assertTrue(success.all())
+        for s0 in spending:
+            self.assertAlmostEqual(s0, plan.rv.s[0], delta=1)
+        try:
+            os.remove('stdout.log')
+            os.remove(history)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestSSOptimizer(unittest.TestCase):
+    def test_ss_optimizer_configured_cell_matches_plan(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            self.assertEqual(ss_optimizer.claimants(plan.S), ['will', 'spouse'])
+            configured = ss_optimizer.configured_ages(plan.S)
+            self.assertEqual(configured, (68, 70))
+            # the configured streams rebuilt from the toml input
+            self.assertTrue(numpy.array_equal(
+                ss_optimizer.ss_income(plan.S, configured), plan.S.SS))
+            cells, solved, success, spending = ss_optimizer.run_grid(
+                plan, range(66, 71), workers=1)
+            res = plan.solve()
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertEqual(len(cells), 25)
+        i = cells.index(configured)
+        self.assertTrue(success[i])
+        self.assertAlmostEqual(spending[i], plan.rv.s[0], delta=1)
+        best = ss_optimizer.best_cell(cells, success, spending)
+        self.assertGreaterEqual(spending[best], spending[i])
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_ss_optimizer_dominated_streams(self):
+        streams = [numpy.array([0, 10, 10]), numpy.array([5, 10, 10]),
+                   numpy.array([5, 10, 10]), numpy.array([9, 0, 20])]
+        first, dominated = ss_optimizer.undominated(streams)
+        self.assertEqual(first, [0, 1, 1, 3])
+        self.assertEqual(list(dominated), [True, False, False, False])
+
+
+class TestPlanServer(unittest.TestCase):
+    def test_plan_server_solves_posted_plan(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+        server = plan_server.plan_server(('127.0.0.1', 0), workers=1)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        url = 'http://127.0.0.1:%d' % server.server_address[1]
+        try:
+            request = urllib.request.Request(url + '/plan',
+                                             data=tf.tomls.encode(), method='POST')
+            with urllib.request.urlopen(request) as r:
+                response = json.loads(r.read())
+            with urllib.request.urlopen(url + '/stats') as r:
+                stats = json.loads(r.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertTrue(response['success'])
+        schedule = response['schedule']
+        self.assertAlmostEqual(schedule['spending'], plan.rv.s[0], delta=1)
+        self.assertEqual(len(schedule['accounts']), len(plan.S.accounttable))
+        self.assertGreaterEqual(response['latency_ms'], response['solve_ms'])
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['failed'], 0)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestLpSolvers(unittest.TestCase):
+    def test_lp_solvers_backends_agree(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            model = (plan.c, plan.A, plan.b, plan.A_eq, plan.b_eq, plan.bounds)
+        sys.stdout.close()
+        sys.stdout = temp
+        results = [lp_solvers.solve(name, *model, options=planner.solver_options)
+                   for name in ['highs', 'highs-ds', 'highs-ipm']]
+        for res in results:
+            self.assertEqual(res.status, 0)
+            self.assertTrue(res.success)
+            self.assertGreater(res.nit, 0)
+            self.assertGreater(res.time, 0)
+            self.assertAlmostEqual(res.fun, results[0].fun, delta=1)
+        self.assertEqual([res.solver for res in results],
+                         ['highs', 'highs-ds', 'highs-ipm'])
+        with self.assertRaises(ValueError):
+            lp_solvers.solve('no_such_solver', *model)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_lp_solvers_simplex_small_model(self):
+        if not lp_solvers.available('simplex'):
+            self.skipTest('this scipy has no legacy simplex')
+        # max x + y, x + 2y <= 4, 3x + y <= 6 at x = 1.6, y = 1.2
+        res = lp_solvers.solve('simplex', [-1, -1], [[1, 2], [3, 1]], [4, 6],
+                               options={'tol': 1.0e-7, 'maxiter': 4000})
+        self.assertEqual(res.status, 0)
+        self.assertAlmostEqual(res.fun, -2.8)
+        self.assertEqual(res.solver, 'simplex')
+
+    def test_lp_solvers_warm_start_sweep(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            model = ss_optimizer.claim_model(plan)
+            streams = [ss_optimizer.ss_income(plan.S, cell)
+                       for cell in [(68, 70), (68, 69), (67, 69)]]
+        sys.stdout.close()
+        sys.stdout = temp
+        warm = lp_solvers.warm_start(planner.solver_options)
+        for ss in streams:
+            res = warm.solve(*model.model(ss))
+            cold = lp_solvers.solve('highs', *model.model(ss))
+            self.assertTrue(res.success)
+            self.assertAlmostEqual(res.fun, cold.fun, delta=1)
+            self.assertAlmostEqual(res.x[model.s0_col], cold.x[model.s0_col],
+                                   delta=1)
+        # later solves warm start only where highspy is installed
+        self.assertEqual(warm.warms, [False, warm.supported, warm.supported])
+        stats = warm.stats()
+        self.assertEqual(stats['solves'], 3)
+        self.assertEqual(stats['nit'], sum(warm.nits))
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_lp_solvers_iteration_stats(self):
+        stats = lp_solvers.iteration_stats([100, 10, 20], [False, True, True])
+        self.assertEqual(stats, {'solves': 3, 'warm': 2, 'nit': 130,
+                                 'saved': 170})
+        stats = lp_solvers.iteration_stats([100, 90], [False, False])
+        self.assertEqual(stats['saved'], 0)
+
+    def test_mps_dump_model(self):
+        mps_file = 'test_model_for_unit_testing.mps'
+        modelio.mpsDumpModel([-1, 0, 2], [[1, 2, 0]], [4], [[0, 1, 1]], [1],
+                             [(0, None), (None, 3), (1, 1)], mps_file)
+        with open(mps_file) as f:
+            lines = f.read().split('\n')
+        os.remove(mps_file)
+        self.assertEqual(lines[:5], ['NAME RPLAN', 'ROWS', ' N COST',
+                                     ' L R0', ' E E0'])
+        self.assertIn(' C0 COST -1', lines)
+        self.assertIn(' C1 E0 1', lines)
+        self.assertIn(' RHS R0 4', lines)
+        self.assertEqual(lines[lines.index('BOUNDS') + 1:],
+                         [' MI BND C1', ' UP BND C1 3', ' FX BND C2 1',
+                          'ENDATA', ''])
+
+
+class TestModelio(unittest.TestCase):
+    def test_modelio_dump_load_round_trip(self):
+        toml_file_name = 't.toml'
+        model_file = 'test_model_for_unit_testing.dat'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+            A, b = lpclass.as_ub_model(plan.A, plan.b, plan.A_eq, plan.b_eq,
+                                       plan.bounds)
+            modelio.binDumpModel(plan.c, A, b, res.x, plan.vid, model_file)
+        c1, A1, b1, X1, vid1 = modelio.binLoadModel(model_file, verify=True)
+        sys.stdout.close()
+        sys.stdout = temp
+        with open(model_file, 'rb') as f:
+            head = f.read(16)
+        self.assertEqual(head[:8], modelio.model_magic)
+        self.assertEqual(struct.unpack('<I', head[8:12])[0], modelio.model_version)
+        # the arrays are mapped from the file, not read
+        self.assertIsInstance(c1, numpy.memmap)
+        self.assertFalse(A1.data.flags.owndata)
+        self.assertTrue(numpy.array_equal(c1, plan.c))
+        self.assertEqual((A1 != A).nnz, 0)
+        self.assertTrue(numpy.array_equal(b1, b))
+        self.assertTrue(numpy.array_equal(X1, res.x))
+        self.assertEqual(list(vid1), plan.vid)
+        del c1, A1, b1, X1, vid1
+        try:
+            os.remove('stdout.log')
+            os.remove(model_file)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_modelio_dump_over_loaded_file(self):
+        toml_file_name = 't.toml'
+        model_file = 'test_model_for_unit_testing.dat'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+            plan.dump_model(model_file)
+        # the replayed model is mapped from model_file, so dumping it back
+        # (-mdp -mld with the defaults) must not truncate what it reads
+        with planner.PlanSession(toml_file_name, modelfile=model_file) as plan:
+            self.assertIsInstance(plan.c, numpy.memmap)
+            res1 = plan.solve()
+            plan.dump_model(model_file, check=True)
+            c, b = numpy.array(plan.c), numpy.array(plan.b)
+        c1, A1, b1, X1, vid1 = modelio.binLoadModel(model_file, verify=True)
+        sys.stdout.close()
+        sys.stdout = temp
+        with open('stdout.log') as f:
+            self.assertNotIn('Error', f.read())
+        self.assertTrue(numpy.array_equal(c1, c))
+        self.assertTrue(numpy.array_equal(b1, b))
+        self.assertTrue(numpy.array_equal(X1, res1.x))
+        self.assertAlmostEqual(res1.fun, res.fun)
+        del c1, A1, b1, X1, vid1
+        try:
+            os.remove('stdout.log')
+            os.remove(model_file)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_modelio_dump_check_reports_differences(self):
+        model_file = 'test_model_for_unit_testing.dat'
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        modelio.binDumpModel([1.0, 2.0], [[1.0, 0.0], [0.0, 3.0]], [4.0, 5.0],
+                             [0.5, 0.25], [1, 2], model_file, check=True)
+        modelio.binDumpCheck([1.0, 9.0], [[1.0, 0.0], [0.0, 3.0]], [4.0, 5.0],
+                             [0.5, 0.25], [1, 2], model_file)
+        sys.stdout.close()
+        sys.stdout = temp
+        with open('stdout.log') as f:
+            lines = [l.strip() for l in f.readlines()]
+        # a clean dump reports nothing, a changed value is reported
+        self.assertEqual(lines[1:], ['c[1] is 9 but found 2'])
+        try:
+            os.remove('stdout.log')
+            os.remove(model_file)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_modelio_checksum_detects_damage(self):
+        model_file = 'test_model_for_unit_testing.dat'
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        modelio.binDumpModel([1.0, 2.0], [[1.0, 0.0], [0.0, 3.0]], [4.0, 5.0],
+                             None, None, model_file)
+        with open(model_file, 'r+b') as f:
+            f.seek(-8, os.SEEK_END)  # the last value of Adata
+            f.write(struct.pack('<d', 7.0))
+        # only a verified load reads the sections
+        c1, A1, b1, X1, vid1 = modelio.binLoadModel(model_file)
+        self.assertEqual(A1[1, 1], 7.0)
+        self.assertIsNone(X1)
+        with self.assertRaises(SystemExit):
+            modelio.binLoadModel(model_file, verify=True)
+        with open(model_file, 'r+b') as f:
+            f.seek(12)  # the section count
+            f.write(struct.pack('<I', 5))
+        with self.assertRaises(SystemExit):
+            modelio.binLoadModel(model_file)
+        sys.stdout.close()
+        sys.stdout = temp
+        del c1, A1, b1, X1, vid1
+        try:
+            os.remove('stdout.log')
+            os.remove(model_file)
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+    def test_modelio_lp_dump_model(self):
+        lp_file = 'test_model_for_unit_testing.lp'
+        modelio.lpDumpModel([-1, 0, 2, 0], [[1, 2, 0, 0]], [4], [[0, 1, 1, 0]], [1],
+                            [(0, None), (None, 3), (1, 1), (0.5, None)], lp_file)
+        with open(lp_file) as f:
+            lines = f.read().split('\n')
+        os.remove(lp_file)
+        # C3 is in no row so it is kept in the objective
+        self.assertEqual(lines[1:9], ['Minimize', ' COST: - 1 C0 + 2 C2 + 0 C3',
+                                      'Subject To', ' R0: + 1 C0 + 2 C1 <= 4',
+                                      ' Q0: + 1 C1 + 1 C2 = 1', 'Bounds',
+                                      ' -inf <= C1 <= 3', ' C2 = 1'])
+        self.assertEqual(lines[9:], [' C3 >= 0.5', 'End', ''])
+
+    def test_modelio_export_named_model(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        with planner.PlanSession(toml_file_name) as plan:
+            plan.build()
+            res = plan.solve()
+            for f in ('test_model_for_unit_testing.lp', 'test_model_for_unit_testing.mps'):
+                plan.export_model(f)
+            names = lpclass.row_names(plan.notes, len(plan.b_eq), eq=True)
+        sys.stdout.close()
+        sys.stdout = temp
+        with open('test_model_for_unit_testing.lp') as f:
+            lp_text = f.read()
+        with open('test_model_for_unit_testing.mps') as f:
+            mps_lines = f.read().split('\n')
+        self.assertIn('\n c2_y0: ', lp_text)
+        self.assertIn('\n c15a_y0_j0: ', lp_text)
+        self.assertIn(' E c15a_y0_j0', mps_lines)
+        self.assertIn(' b_1_0 c15a_y0_j0 1', mps_lines)
+        # rows of a model that was not built by the session are numbered
+        # within their family
+        self.assertEqual(names[:2], ['c3a_0', 'c3a_1'])
+        self.assertEqual(names[-1], 'c15a_%d' % (len(plan.b_eq) - len(plan.S.i_rates)))
+        if lp_solvers.highspy is not None:
+            for f in ('test_model_for_unit_testing.lp', 'test_model_for_unit_testing.mps'):
+                h = lp_solvers.highspy.Highs()
+                h.setOptionValue('output_flag', False)
+                h.readModel(f)
+                h.run()
+                self.assertAlmostEqual(h.getInfo().objective_function_value / res.fun, 1, places=9)
+        try:
+            os.remove('stdout.log')
+            os.remove('test_model_for_unit_testing.lp')
+            os.remove('test_model_for_unit_testing.mps')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_benchmark_records_every_phase(self):
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        plans = benchmark.plan_matrix([10, 80], [1, 2], [['IRA'], ['roth', 'aftertax']], [True])
+        results = benchmark.run_matrix(plans[:1], repeat=2)
+        sys.stdout.close()
+        sys.stdout = temp
+        self.assertEqual([p[0] for p in plans],
+                         ['y10-r1-IRA-assets', 'y10-r1-roth+aftertax-assets',
+                          'y10-r2-IRA-assets', 'y10-r2-roth+aftertax-assets',
+                          'y80-r1-IRA-assets', 'y80-r1-roth+aftertax-assets',
+                          'y80-r2-IRA-assets', 'y80-r2-roth+aftertax-assets'])
+        p = json.loads(json.dumps(results))['plans'][0]
+        self.assertTrue(p['success'])
+        self.assertEqual(list(p['phases'])[:6],
+                         ['process_toml_info', 'precheck_consistancy', 'build_model',
+                          'solve', 'consistancy_check', 'print_model'])
+        self.assertIn('print_tax_brackets', p['phases'])
+        for v in p['phases'].values():
+            self.assertLessEqual(v['wall_s'], v['wall_s_median'])
+            self.assertGreaterEqual(v['peak_bytes'], 0)
+        self.assertGreater(p['phases']['build_model']['peak_bytes'], 0)
+        # the longest and largest plans of the matrix solve too
+        for name, description, toml_dict in plans[-2:]:
+            with planner.PlanSession(toml_dict) as plan:
+                self.assertEqual(plan.S.numyr, 80)
+                plan.build()
+                self.assertTrue(plan.solve().success)
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+    def test_benchmark_compare_flags_regressions(self):
+        def results(solve, build_peak):
+            return {'plans': [{'name': 'a', 'phases': {
+                'build_model': {'wall_s': 0.5, 'peak_bytes': build_peak},
+                'solve': {'wall_s': solve, 'peak_bytes': None}}}]}
+        temp = sys.stdout
+        sys.stdout = open('stdout.log', 'w')
+        base = results(1.0, 1000)
+        self.assertEqual(benchmark.compare(base, results(1.1, 1100)), [])
+        self.assertEqual(benchmark.compare(base, results(2.0, 1000)), ['solve'])
+        self.assertEqual(benchmark.compare(base, results(1.0, 2000)), ['build_model'])
+        # growth within the noise is not a regression
+        self.assertEqual(benchmark.compare(results(0.001, 1000), results(0.004, 1000)), [])
+        sys.stdout.close()
+        sys.stdout = temp
+        try:
+            os.remove('stdout.log')
+        except OSError as e:  # if failed, report it back to the user ##
+            print("Error: %s - %s." % (e.filename, e.strerror))
+
+
 class TestTomlInput(unittest.TestCase):
     """ Tests to ensure we are getting the correct and needed input from toml configuration file """
 
@@ -587,6 +1526,34 @@ class TestTomlInput(unittest.TestCase):
         self.assertEqual(m, 2 * (taxinfo.contribspecs['TDRA'] + taxinfo.contribspecs['TDRACatchup'])
                          * S.i_rate**year, msg='TDRA+RothRA contribution plus catchup for both Retirees')
 
+    def test_toml_input_per_year_rates(self):
+        toml_file_name = 't.toml'
+        tf = working_toml_file(toml_file_name)
+        taxinfo = tif.taxinfo()
+        S = tomldata.Data(taxinfo)
+        S.load_toml_file(toml_file_name)
+        S.process_toml_info()
+        self.assertEqual(len(S.i_rates), S.numyr)
+        self.assertEqual(len(S.i_mul), S.numyr + 1)
+        for year in range(S.numyr + 1):
+            self.assertEqual(S.i_mul[year], S.i_rate ** (S.preplanyears + year))
+        for v in S.accounttable:
+            self.assertTrue(numpy.all(v['rates'] == v['rate']))
+            self.assertAlmostEqual(v['growth'][5], v['rate'] ** 5)
+        inflation = [1.01 + 0.001 * year for year in range(S.numyr)]
+        returns = [1.03] * S.numyr
+        S2 = tomldata.Data(taxinfo)
+        S2.load_toml_file(toml_file_name)
+        S2.process_toml_info(inflation, returns)
+        self.assertAlmostEqual(S2.i_mul[3], S.i_mul[0] * 1.01 * 1.011 * 1.012)
+        # inflation adjusted toml amounts follow the per year inflation
+        self.assertAlmostEqual(S2.SS[12] / S.SS[12], S2.i_mul[12] / S.i_mul[12])
+        self.assertAlmostEqual(S2.maxContribution(4, None) / S.maxContribution(4, None),
+                               S2.i_mul[4] / S.i_mul[4])
+        for v in S2.accounttable:
+            self.assertTrue(numpy.all(v['rates'] == 1.03))
+            self.assertAlmostEqual(v['growth'][S2.numyr], 1.03 ** S2.numyr)
+
     def test_toml_input_check_record(self):
         taxinfo = tif.taxinfo()
         S = tomldata.Data(taxinfo)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 
 
 def my_check_index_sequence(years, taxbins, cgbins, accounts, accmap, varindex):
@@ -52,10 +55,30 @@ def my_check_index_sequence(years, taxbins, cgbins, accounts, accmap, varindex):
     return pass_ok
 
 
+def _sel(i):
+    # None selects the whole axis of an index block
+    if i is None:
+        return slice(None)
+    return i
+
+
+def _index_grid(start, rows, cols):
+    grid = np.arange(start, start + rows * cols).reshape(rows, cols)
+    grid.setflags(write=False)
+    return grid
+
+
 class vector_var_index:
-    """ inplements the vector var index functions """
+    """ inplements the vector var index functions
+
+        The scalar functions x(), y(), w(), b(), s() and D() return a
+        single index. The *_block() functions return NumPy index arrays
+        so a whole block of res.x can be gathered at once, e.g.,
+        res.x[vindx.w_block(j=2)] is every withdrawal from account 2.
+        With fast=True the scalar functions skip their range asserts.
+    """
 
-    def __init__(self, iyears, itaxbins, icgbins, iaccounts, iaccmap):
+    def __init__(self, iyears, itaxbins, icgbins, iaccounts, iaccmap, fast=False):
 
         self.years = iyears
         self.taxbins = itaxbins
@@ -82,6 +105,23 @@ class vector_var_index:
         self.sstart = self.bstart + self.bcount
         self.Dstart = self.sstart + self.scount
 
+        self.xgrid = _index_grid(0, self.years, self.taxbins)
+        self.ygrid = None
+        if self.accmap['aftertax'] > 0:
+            self.ygrid = _index_grid(self.ystart, self.years, self.cgbins)
+        self.wgrid = _index_grid(self.wstart, self.years, self.accounts)
+        self.bgrid = _index_grid(self.bstart, self.years + 1, self.accounts)
+        self.sgrid = _index_grid(self.sstart, 1, self.years)[0]
+        self.Dgrid = _index_grid(self.Dstart, self.years, self.accounts)
+
+        if fast:
+            self.x = self._x_fast
+            self.y = self._y_fast
+            self.w = self._w_fast
+            self.b = self._b_fast
+            self.s = self._s_fast
+            self.D = self._D_fast
+
     def x(self, i, k):
         assert i >= 0 and i < self.years
         assert k >= 0 and k < self.taxbins
@@ -113,6 +153,47 @@ class vector_var_index:
         assert i >= 0 and i < self.years
         return self.Dstart + i * self.accounts + j
 
+    def _x_fast(self, i, k):
+        return i * self.taxbins + k
+
+    def _y_fast(self, i, l):
+        return self.ystart + i * self.cgbins + l
+
+    def _w_fast(self, i, j):
+        return self.wstart + i * self.accounts + j
+
+    def _b_fast(self, i, j):
+        return self.bstart + i * self.accounts + j
+
+    def _s_fast(self, i):
+        return self.sstart + i
+
+    def _D_fast(self, i, j):
+        return self.Dstart + i * self.accounts + j
+
+    def x_block(self, i=None, k=None):
+        return self.xgrid[_sel(i), _sel(k)]
+
+    def y_block(self, i=None, l=None):
+        assert self.accmap['aftertax'] > 0
+        return self.ygrid[_sel(i), _sel(l)]
+
+    def w_block(self, i=None, j=None):
+        return self.wgrid[_sel(i), _sel(j)]
+
+    def b_block(self, i=None, j=None):
+        # b has an extra year on the end
+        return self.bgrid[_sel(i), _sel(j)]
+
+    def s_block(self, i=None):
+        return self.sgrid[_sel(i)]
+
+    def D_block(self, i=None, j=None):
+        return self.Dgrid[_sel(i), _sel(j)]
+
+    def views(self, X):
+        return vector_var_views(self, X)
+
     def varstr(self, indx):
         assert indx < self.vsize
         if indx < self.xcount:
@@ -154,4 +235,33 @@ class vector_var_index:
         #self.wcount = self.years * self.accounts
         ## final balances in years+1
         #self.bcount = (self.years + 1) * self.accounts
-        #self.scount = self.years
\ No newline at end of file
+        #self.scount = self.years
+
+
+class vector_var_views:
+    """ named views over a solution vector laid out by vector_var_index
+
+        x, y, w, b, s and D are reshaped NumPy views sharing memory with
+        the solution (e.g., w is (years, accounts) and b is (years+1,
+        accounts)) so no values are copied. Without an aftertax account
+        there are no y variables and y is all zeros.
+    """
+
+    def __init__(self, vindx, X):
+        self.X = np.asarray(X, dtype=float)
+        self.x = self._view(0, vindx.xcount, (vindx.years, vindx.taxbins))
+        if vindx.ycount > 0:
+            self.y = self._view(vindx.ystart, vindx.ycount,
+                                (vindx.years, vindx.cgbins))
+        else:
+            self.y = np.zeros((vindx.years, vindx.cgbins))
+        self.w = self._view(vindx.wstart, vindx.wcount,
+                            (vindx.years, vindx.accounts))
+        self.b = self._view(vindx.bstart, vindx.bcount,
+                            (vindx.years + 1, vindx.accounts))
+        self.s = self._view(vindx.sstart, vindx.scount, (vindx.years,))
+        self.D = self._view(vindx.Dstart, vindx.Dcount,
+                            (vindx.years, vindx.accounts))
+
+    def _view(self, start, count, shape):
+        return self.X[start:start + count].reshape(shape)